@@ -15,7 +15,8 @@ import {
     TouchableOpacity,
     View,
 } from 'react-native';
-import { API_BASE_URL } from '../../constants/API';
+import { API_BASE_URL, adminHeaders } from '../../constants/API';
+import { useAuth } from '../../context/AuthContext';
 
 interface Product {
     id: string;
@@ -30,6 +31,8 @@ interface Product {
 type TabMode = 'add' | 'restock';
 
 export default function CatalogScreen() {
+    const { user } = useAuth();
+
     // ── Add new product state ──
     const [name, setName] = useState('');
     const [price, setPrice] = useState('');
@@ -95,7 +98,7 @@ export default function CatalogScreen() {
         try {
             const response = await fetch(`${API_BASE_URL}/products`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json', 'bypass-tunnel-reminder': 'true' },
+                headers: adminHeaders(user?.access_token, { 'Content-Type': 'application/json' }),
                 body: JSON.stringify({ name, price: parseInt(price), category, image, description }),
             });
             if (!response.ok) throw new Error('Failed to add product');
@@ -116,9 +119,10 @@ export default function CatalogScreen() {
             {
                 text: 'Delete', style: 'destructive', onPress: async () => {
                     try {
-                        await fetch(`${API_BASE_URL}/products/${product.id}`, {
-                            method: 'DELETE', headers: { 'bypass-tunnel-reminder': 'true' },
+                        const res = await fetch(`${API_BASE_URL}/products/${product.id}`, {
+                            method: 'DELETE', headers: adminHeaders(user?.access_token),
                         });
+                        if (!res.ok) throw new Error('Failed');
                         fetchProducts();
                     } catch (e) {
                         Alert.alert('Error', 'Could not delete product.');
@@ -135,7 +139,7 @@ export default function CatalogScreen() {
         try {
             const res = await fetch(`${API_BASE_URL}/products/${selectedProduct.id}/stock`, {
                 method: 'PATCH',
-                headers: { 'Content-Type': 'application/json', 'bypass-tunnel-reminder': 'true' },
+                headers: adminHeaders(user?.access_token, { 'Content-Type': 'application/json' }),
                 body: JSON.stringify({ stock: stockQty }),
             });
             if (!res.ok) throw new Error('Failed');
@@ -9,7 +9,8 @@ import {
     Text,
     View,
 } from 'react-native';
-import { API_BASE_URL } from '../../constants/API';
+import { fetchAdminPage } from '../../constants/API';
+import { useAuth } from '../../context/AuthContext';
 
 interface Feedback {
     id: string;
@@ -19,31 +20,41 @@ interface Feedback {
 }
 
 export default function FeedbackScreen() {
+    const { user } = useAuth();
     const [feedback, setFeedback] = useState<Feedback[]>([]);
     const [loading, setLoading] = useState(true);
     const [refreshing, setRefreshing] = useState(false);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const fetchFeedback = useCallback(async () => {
         try {
             setLoading(true);
-            const response = await fetch(`${API_BASE_URL}/admin/feedback`, {
-                headers: { 'bypass-tunnel-reminder': 'true' }
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-                setFeedback(data);
-            } else {
-                Alert.alert('Error', 'Failed to fetch feedback.');
-            }
+            const page = await fetchAdminPage<Feedback>('/admin/feedback', user?.access_token);
+            setFeedback(page.rows);
+            setNextCursor(page.nextCursor);
         } catch (error) {
             console.error('Fetch feedback error:', error);
-            Alert.alert('Error', 'Failed to connect to the server.');
+            Alert.alert('Error', 'Failed to fetch feedback.');
         } finally {
             setLoading(false);
             setRefreshing(false);
         }
-    }, []);
+    }, [user?.access_token]);
+
+    const loadMore = useCallback(async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchAdminPage<Feedback>('/admin/feedback', user?.access_token, nextCursor);
+            setFeedback(prev => [...prev, ...page.rows]);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            console.error('Load more feedback error:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [nextCursor, loadingMore, user?.access_token]);
 
     useEffect(() => {
         fetchFeedback();
@@ -89,6 +100,9 @@ export default function FeedbackScreen() {
                 renderItem={renderItem}
                 keyExtractor={(item) => item.id}
                 contentContainerStyle={styles.listContent}
+                onEndReached={loadMore}
+                onEndReachedThreshold={0.5}
+                ListFooterComponent={loadingMore ? <ActivityIndicator color="#C5A028" style={{ marginVertical: 16 }} /> : null}
                 refreshControl={
                     <RefreshControl refreshing={refreshing} onRefresh={onRefresh} tintColor="#C5A028" />
                 }
@@ -9,7 +9,7 @@ import {
     TouchableOpacity,
     View
 } from 'react-native';
-import { API_BASE_URL } from '../../constants/API';
+import { API_BASE_URL, adminHeaders } from '../../constants/API';
 import { useAuth } from '../../context/AuthContext';
 
 interface Order {
@@ -20,12 +20,11 @@ interface Order {
     created_at: string;
 }
 
-interface ItemRequest {
-    status: string;
-}
-
-interface Feedback {
-    id: string;
+interface DashboardStats {
+    revenue: { total: number; today: number };
+    orders: { total: number; by_status: Record<string, number>; recent: Order[] };
+    pending_requests: number;
+    feedback: { total: number };
 }
 
 const STATUS_COLORS: Record<string, string> = {
@@ -58,46 +57,30 @@ function StatCard({
 }
 
 export default function DashboardScreen() {
-    const [orders, setOrders] = useState<Order[]>([]);
-    const [requests, setRequests] = useState<ItemRequest[]>([]);
-    const [feedback, setFeedback] = useState<Feedback[]>([]);
+    const [stats, setStats] = useState<DashboardStats | null>(null);
     const [loading, setLoading] = useState(true);
     const [refreshing, setRefreshing] = useState(false);
 
     const { logout, user } = useAuth();
 
-    const totalRevenue = orders
-        .filter(o => o.status === 'paid')
-        .reduce((sum, o) => sum + (o.amount || 0), 0);
-
-    const todayRevenue = orders
-        .filter(o => {
-            if (o.status !== 'paid') return false;
-            const d = new Date(o.created_at);
-            const now = new Date();
-            return d.toDateString() === now.toDateString();
-        })
-        .reduce((sum, o) => sum + (o.amount || 0), 0);
-
-    const pendingRequests = requests.filter(r => r.status === 'pending').length;
+    // Aggregates are computed server-side so this payload stays small as history grows
+    const totalRevenue = stats?.revenue.total ?? 0;
+    const todayRevenue = stats?.revenue.today ?? 0;
+    const pendingRequests = stats?.pending_requests ?? 0;
+    const orders = stats?.orders.recent ?? [];
 
     const fetchData = useCallback(async () => {
         try {
-            const [ordersRes, requestsRes, feedbackRes] = await Promise.all([
-                fetch(`${API_BASE_URL}/admin/orders`, { headers: { 'bypass-tunnel-reminder': 'true' } }),
-                fetch(`${API_BASE_URL}/admin/requests`, { headers: { 'bypass-tunnel-reminder': 'true' } }),
-                fetch(`${API_BASE_URL}/admin/feedback`, { headers: { 'bypass-tunnel-reminder': 'true' } }),
-            ]);
-            if (ordersRes.ok) setOrders(await ordersRes.json());
-            if (requestsRes.ok) setRequests(await requestsRes.json());
-            if (feedbackRes.ok) setFeedback(await feedbackRes.json());
+            const statsRes = await fetch(`${API_BASE_URL}/admin/stats`, { headers: adminHeaders(user?.access_token) });
+            if (statsRes.status === 401) { logout(); return; }
+            if (statsRes.ok) setStats(await statsRes.json());
         } catch (error) {
             console.error('Fetch error:', error);
         } finally {
             setLoading(false);
             setRefreshing(false);
         }
-    }, []);
+    }, [user?.access_token]);
 
     useEffect(() => { fetchData(); }, [fetchData]);
 
@@ -142,7 +125,7 @@ export default function DashboardScreen() {
             <View style={styles.statsRow}>
                 <StatCard
                     label="Orders"
-                    value={orders.length}
+                    value={stats?.orders.total ?? 0}
                     icon="list-alt"
                     color="#0A84FF"
                 />
@@ -154,7 +137,7 @@ export default function DashboardScreen() {
                 />
                 <StatCard
                     label="Feedback"
-                    value={feedback.length}
+                    value={stats?.feedback.total ?? 0}
                     icon="comments"
                     color="#30D158"
                 />
@@ -167,7 +150,7 @@ export default function DashboardScreen() {
     return (
         <View style={styles.container}>
             <FlatList
-                data={orders.slice(0, 20)}
+                data={orders}
                 keyExtractor={(item) => item.id}
                 ListHeaderComponent={<ListHeader />}
                 renderItem={({ item }) => (
@@ -10,7 +10,8 @@ import {
     TextInput,
     View
 } from 'react-native';
-import { API_BASE_URL } from '../../constants/API';
+import { API_BASE_URL, adminHeaders } from '../../constants/API';
+import { useAuth } from '../../context/AuthContext';
 
 type NotifType = 'info' | 'alert' | 'system';
 
@@ -29,6 +30,7 @@ const TYPE_CONFIG: Record<NotifType, { label: string; icon: React.ComponentProps
 };
 
 export default function BroadcastScreen() {
+    const { user } = useAuth();
     const [title, setTitle] = useState('');
     const [message, setMessage] = useState('');
     const [type, setType] = useState<NotifType>('info');
@@ -65,13 +67,15 @@ export default function BroadcastScreen() {
         try {
             const res = await fetch(`${API_BASE_URL}/admin/notifications`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json', 'bypass-tunnel-reminder': 'true' },
+                headers: adminHeaders(user?.access_token, { 'Content-Type': 'application/json' }),
                 body: JSON.stringify({ title, message, type }),
             });
             if (!res.ok) throw new Error('Failed');
+            const { data } = await res.json();
             Alert.alert('Sent!', `"${title}" broadcast to all users.`);
             setTitle(''); setMessage('');
-            fetchHistory();
+            // The server returns the stored row; no need to refetch the whole history
+            setHistory((prev) => [...data, ...prev]);
         } catch (e) {
             Alert.alert('Error', 'Could not broadcast notification.');
         } finally {
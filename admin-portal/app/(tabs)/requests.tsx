@@ -10,7 +10,8 @@ import {
     TouchableOpacity,
     View,
 } from 'react-native';
-import { API_BASE_URL } from '../../constants/API';
+import { API_BASE_URL, adminHeaders, fetchAdminPage } from '../../constants/API';
+import { useAuth } from '../../context/AuthContext';
 
 interface ItemRequest {
     id: string;
@@ -21,35 +22,50 @@ interface ItemRequest {
 }
 
 export default function RequestsScreen() {
+    const { user } = useAuth();
     const [requests, setRequests] = useState<ItemRequest[]>([]);
     const [loading, setLoading] = useState(true);
     const [refreshing, setRefreshing] = useState(false);
     const [filter, setFilter] = useState<'all' | 'pending' | 'fulfilled'>('pending');
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const displayed = requests.filter(r => filter === 'all' || r.status === filter);
     const pendingCount = requests.filter(r => r.status === 'pending').length;
 
     const fetchRequests = useCallback(async () => {
         try {
-            const response = await fetch(`${API_BASE_URL}/admin/requests`, {
-                headers: { 'bypass-tunnel-reminder': 'true' },
-            });
-            if (response.ok) setRequests(await response.json());
-            else Alert.alert('Error', 'Failed to fetch item requests.');
+            const page = await fetchAdminPage<ItemRequest>('/admin/requests', user?.access_token);
+            setRequests(page.rows);
+            setNextCursor(page.nextCursor);
         } catch (error) {
             console.error('Fetch requests error:', error);
-            Alert.alert('Error', 'Failed to connect to the server.');
+            Alert.alert('Error', 'Failed to fetch item requests.');
         } finally {
             setLoading(false);
             setRefreshing(false);
         }
-    }, []);
+    }, [user?.access_token]);
+
+    const loadMore = useCallback(async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchAdminPage<ItemRequest>('/admin/requests', user?.access_token, nextCursor);
+            setRequests(prev => [...prev, ...page.rows]);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            console.error('Load more requests error:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [nextCursor, loadingMore, user?.access_token]);
 
     const handleFulfill = async (req: ItemRequest) => {
         try {
             const response = await fetch(`${API_BASE_URL}/admin/fulfill`, {   // ← fixed URL
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json', 'bypass-tunnel-reminder': 'true' },
+                headers: adminHeaders(user?.access_token, { 'Content-Type': 'application/json' }),
                 body: JSON.stringify({ request_id: req.id, item_name: req.item_name, user_email: req.user_email }),
             });
             if (response.ok) {
@@ -128,6 +144,9 @@ export default function RequestsScreen() {
                 renderItem={renderItem}
                 keyExtractor={item => item.id}
                 contentContainerStyle={styles.list}
+                onEndReached={loadMore}
+                onEndReachedThreshold={0.5}
+                ListFooterComponent={loadingMore ? <ActivityIndicator color="#C5A028" style={{ marginVertical: 16 }} /> : null}
                 refreshControl={<RefreshControl refreshing={refreshing} onRefresh={() => { setRefreshing(true); fetchRequests(); }} tintColor="#C5A028" />}
                 ListEmptyComponent={
                     <View style={styles.emptyWrap}>
@@ -8,7 +8,8 @@ import {
     Text,
     View,
 } from 'react-native';
-import { API_BASE_URL } from '../../constants/API';
+import { fetchAdminPage } from '../../constants/API';
+import { useAuth } from '../../context/AuthContext';
 
 interface UserProfile {
     id: string;
@@ -24,10 +25,13 @@ function getInitial(name: string | null) {
 }
 
 export default function UsersScreen() {
+    const { user } = useAuth();
     const [users, setUsers] = useState<UserProfile[]>([]);
     const [loading, setLoading] = useState(true);
     const [refreshing, setRefreshing] = useState(false);
     const [filter, setFilter] = useState<'all' | 'User' | 'Admin'>('all');
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const displayed = users.filter(u => filter === 'all' || u.role === filter);
     const adminCount = users.filter(u => u.role === 'Admin').length;
@@ -35,17 +39,30 @@ export default function UsersScreen() {
 
     const fetchUsers = useCallback(async () => {
         try {
-            const res = await fetch(`${API_BASE_URL}/admin/users`, {
-                headers: { 'bypass-tunnel-reminder': 'true' },
-            });
-            if (res.ok) setUsers(await res.json());
+            const page = await fetchAdminPage<UserProfile>('/admin/users', user?.access_token);
+            setUsers(page.rows);
+            setNextCursor(page.nextCursor);
         } catch (e) {
             console.error('Fetch users error:', e);
         } finally {
             setLoading(false);
             setRefreshing(false);
         }
-    }, []);
+    }, [user?.access_token]);
+
+    const loadMore = useCallback(async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchAdminPage<UserProfile>('/admin/users', user?.access_token, nextCursor);
+            setUsers(prev => [...prev, ...page.rows]);
+            setNextCursor(page.nextCursor);
+        } catch (e) {
+            console.error('Load more users error:', e);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [nextCursor, loadingMore, user?.access_token]);
 
     useEffect(() => { fetchUsers(); }, [fetchUsers]);
 
@@ -95,7 +112,7 @@ export default function UsersScreen() {
             {/* Header */}
             <View style={styles.header}>
                 <Text style={styles.title}>Users</Text>
-                <Text style={styles.subtitle}>{users.length} registered accounts</Text>
+                <Text style={styles.subtitle}>{users.length}{nextCursor ? '+' : ''} registered accounts</Text>
             </View>
 
             {/* Stats strip */}
@@ -138,6 +155,9 @@ export default function UsersScreen() {
                     keyExtractor={item => item.id}
                     renderItem={renderItem}
                     contentContainerStyle={styles.list}
+                    onEndReached={loadMore}
+                    onEndReachedThreshold={0.5}
+                    ListFooterComponent={loadingMore ? <ActivityIndicator color="#C5A028" style={{ marginVertical: 16 }} /> : null}
                     refreshControl={
                         <RefreshControl
                             refreshing={refreshing}
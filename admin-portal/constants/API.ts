@@ -1 +1,20 @@
 export const API_BASE_URL = 'http://192.168.1.40:8000';
+
+// Headers for admin API calls; the backend verifies the Supabase access token
+export const adminHeaders = (token?: string, extra: Record<string, string> = {}) => ({
+    'bypass-tunnel-reminder': 'true',
+    ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    ...extra,
+});
+
+// Admin lists come a page at a time, newest first; when there are more rows
+// the backend sends the next page's query string in X-Next-Cursor
+export const fetchAdminPage = async <T>(path: string, token?: string, cursor?: string | null) => {
+    const separator = path.includes('?') ? '&' : '?';
+    const response = await fetch(`${API_BASE_URL}${path}${cursor ? separator + cursor : ''}`, {
+        headers: adminHeaders(token),
+    });
+    if (!response.ok) throw new Error(`Request failed with status ${response.status}`);
+    const rows: T[] = await response.json();
+    return { rows, nextCursor: response.headers.get('X-Next-Cursor') };
+};
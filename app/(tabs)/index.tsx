@@ -5,7 +5,7 @@ import { ActivityIndicator, Alert, Animated, Image, Pressable, ScrollView, Style
 import ScrollTopButton from '@/components/ScrollTopButton';
 import { Text, View } from '@/components/Themed';
 import { useColorScheme } from '@/components/useColorScheme';
-import { API_BASE_URL } from '@/constants/API';
+import { API_BASE_URL, productImage } from '@/constants/API';
 import { Colors } from '@/constants/Colors';
 import { Product } from '@/constants/mockData';
 import { useAuth } from '@/context/AuthContext';
@@ -189,14 +189,14 @@ export default function HomeScreen() {
                   ]}
                   onPress={() => router.push({ pathname: '/product/[id]', params: { id: prod.id } })}
                 >
-                  <Image source={{ uri: prod.image }} style={styles.productImage} />
+                  <Image source={{ uri: productImage(prod, 'card') }} style={styles.productImage} />
                   <View style={styles.productInfo}>
                     <Text style={[styles.prodName, { color: currentColors.text }]} numberOfLines={1}>{prod.name}</Text>
                     <Text style={styles.prodPrice}>{prod.price}</Text>
                     <Pressable
                       style={[styles.addButton, { backgroundColor: currentColors.tint }]}
                       onPress={() => {
-                        addToCart({ id: prod.id, name: prod.name, price: prod.price, image: prod.image });
+                        addToCart({ id: prod.id, name: prod.name, price: prod.price, image: productImage(prod, 'thumb') });
                         Alert.alert('Success', `${prod.name} added to cart!`);
                       }}
                     >
@@ -4,7 +4,7 @@ import Colors from '@/constants/Colors';
 import { useAuth } from '@/context/AuthContext';
 import { FontAwesome } from '@expo/vector-icons';
 import { useRouter } from 'expo-router';
-import React, { useCallback, useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import {
     FlatList,
     Pressable,
@@ -14,6 +14,9 @@ import {
     View
 } from 'react-native';
 
+// Reconnect backoff for the live feed, capped at 30s
+const MAX_RECONNECT_DELAY_MS = 30000;
+
 interface Notification {
     id: string;
     title: string;
@@ -67,12 +70,21 @@ export default function NotificationsScreen() {
     const [notifs, setNotifs] = useState<Notification[]>([]);
     const [loading, setLoading] = useState(true);
     const [refreshing, setRefreshing] = useState(false);
+    // Newest created_at received; the live feed resumes from here after a reconnect
+    const newestSeen = useRef<string | null>(null);
+
+    const noteSeen = (items: Notification[]) => {
+        for (const n of items) {
+            if (!newestSeen.current || n.created_at > newestSeen.current) newestSeen.current = n.created_at;
+        }
+    };
 
     const fetchNotifications = useCallback(async () => {
         try {
             const res = await fetch(`${API_BASE_URL}/notifications`);
             if (res.ok) {
                 const data = await res.json();
+                noteSeen(data);
                 setNotifs(data);
             }
         } catch (e) {
@@ -87,6 +99,38 @@ export default function NotificationsScreen() {
         fetchNotifications();
     }, [fetchNotifications]);
 
+    // Live feed: new notifications are pushed over a WebSocket instead of polled
+    useEffect(() => {
+        if (loading) return;
+        let socket: WebSocket | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let attempts = 0;
+        let stopped = false;
+
+        const connect = () => {
+            const since = newestSeen.current ? `?since=${encodeURIComponent(newestSeen.current)}` : '';
+            socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/notifications/ws${since}`);
+            socket.onmessage = (event) => {
+                const msg = JSON.parse(event.data);
+                attempts = 0;
+                if (msg.type !== 'notification') return;
+                noteSeen([msg.data]);
+                setNotifs((prev) => prev.some((n) => n.id === msg.data.id) ? prev : [msg.data, ...prev]);
+            };
+            socket.onclose = () => {
+                if (stopped) return;
+                retryTimer = setTimeout(connect, Math.min(MAX_RECONNECT_DELAY_MS, 1000 * 2 ** attempts++));
+            };
+        };
+
+        connect();
+        return () => {
+            stopped = true;
+            clearTimeout(retryTimer);
+            socket?.close();
+        };
+    }, [loading]);
+
     const onRefresh = () => {
         setRefreshing(true);
         fetchNotifications();
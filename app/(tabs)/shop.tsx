@@ -4,7 +4,7 @@ import { ActivityIndicator, Alert, Animated, Image, Pressable, ScrollView, Style
 
 import { Text, View } from '@/components/Themed';
 import { useColorScheme } from '@/components/useColorScheme';
-import { API_BASE_URL } from '@/constants/API';
+import { API_BASE_URL, productImage } from '@/constants/API';
 import { Colors } from '@/constants/Colors';
 import { Product } from '@/constants/mockData';
 import { useAuth } from '@/context/AuthContext';
@@ -235,12 +235,12 @@ export default function ShopScreen() {
                 <View key={prod.id} style={[styles.productItem, { width: `${(100 / numColumns) - 2}%` }]}>
                   <View style={[styles.imageContainer, { backgroundColor: currentColors.card, borderColor: currentColors.border, borderWidth: 1 }]}>
                     <Pressable onPress={() => router.push({ pathname: '/product/[id]', params: { id: prod.id } })}>
-                      <Image source={{ uri: prod.image }} style={styles.productImage} />
+                      <Image source={{ uri: productImage(prod, 'card') }} style={styles.productImage} />
                     </Pressable>
                     <Pressable
                       style={[styles.addButton, { backgroundColor: currentColors.tint }]}
                       onPress={() => {
-                        addToCart({ id: prod.id, name: prod.name, price: prod.price, image: prod.image });
+                        addToCart({ id: prod.id, name: prod.name, price: prod.price, image: productImage(prod, 'thumb') });
                         Alert.alert('Success', `${prod.name} added to cart!`);
                       }}
                     >
@@ -2,6 +2,7 @@ import { useColorScheme } from '@/components/useColorScheme';
 import { API_BASE_URL } from '@/constants/API';
 import { Colors } from '@/constants/Colors';
 import { useAuth } from '@/context/AuthContext';
+import { useCart } from '@/context/CartContext';
 import { FontAwesome } from '@expo/vector-icons';
 import { useRouter } from 'expo-router';
 import React, { useState } from 'react';
@@ -20,6 +21,7 @@ export default function PaymentOptionsScreen() {
     const [phoneNumber, setPhoneNumber] = useState('+254');
     const [isLoading, setIsLoading] = useState(false);
     const { userEmail } = useAuth();
+    const { cart } = useCart();
     const router = useRouter();
 
     const handleProceed = async () => {
@@ -34,10 +36,11 @@ export default function PaymentOptionsScreen() {
                 const response = await fetch(`${API_BASE_URL}/auth/stkpush`, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
+                    // The server prices the items itself and charges that total
                     body: JSON.stringify({
                         phone_number: phoneNumber,
-                        amount: 1,
-                        user_email: userEmail
+                        user_email: userEmail,
+                        items: cart.map((item) => ({ product_id: item.id, quantity: item.quantity }))
                     })
                 });
 
@@ -47,9 +50,12 @@ export default function PaymentOptionsScreen() {
                     throw new Error(data.detail || 'Failed to initiate M-Pesa payment');
                 }
 
+                // The cart stays until the payment goes through: the server
+                // empties it when M-Pesa confirms, and a cancelled prompt
+                // leaves it intact for another attempt
                 Alert.alert(
                     'Payment Initiated',
-                    'Please check your phone for the M-Pesa STK push to complete the payment.',
+                    `Please check your phone for the M-Pesa STK push of Ksh ${data.amount.toLocaleString()} to complete the payment.`,
                     [{ text: 'OK', onPress: () => router.replace('/(tabs)') }]
                 );
             } catch (error: any) {
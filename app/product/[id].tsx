@@ -3,7 +3,7 @@ import { ActivityIndicator, Alert, Image, Pressable, ScrollView, StyleSheet } fr
 
 import { Text, View } from '@/components/Themed';
 import { useColorScheme } from '@/components/useColorScheme';
-import { API_BASE_URL } from '@/constants/API';
+import { API_BASE_URL, productImage } from '@/constants/API';
 import { Colors } from '@/constants/Colors';
 import { Product } from '@/constants/mockData';
 import { useCart } from '@/context/CartContext';
@@ -63,7 +63,7 @@ export default function ProductDetailsScreen() {
         <View style={[styles.container, { backgroundColor: currentColors.background }]}>
             <ScrollView contentContainerStyle={styles.scrollContent} showsVerticalScrollIndicator={false}>
                 <View style={styles.imageContainer}>
-                    <Image source={{ uri: product.image }} style={styles.image} />
+                    <Image source={{ uri: productImage(product, 'detail') }} style={styles.image} />
                     <Pressable
                         style={[styles.backButton, { backgroundColor: 'rgba(0,0,0,0.3)' }]}
                         onPress={() => router.back()}
@@ -99,7 +99,7 @@ export default function ProductDetailsScreen() {
                 <Pressable
                     style={[styles.addButton, { backgroundColor: currentColors.tint }]}
                     onPress={() => {
-                        addToCart({ id: product.id, name: product.name, price: product.price, image: product.image });
+                        addToCart({ id: product.id, name: product.name, price: product.price, image: productImage(product, 'thumb') });
                         Alert.alert('Success', `${product.name} added to cart!`);
                     }}
                 >
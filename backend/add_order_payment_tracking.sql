@@ -0,0 +1,12 @@
+-- Track M-Pesa STK push outcomes on orders
+ALTER TABLE public.orders
+    ADD COLUMN IF NOT EXISTS checkout_request_id TEXT,
+    ADD COLUMN IF NOT EXISTS merchant_request_id TEXT,
+    ADD COLUMN IF NOT EXISTS mpesa_receipt TEXT,
+    ADD COLUMN IF NOT EXISTS result_desc TEXT,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+
+-- Callbacks look orders up by CheckoutRequestID
+CREATE UNIQUE INDEX IF NOT EXISTS orders_checkout_request_id_key
+ON public.orders (checkout_request_id);
+
@@ -0,0 +1,6 @@
+-- Natural key for products so seeding and imports can upsert idempotently
+ALTER TABLE public.products
+    ADD COLUMN IF NOT EXISTS sku TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS products_sku_key
+ON public.products (sku);
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request
+from supabase_client import supabase
+
+# Supabase project JWT secret (Settings -> API). Tokens signed with the newer
+# asymmetric keys are verified against the project's JWKS instead.
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+# Lets local setups without the JWT secret keep using the admin routes
+ADMIN_AUTH_ENFORCED = os.environ.get("ADMIN_AUTH_ENFORCED", "1") == "1"
+
+JWKS_TTL = 600.0
+# Unknown key ids trigger a JWKS refetch at most this often
+JWKS_MIN_REFRESH_INTERVAL = 30.0
+ROLE_CACHE_TTL = 60.0
+ROLE_CACHE_MAX_ENTRIES = 10000
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+
+class AuthUser:
+    __slots__ = ("id", "email", "role", "claims")
+
+    def __init__(self, id: str, email: Optional[str], role: str, claims: dict):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.claims = claims
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "Admin"
+
+
+class JWKSCache:
+    """Signing keys from /auth/v1/.well-known/jwks.json, cached by key id."""
+
+    def __init__(self):
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self):
+        client = await supabase.get_client()
+        response = await client.get(f"{supabase.url}/auth/v1/.well-known/jwks.json", headers={"apikey": supabase.headers["apikey"]})
+        response.raise_for_status()
+        import jwt
+        self._keys = {
+            key["kid"]: jwt.PyJWK(key)
+            for key in response.json().get("keys", [])
+            if "kid" in key
+        }
+        self._fetched_at = time.monotonic()
+
+    async def get(self, kid: str):
+        age = time.monotonic() - self._fetched_at
+        if kid in self._keys and age < JWKS_TTL:
+            return self._keys[kid]
+        async with self._lock:
+            age = time.monotonic() - self._fetched_at
+            # Rotated keys show up as unknown kids; refetch, but not on every bad token
+            if age >= JWKS_TTL or (kid not in self._keys and age >= JWKS_MIN_REFRESH_INTERVAL):
+                try:
+                    await self._fetch()
+                except Exception as e:
+                    # Keep verifying with the keys we already have
+                    print(f"JWKS fetch failed: {e}")
+        return self._keys.get(kid)
+
+
+class ProfileRoleCache:
+    """LRU + TTL cache of profiles.role by user id."""
+
+    def __init__(self, ttl: float = ROLE_CACHE_TTL, max_entries: int = ROLE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def set(self, user_id: str, role: str):
+        self._entries[user_id] = (role, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    async def get(self, user_id: str) -> str:
+        role = self._get(user_id)
+        if role is None:
+            # Concurrent misses for the same user share one request via get_table's single-flight
+            rows = await supabase.get_table("profiles", select="role", filters={"id": f"eq.{user_id}"})
+            role = rows[0]["role"] if rows else "User"
+            self.set(user_id, role)
+        return role
+
+
+jwks_cache = JWKSCache()
+role_cache = ProfileRoleCache()
+
+
+async def verify_token(token: str) -> dict:
+    """Validates a Supabase access token locally and returns its claims."""
+    # Imported on first use: PyJWT loads cryptography, ~90ms of every cold
+    # start otherwise, and only admin routes check tokens
+    import jwt
+    try:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not SUPABASE_JWT_SECRET:
+                raise HTTPException(status_code=500, detail="SUPABASE_JWT_SECRET is not configured")
+            key = SUPABASE_JWT_SECRET
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            key = await jwks_cache.get(header.get("kid"))
+            if key is None:
+                raise HTTPException(status_code=401, detail="Unknown signing key")
+        else:
+            raise HTTPException(status_code=401, detail="Unsupported token algorithm")
+        return jwt.decode(token, key, algorithms=[algorithm], audience=SUPABASE_JWT_AUDIENCE)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
+
+
+async def get_current_user(request: Request) -> AuthUser:
+    token = _bearer_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    claims = await verify_token(token)
+    user_id = claims.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Token has no subject")
+    # profiles.role decides access. The token's app_metadata copy can be up
+    # to a token lifetime old, so a demoted admin would keep access; the
+    # cached lookup picks up role changes within ROLE_CACHE_TTL instead.
+    role = await role_cache.get(user_id)
+    return AuthUser(user_id, claims.get("email"), role, claims)
+
+
+async def require_admin(request: Request) -> Optional[AuthUser]:
+    if not ADMIN_AUTH_ENFORCED:
+        return None
+    user = await get_current_user(request)
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
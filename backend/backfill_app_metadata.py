@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import time
+from supabase_client import supabase
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_CONCURRENCY = 8
+
+
+async def backfill_app_metadata(page_size: int = DEFAULT_PAGE_SIZE, concurrency: int = DEFAULT_CONCURRENCY, dry_run: bool = False):
+    """
+    One-time copy of profiles.role/full_name into each auth user's
+    app_metadata, so logins no longer need a profile query. Later changes
+    are mirrored by the trigger in create_profile_app_metadata_sync.sql.
+    Safe to re-run: the Admin API merges app_metadata and the values are
+    the same.
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    updated = 0
+    failed = 0
+
+    async def update(profile):
+        nonlocal updated, failed
+        async with semaphore:
+            try:
+                await supabase.update_app_metadata(profile["id"], {
+                    "role": profile.get("role") or "User",
+                    "full_name": profile.get("full_name") or "Member",
+                })
+                updated += 1
+            except Exception as e:
+                failed += 1
+                print(f"Failed to update {profile['id']}: {e}")
+
+    after_id = None
+    try:
+        while True:
+            filters = {"id": f"gt.{after_id}"} if after_id is not None else None
+            page = await supabase.get_table("profiles", select="id,role,full_name", filters=filters, limit=page_size, order="id.asc")
+            if dry_run:
+                updated += len(page)
+            else:
+                await asyncio.gather(*(update(profile) for profile in page))
+            print(f"Processed {updated + failed} profiles...")
+            if len(page) < page_size:
+                break
+            after_id = page[-1]["id"]
+    finally:
+        await supabase.close()
+
+    elapsed = time.perf_counter() - started
+    action = "Would update" if dry_run else "Updated"
+    print(f"{action} {updated} users ({failed} failed) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy profile role/full_name into Supabase app_metadata.")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true", help="count profiles without writing")
+    args = parser.parse_args()
+    asyncio.run(backfill_app_metadata(args.page_size, args.concurrency, args.dry_run))
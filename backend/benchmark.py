@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from fake_upstreams import BENCH_PASSWORD, CATEGORY_NAMES, FakeUpstreams, Latency, bench_email
+
+# Runs the API in-process against local Supabase/Daraja stand-ins and reports
+# throughput and latency percentiles per endpoint. As a regression gate:
+#   python benchmark.py --json-out baseline.json          (on the base branch)
+#   python benchmark.py --baseline baseline.json          (exits 1 on regression)
+
+# Weights of each user journey in the traffic mix
+DEFAULT_MIX = "browse=50,detail=30,search=5,login=10,checkout=5"
+DEFAULT_USERS = 20
+DEFAULT_DURATION = 20.0
+DEFAULT_WARMUP = 3.0
+SEARCH_TERMS = ["dress", "shoes", "bags", "item 1", "tops", "beauty"]
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    # Nearest-rank, so the result is always a latency that was actually observed
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}'; choose from {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.active = False
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        if not self.active:
+            return
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            stats = {
+                "count": len(ordered),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(ordered) / elapsed, 1),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            }
+            for p in PERCENTILES:
+                stats[f"p{p}_ms"] = round(percentile(ordered, p) * 1000, 2)
+            stats["max_ms"] = round(ordered[-1] * 1000, 2)
+            endpoints[endpoint] = stats
+        total = sum(s["count"] for s in endpoints.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 1),
+            "errors": sum(s["errors"] for s in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+class Session:
+    """One virtual user: sends requests to the in-process app and times them."""
+
+    def __init__(self, client, recorder: Recorder, rng: random.Random, products: int, users: int):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.products = products
+        self.user = rng.randrange(users)
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception:
+            self.recorder.record(endpoint, time.perf_counter() - started, False)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - started, response.status_code < 400)
+        return response
+
+    def product_id(self) -> str:
+        return str(self.rng.randint(1, self.products))
+
+    async def browse(self):
+        await self.call("GET /products", "GET", "/products", params={"limit": 20})
+        await self.call("GET /categories", "GET", "/categories")
+        await self.call("GET /products?category", "GET", "/products", params={"category": self.rng.choice(CATEGORY_NAMES), "limit": 20})
+
+    async def detail(self):
+        await self.call("GET /products/{id}", "GET", f"/products/{self.product_id()}")
+
+    async def search(self):
+        await self.call("GET /products/search", "GET", "/products/search", params={"q": self.rng.choice(SEARCH_TERMS)})
+
+    async def login(self):
+        await self.call("POST /auth/login", "POST", "/auth/login", json={"email": bench_email(self.user), "password": BENCH_PASSWORD})
+
+    async def checkout(self):
+        email = bench_email(self.user)
+        items = [{"product_id": self.product_id(), "quantity": self.rng.randint(1, 3)} for _ in range(self.rng.randint(1, 3))]
+        await self.call("PUT /cart", "PUT", "/cart", json={"email": email, "items": items})
+        response = await self.call("POST /auth/stkpush", "POST", "/auth/stkpush", json={"phone_number": "0712345678", "user_email": email, "items": items})
+        if response is None or response.status_code != 200:
+            return
+        stk = response.json()["data"]
+        # What Daraja sends once the customer enters their PIN
+        await self.call("POST /mpesa/callback", "POST", "/mpesa/callback", json={"Body": {"stkCallback": {
+            "MerchantRequestID": stk["MerchantRequestID"],
+            "CheckoutRequestID": stk["CheckoutRequestID"],
+            "ResultCode": 0,
+            "ResultDesc": "The service request is processed successfully.",
+            "CallbackMetadata": {"Item": [{"Name": "MpesaReceiptNumber", "Value": f"BENCH{self.rng.randrange(10 ** 8)}"}]},
+        }}})
+
+
+SCENARIOS = {
+    "browse": Session.browse,
+    "detail": Session.detail,
+    "search": Session.search,
+    "login": Session.login,
+    "checkout": Session.checkout,
+}
+
+
+async def run_load(app, args, upstreams: FakeUpstreams) -> dict:
+    import httpx
+    from write_queue import write_queue
+
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    stop_at = time.monotonic() + args.warmup + args.duration
+
+    async def virtual_user(index: int, client):
+        rng = random.Random(args.seed * 100003 + index)
+        session = Session(client, recorder, rng, args.products, args.pool_users)
+        while time.monotonic() < stop_at:
+            await SCENARIOS[rng.choices(names, weights)[0]](session)
+            if args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            users = [asyncio.create_task(virtual_user(i, client)) for i in range(args.users)]
+            await asyncio.sleep(args.warmup)
+            upstream_before = await asyncio.to_thread(upstreams.request_counts)
+            recorder.active = True
+            started, cpu_started = time.perf_counter(), time.process_time()
+            await asyncio.sleep(args.duration)
+            recorder.active = False
+            elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            write_backlog = write_queue.pending
+            upstream_after = await asyncio.to_thread(upstreams.request_counts)
+            await asyncio.gather(*users)
+
+    summary = recorder.summary(elapsed)
+    # Near 100% means the numbers measure CPU saturation, not upstream latency
+    summary["app_cpu_percent"] = round(cpu / elapsed * 100, 1)
+    # Background order writes still queued when measuring stopped
+    summary["write_queue_backlog"] = write_backlog
+    summary["upstream_requests"] = {
+        service: {key: count - upstream_before[service].get(key, 0) for key, count in sorted(after.items()) if count > upstream_before[service].get(key, 0)}
+        for service, after in upstream_after.items()
+    }
+    return summary
+
+
+def print_report(summary: dict, config: dict):
+    print(f"\n{config['users']} users, {summary['elapsed_s']}s measured, mix {config['mix']}, "
+          f"supabase {config['supabase_latency_ms']}ms +{config['jitter_ms']}ms, mpesa {config['mpesa_latency_ms']}ms")
+    header = f"{'endpoint':<26}{'count':>8}{'errors':>8}{'rps':>9}" + "".join(f"{'p' + str(p) + ' ms':>10}" for p in PERCENTILES) + f"{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:<26}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>9}"
+              + "".join(f"{stats[f'p{p}_ms']:>10}" for p in PERCENTILES) + f"{stats['max_ms']:>10}")
+    print("-" * len(header))
+    print(f"{'total':<26}{summary['requests']:>8}{summary['errors']:>8}{summary['rps']:>9}")
+    print(f"app process CPU: {summary['app_cpu_percent']}% of one core (includes the load generator)")
+    print(f"write queue backlog at end: {summary['write_queue_backlog']} jobs")
+    for service, counts in summary["upstream_requests"].items():
+        if counts:
+            per_request = sum(counts.values()) / max(1, summary["requests"])
+            print(f"{service} upstream calls: {sum(counts.values())} ({per_request:.2f} per app request) {counts}")
+
+
+def compare_to_baseline(summary: dict, baseline: dict, max_regression: float, min_regression_ms: float) -> list:
+    """Endpoints whose p95 or error count got worse than the baseline allows."""
+    failures = []
+    for endpoint, stats in summary["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before is None:
+            continue
+        limit = max(before["p95_ms"] * (1 + max_regression), before["p95_ms"] + min_regression_ms)
+        if stats["p95_ms"] > limit:
+            failures.append(f"{endpoint}: p95 {stats['p95_ms']}ms > {limit:.2f}ms (baseline {before['p95_ms']}ms)")
+        if stats["errors"] > before["errors"]:
+            failures.append(f"{endpoint}: {stats['errors']} errors (baseline {before['errors']})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API in-process against local Supabase and Daraja stand-ins.")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between journeys")
+    parser.add_argument("--supabase-latency-ms", type=float, default=20.0)
+    parser.add_argument("--mpesa-latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="random extra latency for both upstreams")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--pool-users", type=int, default=1000, help="accounts the virtual users log in as")
+    parser.add_argument("--no-response-cache", action="store_true", help="measure handlers rather than cache hits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json-out", help="write the results here, e.g. to use as a baseline")
+    parser.add_argument("--baseline", help="results file to compare against; exits 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="allowed p95 increase as a fraction")
+    parser.add_argument("--min-regression-ms", type=float, default=1.0, help="p95 increases below this are noise")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(
+        args.products,
+        args.pool_users,
+        Latency(args.supabase_latency_ms, args.jitter_ms),
+        Latency(args.mpesa_latency_ms, args.jitter_ms),
+    )
+    urls = upstreams.start()
+
+    # Read at import time by supabase_client, tracing and response_cache
+    os.environ["SUPABASE_URL"] = urls["supabase"]
+    os.environ["SUPABASE_KEY"] = "bench-service-key"
+    os.environ["SUPABASE_HTTP2"] = "0"
+    os.environ.setdefault("TRACE_LOG", "0")
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+    app_output = sys.stdout if args.verbose else open(os.devnull, "w")
+    try:
+        with contextlib.redirect_stdout(app_output):
+            import main as api
+            api.mpesa.base_url = urls["mpesa"]
+            summary = asyncio.run(run_load(api.app, args, upstreams))
+    finally:
+        upstreams.stop()
+
+    config = {
+        "users": args.users, "mix": args.mix, "think_ms": args.think_ms,
+        "supabase_latency_ms": args.supabase_latency_ms, "mpesa_latency_ms": args.mpesa_latency_ms,
+        "jitter_ms": args.jitter_ms, "products": args.products, "response_cache": not args.no_response_cache,
+    }
+    print_report(summary, config)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"config": config, **summary}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare_to_baseline(summary, json.load(f), args.max_regression, args.min_regression_ms)
+        if failures:
+            print("\nRegressions against baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import time
+import uuid
+from typing import Optional
+import httpx
+from supabase_client import supabase
+
+# How stale another worker's cached catalog may be after a write elsewhere
+CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get("CACHE_VERSION_CHECK_INTERVAL", "2"))
+
+
+class CacheVersions:
+    """
+    Cross-worker invalidation for the per-process caches (response cache,
+    category and search indexes). A write bumps its tags' rows in the
+    `cache_versions` table (create_cache_versions.sql); every worker reads
+    that table at most once per `interval` and runs the callbacks of the
+    tags whose version changed since its last look. Without the table the
+    caches fall back to expiring on their own TTLs.
+    """
+
+    def __init__(self, interval: float = CACHE_VERSION_CHECK_INTERVAL):
+        self.interval = interval
+        self.available = True
+        self._seen = None
+        self._checked_at = 0.0
+        self._callbacks = {}
+
+    def on_change(self, tag: str, callback):
+        self._callbacks.setdefault(tag, []).append(callback)
+
+    def _changed(self, tag: str):
+        for callback in self._callbacks.get(tag, []):
+            callback()
+
+    def _disable(self, e: Exception):
+        self.available = False
+        print(f"[CACHE] cache_versions unavailable ({e}); other workers' caches expire on their TTL only")
+
+    async def bump(self, *tags: str):
+        if not self.available:
+            return
+        version = uuid.uuid4().hex
+        try:
+            await supabase.upsert("cache_versions", [{"tag": tag, "version": version} for tag in tags], on_conflict="tag")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                self._disable(e)
+            else:
+                print(f"[CACHE] Failed to bump {', '.join(tags)}: {e}")
+        except Exception as e:
+            print(f"[CACHE] Failed to bump {', '.join(tags)}: {e}")
+        if self._seen is not None:
+            # Our own bump was already applied locally
+            self._seen.update({tag: version for tag in tags})
+
+    async def _fetch(self) -> Optional[dict]:
+        try:
+            rows = await supabase.get_table("cache_versions", select="tag,version", budget=1.0)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                self._disable(e)
+            else:
+                print(f"[CACHE] Version check failed: {e}")
+            return None
+        except Exception as e:
+            print(f"[CACHE] Version check failed: {e}")
+            return None
+        return {row["tag"]: row["version"] for row in rows}
+
+    async def baseline(self):
+        """Records the current versions; call before this worker caches anything."""
+        if self.available:
+            self._checked_at = time.monotonic()
+            versions = await self._fetch()
+            if versions is not None and self._seen is None:
+                self._seen = versions
+
+    async def check(self):
+        if not self.available or time.monotonic() - self._checked_at < self.interval:
+            return
+        self._checked_at = time.monotonic()
+        versions = await self._fetch()
+        if versions is None:
+            return
+        # Without a baseline, anything cached so far may predate a bump we never saw
+        changed = list(self._callbacks) if self._seen is None else [t for t, v in versions.items() if self._seen.get(t) != v]
+        self._seen = versions
+        for tag in changed:
+            self._changed(tag)
+
+
+cache_versions = CacheVersions()
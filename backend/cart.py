@@ -0,0 +1,161 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from supabase_client import supabase
+from inventory import UnknownProductError
+
+# Per process: bounds how long another worker's cart edit takes to show up
+CART_CACHE_TTL = 30.0
+CART_CACHE_MAX_ENTRIES = 10000
+MAX_CART_QUANTITY = 99
+
+
+class CartCache:
+    """
+    Priced carts by user email, LRU + TTL, for displaying the cart. Cart
+    writes invalidate the entry in the process that made them only; other
+    workers keep theirs until the TTL, as they do after a price change.
+    Checkout never charges from here (see get_cart's fresh).
+    """
+
+    def __init__(self, ttl: float = CART_CACHE_TTL, max_entries: int = CART_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, email: str):
+        entry = self._entries.get(email)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        self._entries.move_to_end(email)
+        return entry[0]
+
+    def set(self, email: str, cart: dict):
+        self._entries[email] = (cart, time.monotonic() + self.ttl)
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        self._entries.pop(email, None)
+
+
+cart_cache = CartCache()
+
+
+async def lookup_prices(product_ids) -> dict:
+    """Current name/price/image/stock for many products in one `in.(...)` query."""
+    ids = sorted({str(product_id) for product_id in product_ids})
+    if not ids:
+        return {}
+    quoted = ",".join(f'"{product_id}"' for product_id in ids)
+    rows = await supabase.get_table(
+        "products",
+        select="id,name,price_ksh,image_url,stock",
+        filters={"id": f"in.({quoted})"}
+    )
+    return {str(row["id"]): row for row in rows}
+
+
+async def price_items(items: list) -> dict:
+    """
+    Prices [{"product_id", "quantity"}] against the catalog. Returns
+    {"items": [...lines], "total_ksh", "item_count"}; raises
+    UnknownProductError if a product no longer exists.
+    """
+    quantities = {}
+    for item in items:
+        quantity = int(item["quantity"])
+        if quantity <= 0:
+            raise ValueError(f"Quantity must be positive for product {item['product_id']}")
+        product_id = str(item["product_id"])
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    products = await lookup_prices(quantities)
+    lines = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            raise UnknownProductError(product_id)
+        lines.append({
+            "product_id": product_id,
+            "name": product["name"],
+            "image": product["image_url"],
+            "unit_price_ksh": product["price_ksh"],
+            "quantity": quantity,
+            "line_total_ksh": product["price_ksh"] * quantity,
+            "in_stock": (product.get("stock") or 0) >= quantity,
+        })
+    return {
+        "items": lines,
+        "total_ksh": sum(line["line_total_ksh"] for line in lines),
+        "item_count": sum(line["quantity"] for line in lines),
+    }
+
+
+async def get_cart(email: str, fresh: bool = False) -> dict:
+    # fresh reads cart_items and prices from Supabase, whatever is cached
+    cart = None if fresh else cart_cache.get(email)
+    if cart is None:
+        rows = await supabase.get_table("cart_items", select="product_id,quantity", filters={"user_email": f"eq.{email}"}, order="updated_at.asc")
+        # Products deleted from the catalog cascade out of cart_items
+        cart = await price_items(rows)
+        cart_cache.set(email, cart)
+    return cart
+
+
+async def set_item(email: str, product_id: str, quantity: int) -> dict:
+    if quantity > MAX_CART_QUANTITY:
+        raise ValueError(f"At most {MAX_CART_QUANTITY} of one product per order")
+    filters = {"user_email": f"eq.{email}", "product_id": f"eq.{product_id}"}
+    try:
+        if quantity <= 0:
+            await supabase.delete("cart_items", filters)
+        else:
+            await supabase.upsert(
+                "cart_items",
+                {"user_email": email, "product_id": product_id, "quantity": quantity, "updated_at": datetime.now(timezone.utc).isoformat()},
+                on_conflict="user_email,product_id"
+            )
+    finally:
+        cart_cache.invalidate(email)
+    return await get_cart(email)
+
+
+async def replace_cart(email: str, items: list) -> dict:
+    """Makes the server cart match `items` (e.g. a cart built before login)."""
+    priced = await price_items(items)
+    if any(line["quantity"] > MAX_CART_QUANTITY for line in priced["items"]):
+        raise ValueError(f"At most {MAX_CART_QUANTITY} of one product per order")
+    try:
+        await supabase.delete("cart_items", {"user_email": f"eq.{email}"})
+        if priced["items"]:
+            await supabase.insert("cart_items", [
+                {"user_email": email, "product_id": line["product_id"], "quantity": line["quantity"]}
+                for line in priced["items"]
+            ])
+    finally:
+        cart_cache.invalidate(email)
+    cart_cache.set(email, priced)
+    return priced
+
+
+async def clear_cart(email: str):
+    try:
+        await supabase.delete("cart_items", {"user_email": f"eq.{email}"})
+    finally:
+        cart_cache.invalidate(email)
+
+
+def order_item_rows(checkout_request_id: str, priced: dict) -> list:
+    return [
+        {
+            "checkout_request_id": checkout_request_id,
+            "product_id": line["product_id"],
+            "name": line["name"],
+            "unit_price_ksh": line["unit_price_ksh"],
+            "quantity": line["quantity"],
+            "line_total_ksh": line["line_total_ksh"],
+        }
+        for line in priced["items"]
+    ]
@@ -0,0 +1,298 @@
+import asyncio
+import csv
+import io
+import json
+import time
+from typing import AsyncIterator, Optional
+from supabase_client import supabase
+from category_cache import category_index
+
+EXPORT_FIELDS = ["id", "name", "price", "category", "image", "description", "stock"]
+EXPORT_PAGE_SIZE = 1000
+
+BULK_INITIAL_BATCH = 100
+BULK_MIN_BATCH = 25
+BULK_MAX_BATCH = 1000
+BULK_CONCURRENCY = 4
+# Batches faster than half of this grow, slower ones shrink
+BULK_TARGET_BATCH_SECONDS = 1.0
+BULK_MAX_REPORTED_ERRORS = 100
+# A CSV record whose quoted field is still open past this size is rejected
+CSV_MAX_RECORD_CHARS = 1_000_000
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+def _parse_csv_record(text: str) -> list:
+    return next(csv.reader(io.StringIO(text, newline="")))
+
+
+async def iter_records(chunks: AsyncIterator[bytes], content_type: str) -> AsyncIterator[tuple]:
+    """
+    Yields (line_number, record_or_error) from an NDJSON or CSV body without
+    buffering the whole upload. CSV needs a header row; a quoted field may
+    span lines (descriptions do, in our own export), in which case the
+    record is reported by its first line.
+    """
+    is_csv = "csv" in (content_type or "")
+    header = None
+    line_number = 0
+    record_lines = []
+    record_start = 0
+    record_chars = 0
+    quotes = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if is_csv:
+            if not record_lines:
+                if not line.strip():
+                    continue
+                record_start = line_number
+            record_lines.append(line)
+            record_chars += len(line)
+            quotes += line.count('"')
+            # Quotes inside a field are doubled, so an odd count so far means
+            # a quoted field is still open and continues on the next line
+            if quotes % 2:
+                if record_chars > CSV_MAX_RECORD_CHARS:
+                    yield record_start, ValueError("unterminated quoted field")
+                    record_lines, record_chars, quotes = [], 0, 0
+                continue
+            text = "\n".join(record_lines)
+            record_lines, record_chars, quotes = [], 0, 0
+            try:
+                values = _parse_csv_record(text)
+            except csv.Error as e:
+                yield record_start, e
+                continue
+            if header is None:
+                header = [h.strip() for h in values]
+                continue
+            yield record_start, dict(zip(header, values))
+        else:
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+    if record_lines:
+        yield record_start, ValueError("unterminated quoted field")
+
+
+def to_product_row(record: dict) -> tuple:
+    # Accepts the export schema (price/image) as well as raw column names
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    price = record.get("price", record.get("price_ksh"))
+    if price in (None, ""):
+        raise ValueError("price is required")
+    category = (record.get("category") or "").strip()
+    if not category:
+        raise ValueError("category is required")
+    row = {
+        "name": name,
+        "price_ksh": int(float(price)),
+        "image_url": record.get("image", record.get("image_url")) or "",
+        "description": record.get("description") or None,
+    }
+    if record.get("id") not in (None, ""):
+        row["id"] = record["id"]
+    stock = record.get("stock")
+    if stock not in (None, ""):
+        row["stock"] = int(float(stock))
+        if row["stock"] < 0:
+            raise ValueError("stock cannot be negative")
+    elif "id" not in row:
+        # New products start unsellable unless the file says otherwise
+        row["stock"] = 0
+    return row, category
+
+
+class AdaptiveBatchWriter:
+    """
+    Writes product rows to Supabase in concurrent batches whose size adapts
+    to observed latency: fast batches double the size (up to BULK_MAX_BATCH),
+    slow or failed ones halve it. Rows carrying an id are upserted on id,
+    the rest inserted.
+    """
+
+    def __init__(self, concurrency: int = BULK_CONCURRENCY):
+        self.batch_size = BULK_INITIAL_BATCH
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def record_error(self, message: str):
+        if len(self.errors) < BULK_MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def _adapt(self, elapsed: float, ok: bool):
+        if not ok or elapsed > BULK_TARGET_BATCH_SECONDS:
+            self.batch_size = max(BULK_MIN_BATCH, self.batch_size // 2)
+        elif elapsed < BULK_TARGET_BATCH_SECONDS / 2:
+            self.batch_size = min(BULK_MAX_BATCH, self.batch_size * 2)
+
+    async def _write(self, rows: list):
+        try:
+            upserts = [row for row in rows if "id" in row]
+            inserts = [row for row in rows if "id" not in row]
+            started = time.monotonic()
+            ok = True
+            # PostgREST writes NULL for a key some rows of a batch lack, so
+            # updates that leave stock alone are sent apart from those that set it
+            for group in ([row for row in upserts if "stock" in row], [row for row in upserts if "stock" not in row]):
+                if not group:
+                    continue
+                try:
+                    await supabase.upsert("products", group, on_conflict="id")
+                    self.updated += len(group)
+                except Exception as e:
+                    ok = False
+                    self.failed += len(group)
+                    self.record_error(f"upsert of {len(group)} rows failed: {e}")
+            if inserts:
+                try:
+                    await supabase.insert("products", inserts)
+                    self.created += len(inserts)
+                except Exception as e:
+                    ok = False
+                    self.failed += len(inserts)
+                    self.record_error(f"insert of {len(inserts)} rows failed: {e}")
+            self._adapt(time.monotonic() - started, ok)
+        finally:
+            self._semaphore.release()
+
+    async def submit(self, rows: list):
+        # Taking the slot here blocks the parser while all writers are busy,
+        # so an upload is never buffered in memory faster than it is written
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._write(rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
+async def resolve_categories(names: set) -> tuple:
+    """
+    Maps category names to ids, creating all missing ones in a single insert.
+    Returns (name_to_id, created_names).
+    """
+    resolved = {}
+    missing = []
+    for name in names:
+        cat_id = await category_index.id_for(name)
+        if cat_id is None:
+            missing.append(name)
+        else:
+            resolved[name] = cat_id
+    if missing:
+        created = await supabase.insert("categories", [{"name": name} for name in missing])
+        for row in created:
+            resolved[row["name"]] = row["id"]
+        category_index.invalidate()
+    return resolved, missing
+
+
+async def bulk_import_products(chunks: AsyncIterator[bytes], content_type: str) -> dict:
+    writer = AdaptiveBatchWriter()
+    pending = []
+    category_ids = {}
+    categories_created = []
+    received = 0
+
+    async def dispatch():
+        nonlocal pending
+        unknown = {category for _, category in pending if category not in category_ids}
+        if unknown:
+            resolved, created = await resolve_categories(unknown)
+            category_ids.update(resolved)
+            categories_created.extend(created)
+        rows = [{**row, "category_id": category_ids[category]} for row, category in pending]
+        pending = []
+        await writer.submit(rows)
+
+    async for line_number, record in iter_records(chunks, content_type):
+        received += 1
+        if isinstance(record, Exception):
+            writer.failed += 1
+            writer.record_error(f"line {line_number}: {record}")
+            continue
+        try:
+            pending.append(to_product_row(record))
+        except (ValueError, TypeError, AttributeError) as e:
+            writer.failed += 1
+            writer.record_error(f"line {line_number}: {e}")
+            continue
+        if len(pending) >= writer.batch_size:
+            await dispatch()
+
+    if pending:
+        await dispatch()
+    await writer.flush()
+
+    return {
+        "received": received,
+        "created": writer.created,
+        "updated": writer.updated,
+        "failed": writer.failed,
+        "categories_created": categories_created,
+        "errors": writer.errors,
+    }
+
+
+async def export_products(fmt: str = "ndjson", category: Optional[str] = None) -> AsyncIterator[str]:
+    """Streams the catalog page by page (keyset on id) as NDJSON or CSV."""
+    resource_filters = {"name": f"eq.{category}"} if category else None
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow(EXPORT_FIELDS)
+        yield out.getvalue()
+
+    after_id = None
+    while True:
+        page = await supabase.get_embedded(
+            "products",
+            "categories",
+            resource_select="name",
+            filters={"id": f"gt.{after_id}"} if after_id is not None else None,
+            resource_filters=resource_filters,
+            limit=EXPORT_PAGE_SIZE,
+            order="id.asc"
+        )
+        out = io.StringIO()
+        writer = csv.writer(out) if fmt == "csv" else None
+        for p in page:
+            record = {
+                "id": p["id"],
+                "name": p["name"],
+                "price": p["price_ksh"],
+                "category": (p.get("categories") or {}).get("name", "Unknown"),
+                "image": p["image_url"],
+                "description": p.get("description"),
+                "stock": p.get("stock"),
+            }
+            if writer:
+                writer.writerow([record[field] if record[field] is not None else "" for field in EXPORT_FIELDS])
+            else:
+                out.write(json.dumps(record) + "\n")
+        yield out.getvalue()
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+        after_id = page[-1]["id"]
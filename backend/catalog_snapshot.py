@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from category_cache import category_index
+from search_index import product_search_index
+from supabase_client import supabase
+
+# Path of a snapshot written by this script (e.g. at deploy time); unset disables it
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT")
+# Older snapshots are ignored and the caches load from Supabase as usual
+CATALOG_SNAPSHOT_MAX_AGE = float(os.environ.get("CATALOG_SNAPSHOT_MAX_AGE", "86400"))
+
+
+async def write_snapshot(path: str) -> dict:
+    """Saves categories and the search-index catalog rows to `path` as JSON."""
+    categories, products = await asyncio.gather(
+        supabase.get_table("categories", select="id,name"),
+        product_search_index._fetch_catalog(),
+    )
+    snapshot = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "categories": categories,
+        "products": products,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return snapshot
+
+
+def load_snapshot(path: str = CATALOG_SNAPSHOT, max_age: float = CATALOG_SNAPSHOT_MAX_AGE) -> bool:
+    """
+    Seeds the category and search indexes from a snapshot file, so a cold
+    process answers /categories and /products/suggest without Supabase.
+    Both indexes then refresh on their usual TTLs. Synchronous and cheap,
+    so it can run at import time where there is no lifespan (serverless).
+    """
+    if not path:
+        return False
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+        age = time.time() - datetime.fromisoformat(snapshot["created_at"]).timestamp()
+        if age > max_age:
+            print(f"Catalog snapshot {path} is {age / 3600:.1f}h old; ignoring it")
+            return False
+        category_index.load(snapshot["categories"])
+        product_search_index.build(snapshot["products"])
+        return True
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Catalog snapshot {path} not loaded: {e}")
+        return False
+
+
+async def _main(path: str):
+    try:
+        snapshot = await write_snapshot(path)
+    finally:
+        await supabase.close()
+    print(f"Wrote {len(snapshot['categories'])} categories and {len(snapshot['products'])} products to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a catalog snapshot for fast cold starts (see CATALOG_SNAPSHOT).")
+    parser.add_argument("--out", default=CATALOG_SNAPSHOT or "catalog_snapshot.json")
+    args = parser.parse_args()
+    asyncio.run(_main(args.out))
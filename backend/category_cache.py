@@ -0,0 +1,73 @@
+import asyncio
+import time
+from typing import Optional
+from supabase_client import supabase
+
+# Per process; other workers' writes reach it through cache_versions.py
+CATEGORY_CACHE_TTL = 300.0
+
+
+class CategoryIndex:
+    """
+    In-memory name<->id index of the `categories` table.
+
+    Categories change rarely, so the catalog endpoints read them from here
+    instead of querying Supabase on every request. The index is loaded on
+    startup, reloaded once it is older than `ttl` seconds, and can be
+    invalidated explicitly when a category is created.
+    """
+
+    def __init__(self, ttl: float = CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self._by_name = {}
+        self._by_id = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self):
+        return self._loaded_at and (time.monotonic() - self._loaded_at) < self.ttl
+
+    def load(self, rows: list):
+        self._by_name = {row["name"]: row["id"] for row in rows}
+        self._by_id = {row["id"]: row["name"] for row in rows}
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self):
+        self.load(await supabase.get_table("categories", select="id,name", stale_ok=True))
+
+    async def ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # Another request may have refreshed while we waited on the lock
+            if self._is_fresh():
+                return
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the previous index while Supabase is unavailable
+                if not self._by_id:
+                    raise
+                print(f"Category index refresh failed, serving previous index: {e}")
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    async def id_for(self, name: str):
+        await self.ensure_loaded()
+        return self._by_name.get(name)
+
+    async def name_for(self, category_id, default: Optional[str] = "Unknown"):
+        await self.ensure_loaded()
+        return self._by_id.get(category_id, default)
+
+    async def id_to_name(self) -> dict:
+        await self.ensure_loaded()
+        return self._by_id
+
+    async def names(self) -> list:
+        await self.ensure_loaded()
+        return list(self._by_name)
+
+
+category_index = CategoryIndex()
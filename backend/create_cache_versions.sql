@@ -0,0 +1,15 @@
+-- Cross-worker cache invalidation (see cache_versions.py).
+-- Each API write that changes the catalog or notifications stores a new
+-- random version for its tags; workers poll this table every few seconds
+-- and drop their cached responses and indexes for the tags that changed.
+CREATE TABLE IF NOT EXISTS public.cache_versions (
+    tag TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO public.cache_versions (tag, version)
+VALUES ('products', '0'), ('categories', '0'), ('notifications', '0')
+ON CONFLICT (tag) DO NOTHING;
+
+ALTER TABLE public.cache_versions ENABLE ROW LEVEL SECURITY;
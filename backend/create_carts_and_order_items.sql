@@ -0,0 +1,39 @@
+-- Server-side carts and per-order line items (GET/PUT /cart, checkout)
+-- product_id must match products.id, whatever type the project created it with
+DO $$
+DECLARE
+    product_id_type TEXT;
+BEGIN
+    SELECT format_type(atttypid, atttypmod) INTO product_id_type
+    FROM pg_attribute
+    WHERE attrelid = 'public.products'::regclass AND attname = 'id';
+
+    EXECUTE format($sql$
+        CREATE TABLE IF NOT EXISTS public.cart_items (
+            user_email TEXT NOT NULL,
+            product_id %s NOT NULL REFERENCES public.products (id) ON DELETE CASCADE,
+            quantity INT NOT NULL CHECK (quantity > 0),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (user_email, product_id)
+        )
+    $sql$, product_id_type);
+
+    -- Name and price are snapshotted at checkout, so later catalog edits
+    -- don't change what an order was charged for
+    EXECUTE format($sql$
+        CREATE TABLE IF NOT EXISTS public.order_items (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            checkout_request_id TEXT NOT NULL,
+            product_id %s REFERENCES public.products (id) ON DELETE SET NULL,
+            name TEXT NOT NULL,
+            unit_price_ksh INT NOT NULL,
+            quantity INT NOT NULL CHECK (quantity > 0),
+            line_total_ksh INT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    $sql$, product_id_type);
+END $$;
+
+-- Line items are read per order, orders are keyed by CheckoutRequestID
+CREATE INDEX IF NOT EXISTS order_items_checkout_request_id_idx
+ON public.order_items (checkout_request_id);
@@ -0,0 +1,191 @@
+-- Inventory: atomic stock decrements and time-limited checkout reservations.
+-- Every function runs in the single transaction PostgREST opens for an RPC,
+-- and takes row locks on products in id order, so concurrent checkouts
+-- serialise per product (no lost updates) without deadlocking each other.
+-- Items are passed as JSON: [{"product_id": ..., "quantity": 2}, ...]
+
+ALTER TABLE public.products
+    ADD COLUMN IF NOT EXISTS stock INT NOT NULL DEFAULT 0;
+
+-- product_id must match products.id, whatever type the project created it with
+DO $$
+DECLARE
+    product_id_type TEXT;
+BEGIN
+    SELECT format_type(atttypid, atttypmod) INTO product_id_type
+    FROM pg_attribute
+    WHERE attrelid = 'public.products'::regclass AND attname = 'id';
+
+    EXECUTE format($sql$
+        CREATE TABLE IF NOT EXISTS public.inventory_reservations (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            reservation_ref TEXT NOT NULL,
+            product_id %s NOT NULL REFERENCES public.products (id) ON DELETE CASCADE,
+            quantity INT NOT NULL CHECK (quantity > 0),
+            status TEXT NOT NULL DEFAULT 'held',  -- held -> committed | released
+            expires_at TIMESTAMPTZ NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            UNIQUE (reservation_ref, product_id)
+        )
+    $sql$, product_id_type);
+END $$;
+
+-- The expiry sweep only looks at held reservations
+CREATE INDEX IF NOT EXISTS inventory_reservations_held_expires_idx
+ON public.inventory_reservations (expires_at) WHERE status = 'held';
+
+-- Orders remember which reservation their payment settles
+ALTER TABLE public.orders
+    ADD COLUMN IF NOT EXISTS reservation_ref TEXT;
+
+
+-- All-or-nothing decrement. Raises 'insufficient_stock' (detail: product id)
+-- if any product is short, or 'unknown_product' if one does not exist, and
+-- rolls back every item.
+CREATE OR REPLACE FUNCTION public.decrement_stock(items JSONB)
+RETURNS TABLE (product_id TEXT, stock INT)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    item RECORD;
+    pid public.products.id%TYPE;
+    remaining INT;
+BEGIN
+    FOR item IN
+        SELECT i.product_id, sum(i.quantity)::INT AS quantity
+        FROM jsonb_to_recordset(items) AS i (product_id TEXT, quantity INT)
+        GROUP BY i.product_id
+        ORDER BY i.product_id
+    LOOP
+        IF item.quantity IS NULL OR item.quantity <= 0 THEN
+            RAISE EXCEPTION 'invalid_quantity' USING DETAIL = item.product_id;
+        END IF;
+        -- Casting the JSON id to the key's own type keeps the lookup on the primary key
+        pid := item.product_id;
+        UPDATE public.products p
+        SET stock = p.stock - item.quantity
+        WHERE p.id = pid AND p.stock >= item.quantity
+        RETURNING p.stock INTO remaining;
+        IF NOT FOUND THEN
+            IF EXISTS (SELECT 1 FROM public.products p WHERE p.id = pid) THEN
+                RAISE EXCEPTION 'insufficient_stock' USING DETAIL = item.product_id;
+            END IF;
+            RAISE EXCEPTION 'unknown_product' USING DETAIL = item.product_id;
+        END IF;
+        product_id := item.product_id;
+        stock := remaining;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+
+-- Decrements stock and records a held reservation under `ref`. Retrying with
+-- the same ref returns the existing reservation instead of taking stock twice.
+CREATE OR REPLACE FUNCTION public.reserve_stock(ref TEXT, items JSONB, ttl_seconds INT DEFAULT 600)
+RETURNS TABLE (product_id TEXT, quantity INT, expires_at TIMESTAMPTZ)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    item RECORD;
+    pid public.products.id%TYPE;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('reservation:' || ref));
+    IF NOT EXISTS (SELECT 1 FROM public.inventory_reservations r WHERE r.reservation_ref = ref) THEN
+        FOR item IN SELECT * FROM public.decrement_stock(items) LOOP
+            pid := item.product_id;
+            INSERT INTO public.inventory_reservations (reservation_ref, product_id, quantity, expires_at)
+            SELECT ref, pid, sum(j.quantity)::INT, now() + make_interval(secs => ttl_seconds)
+            FROM jsonb_to_recordset(items) AS j (product_id TEXT, quantity INT)
+            WHERE j.product_id = item.product_id;
+        END LOOP;
+    END IF;
+    RETURN QUERY
+        SELECT r.product_id::TEXT, r.quantity, r.expires_at
+        FROM public.inventory_reservations r
+        WHERE r.reservation_ref = ref;
+END;
+$$;
+
+
+-- Payment succeeded: the held stock is sold. Returns the rows settled.
+CREATE OR REPLACE FUNCTION public.commit_reservation(ref TEXT)
+RETURNS INT
+LANGUAGE sql
+AS $$
+    WITH committed AS (
+        UPDATE public.inventory_reservations
+        SET status = 'committed'
+        WHERE reservation_ref = ref AND status = 'held'
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM committed;
+$$;
+
+
+-- Puts held stock back. Only 'held' rows are touched, so releasing twice
+-- (or after a commit) is a no-op. `ref` NULL releases every expired hold.
+CREATE OR REPLACE FUNCTION public.release_reservations(ref TEXT DEFAULT NULL)
+RETURNS INT
+LANGUAGE sql
+AS $$
+    WITH released AS (
+        UPDATE public.inventory_reservations r
+        SET status = 'released'
+        WHERE r.id IN (
+            SELECT id FROM public.inventory_reservations
+            WHERE status = 'held'
+              AND (CASE WHEN ref IS NULL THEN expires_at < now() ELSE reservation_ref = ref END)
+            ORDER BY product_id
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING r.product_id, r.quantity
+    ),
+    restocked AS (
+        UPDATE public.products p
+        SET stock = p.stock + t.quantity
+        FROM (SELECT product_id, sum(quantity)::INT AS quantity FROM released GROUP BY product_id) t
+        WHERE p.id = t.product_id
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM released;
+$$;
+
+
+-- Bulk relative adjustments (restocks, corrections): [{"product_id", "delta"}].
+-- All-or-nothing; refuses to take any product below zero.
+CREATE OR REPLACE FUNCTION public.adjust_stock(adjustments JSONB)
+RETURNS TABLE (product_id TEXT, stock INT)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    item RECORD;
+    pid public.products.id%TYPE;
+    updated INT;
+BEGIN
+    FOR item IN
+        SELECT a.product_id, sum(a.delta)::INT AS delta
+        FROM jsonb_to_recordset(adjustments) AS a (product_id TEXT, delta INT)
+        GROUP BY a.product_id
+        ORDER BY a.product_id
+    LOOP
+        pid := item.product_id;
+        UPDATE public.products p
+        SET stock = p.stock + item.delta
+        WHERE p.id = pid AND p.stock + item.delta >= 0
+        RETURNING p.stock INTO updated;
+        IF NOT FOUND THEN
+            IF EXISTS (SELECT 1 FROM public.products p WHERE p.id = pid) THEN
+                RAISE EXCEPTION 'insufficient_stock' USING DETAIL = item.product_id;
+            END IF;
+            RAISE EXCEPTION 'unknown_product' USING DETAIL = item.product_id;
+        END IF;
+        product_id := item.product_id;
+        stock := updated;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
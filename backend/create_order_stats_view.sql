@@ -0,0 +1,17 @@
+-- Aggregated order totals for the admin dashboard (/admin/stats)
+-- One row per status, so the dashboard payload stays constant-size
+-- regardless of how many orders exist.
+CREATE OR REPLACE VIEW public.order_stats AS
+SELECT
+    status,
+    count(*) AS order_count,
+    coalesce(sum(amount), 0) AS revenue,
+    coalesce(sum(amount) FILTER (
+        WHERE created_at >= date_trunc('day', now() AT TIME ZONE 'Africa/Nairobi') AT TIME ZONE 'Africa/Nairobi'
+    ), 0) AS revenue_today
+FROM public.orders
+GROUP BY status;
+
+-- Supports the recent-orders list and created_at range filters
+CREATE INDEX IF NOT EXISTS orders_created_at_idx
+ON public.orders (created_at DESC);
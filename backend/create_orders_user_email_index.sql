@@ -0,0 +1,5 @@
+-- Index for per-user order history (GET /orders?email=...)
+-- Matches the query shape user_email = ? ORDER BY created_at DESC, id DESC
+-- so each page is an index range scan instead of a full table scan.
+CREATE INDEX IF NOT EXISTS orders_user_email_created_at_idx
+ON public.orders (user_email, created_at DESC, id DESC);
@@ -0,0 +1,44 @@
+-- Full-text search over products (GET /products/search)
+-- Names weigh more than descriptions; the 'simple' configuration keeps
+-- brand-like words unstemmed so prefix matching behaves predictably.
+ALTER TABLE public.products
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS products_search_vector_idx
+ON public.products USING GIN (search_vector);
+
+-- Ranked search with prefix matching on every word ("vel cha" -> velvet chair)
+CREATE OR REPLACE FUNCTION public.search_products(
+    search_query TEXT,
+    category_name TEXT DEFAULT NULL,
+    result_limit INT DEFAULT 20,
+    result_offset INT DEFAULT 0
+)
+RETURNS TABLE (
+    id public.products.id%TYPE,
+    name public.products.name%TYPE,
+    price_ksh public.products.price_ksh%TYPE,
+    image_url public.products.image_url%TYPE,
+    description public.products.description%TYPE,
+    category public.categories.name%TYPE,
+    rank REAL
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH query AS (
+        SELECT to_tsquery('simple', string_agg(quote_literal(lexeme) || ':*', ' & ')) AS tsq
+        FROM unnest(tsvector_to_array(to_tsvector('simple', search_query))) AS lexeme
+    )
+    SELECT p.id, p.name, p.price_ksh, p.image_url, p.description, c.name AS category,
+           ts_rank(p.search_vector, query.tsq) AS rank
+    FROM public.products p
+    JOIN query ON p.search_vector @@ query.tsq
+    LEFT JOIN public.categories c ON c.id = p.category_id
+    WHERE category_name IS NULL OR c.name = category_name
+    ORDER BY rank DESC, p.id
+    LIMIT result_limit OFFSET result_offset;
+$$;
@@ -0,0 +1,25 @@
+-- Mirror profiles.role and full_name into the auth user's app_metadata.
+-- /auth/login reads them from there instead of querying profiles, so a role
+-- changed anywhere (promote_user.py, the dashboard, plain SQL) shows up at
+-- the user's next login. profiles stays the source of truth.
+CREATE OR REPLACE FUNCTION public.sync_profile_app_metadata()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    UPDATE auth.users
+    SET raw_app_meta_data = coalesce(raw_app_meta_data, '{}'::jsonb) || jsonb_build_object(
+        'role', coalesce(NEW.role, 'User'),
+        'full_name', coalesce(NEW.full_name, 'Member')
+    )
+    WHERE id = NEW.id;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS profiles_sync_app_metadata ON public.profiles;
+CREATE TRIGGER profiles_sync_app_metadata
+AFTER INSERT OR UPDATE OF role, full_name ON public.profiles
+FOR EACH ROW EXECUTE FUNCTION public.sync_profile_app_metadata();
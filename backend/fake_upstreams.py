@@ -0,0 +1,410 @@
+import asyncio
+import random
+import socket
+import multiprocessing
+import uuid
+from datetime import datetime, timedelta, timezone
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# Local stand-ins for Supabase (PostgREST + GoTrue) and Daraja, served over
+# real HTTP so the app's pools, timeouts and tracing behave as in production.
+# They implement only what the app's routes send; see benchmark.py.
+
+BENCH_PASSWORD = "bench-password"
+# Request counts by "METHOD target", read by the benchmark before and after measuring
+STATS_PATH = "/__bench/requests"
+CATEGORY_NAMES = ["Dresses", "Shoes", "Bags", "Jewellery", "Tops", "Skirts", "Accessories", "Beauty"]
+
+
+class Latency:
+    """Per-request delay in seconds: `base` plus up to `jitter`, uniformly."""
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.base = base_ms / 1000
+        self.jitter = jitter_ms / 1000
+
+    async def wait(self):
+        delay = self.base + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _timestamp(offset_seconds: float = 0) -> str:
+    return (datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=offset_seconds)).isoformat()
+
+
+def _split_select(select: str) -> tuple:
+    """'id,name,categories!inner(name)' -> (['id', 'name'], {'categories': ['name']})"""
+    columns, embeds, depth, current = [], {}, 0, ""
+    for char in select + ",":
+        if char == "," and depth == 0:
+            part = current.strip()
+            current = ""
+            if "(" in part:
+                name, inner = part.split("(", 1)
+                embeds[name.split("!")[0]] = [c.strip() for c in inner.rstrip(")").split(",")]
+            elif part:
+                columns.append(part)
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    return columns, embeds
+
+
+def _matches(value, condition: str) -> bool:
+    op, _, operand = condition.partition(".")
+    if op == "in":
+        return str(value) in {v.strip().strip('"') for v in operand.strip("()").split(",")}
+    if op == "eq":
+        return str(value) == operand
+    if op == "neq":
+        return str(value) != operand
+    if value is None:
+        return False
+    if isinstance(value, (int, float)):
+        operand = type(value)(operand)
+    return {"gt": value > operand, "gte": value >= operand, "lt": value < operand, "lte": value <= operand}.get(op, True)
+
+
+class FakeSupabase:
+    """
+    In-memory PostgREST and GoTrue. Tables are lists of dicts; filters
+    support eq/neq/in/gt/gte/lt/lte, `order`, `limit`/`offset`, a
+    categories embed and exact counts. The inventory RPCs are atomic
+    because nothing awaits between their check and their write.
+    """
+
+    def __init__(self, products: int = 500, users: int = 1000, latency: Latency = None, handshake_ms: float = 0.0):
+        self.latency = latency or Latency()
+        # Extra delay on each new connection's first request, standing in for TCP + TLS setup
+        self.handshake = handshake_ms / 1000
+        self._connections = set()
+        self.requests = {}
+        self.tables = {"categories": [], "products": [], "profiles": [], "orders": [], "order_items": [],
+                       "cart_items": [], "notifications": [], "inventory_reservations": [], "cache_versions": []}
+        self.auth_users = {}
+        for i, name in enumerate(CATEGORY_NAMES, start=1):
+            self.tables["categories"].append({"id": i, "name": name})
+        for i in range(1, products + 1):
+            self.tables["products"].append({
+                "id": i,
+                "name": f"{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]} item {i}",
+                "price_ksh": 500 + (i * 37) % 4500,
+                "category_id": i % len(CATEGORY_NAMES) + 1,
+                "image_url": f"https://images.unsplash.com/photo-{1500000000 + i}?w=500",
+                "description": f"Benchmark product {i}",
+                "stock": 10 ** 9,
+                "created_at": _timestamp(i),
+            })
+        for i in range(users):
+            user_id = str(uuid.UUID(int=i + 1))
+            email = bench_email(i)
+            self.auth_users[email] = {"id": user_id, "email": email, "app_metadata": {"role": "User", "full_name": f"Bench User {i}"}}
+            self.tables["profiles"].append({"id": user_id, "email": email, "full_name": f"Bench User {i}", "role": "User"})
+
+    async def _accept(self, request: Request, target: str):
+        # Counts the request, then waits out the simulated network time
+        key = f"{request.method} {target}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if self.handshake and request.client not in self._connections:
+            self._connections.add(request.client)
+            self.requests["connections"] = self.requests.get("connections", 0) + 1
+            await asyncio.sleep(self.handshake)
+        await self.latency.wait()
+
+    def _select(self, table: str, params) -> list:
+        rows = self.tables.get(table, [])
+        columns, embeds = _split_select(params.get("select", "*"))
+        embed_filters = {}
+        for key, condition in params.items():
+            if key in ("select", "order", "limit", "offset", "on_conflict", "or"):
+                continue
+            if "." in key:
+                embed_filters[key] = condition
+                continue
+            rows = [row for row in rows if _matches(row.get(key), condition)]
+
+        if "categories" in embeds:
+            categories = {c["id"]: c for c in self.tables["categories"]}
+            joined = []
+            for row in rows:
+                category = categories.get(row.get("category_id"))
+                if category is None and embed_filters:
+                    continue
+                if not all(_matches(category.get(key.split(".", 1)[1]), cond) for key, cond in embed_filters.items()):
+                    continue
+                joined.append({**row, "categories": {c: category[c] for c in embeds["categories"]} if category else None})
+            rows = joined
+
+        for key in reversed((params.get("order") or "").split(",")):
+            if key:
+                column, _, direction = key.partition(".")
+                rows = sorted(rows, key=lambda row: row.get(column) or 0, reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", 0))
+        rows = rows[offset:]
+        if "limit" in params:
+            rows = rows[:int(params["limit"])]
+        if columns and "*" not in columns:
+            keep = set(columns) | set(embeds)
+            rows = [{k: v for k, v in row.items() if k in keep} for row in rows]
+        return rows
+
+    def _matching(self, table: str, params) -> list:
+        rows = self.tables.get(table, [])
+        for key, condition in params.items():
+            if key not in ("select", "on_conflict"):
+                rows = [row for row in rows if _matches(row.get(key), condition)]
+        return rows
+
+    async def root(self, request: Request):
+        await self._accept(request, "root")
+        return Response()
+
+    async def table(self, request: Request):
+        table = request.path_params["table"]
+        await self._accept(request, table)
+        params = request.query_params
+        if request.method in ("GET", "HEAD"):
+            rows = self._select(table, params)
+            if request.method == "HEAD":
+                return Response(headers={"Content-Range": f"*/{len(rows)}"})
+            return JSONResponse(rows)
+        if request.method == "POST":
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            conflict = params.get("on_conflict")
+            stored = []
+            for row in rows:
+                row = {"id": row.get("id") or str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat(), **row}
+                if conflict:
+                    keys = conflict.split(",")
+                    existing = [r for r in self.tables.setdefault(table, []) if all(str(r.get(k)) == str(row.get(k)) for k in keys)]
+                    if existing:
+                        existing[0].update(row)
+                        stored.append(existing[0])
+                        continue
+                self.tables.setdefault(table, []).append(row)
+                stored.append(row)
+            return JSONResponse(stored, status_code=201)
+        if request.method == "PATCH":
+            changes = await request.json()
+            rows = self._matching(table, params)
+            for row in rows:
+                row.update(changes)
+            return JSONResponse(rows)
+        if request.method == "DELETE":
+            rows = self._matching(table, params)
+            ids = {id(row) for row in rows}
+            self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in ids]
+            return JSONResponse(rows)
+        return Response(status_code=405)
+
+    def _error(self, message: str, details: str):
+        return JSONResponse({"code": "P0001", "message": message, "details": details, "hint": None}, status_code=400)
+
+    async def rpc(self, request: Request):
+        function_name = request.path_params["function"]
+        await self._accept(request, f"rpc/{function_name}")
+        params = await request.json()
+        products = {str(p["id"]): p for p in self.tables["products"]}
+        reservations = self.tables["inventory_reservations"]
+
+        if function_name in ("reserve_stock", "decrement_stock"):
+            items = params["items"]
+            ref = params.get("ref")
+            held = [r for r in reservations if ref and r["ref"] == ref]
+            if held:
+                return JSONResponse([{"product_id": r["product_id"], "quantity": r["quantity"]} for r in held])
+            for item in items:
+                product = products.get(item["product_id"])
+                if product is None:
+                    return self._error("unknown_product", item["product_id"])
+                if product["stock"] < item["quantity"]:
+                    return self._error("insufficient_stock", item["product_id"])
+            for item in items:
+                products[item["product_id"]]["stock"] -= item["quantity"]
+                if ref:
+                    reservations.append({"ref": ref, "product_id": item["product_id"], "quantity": item["quantity"], "status": "held"})
+            return JSONResponse([{"product_id": i["product_id"], "quantity": i["quantity"], "stock": products[i["product_id"]]["stock"]} for i in items])
+
+        if function_name in ("commit_reservation", "release_reservations"):
+            ref = params.get("ref")
+            held = [r for r in reservations if r["status"] == "held" and ref is not None and r["ref"] == ref]
+            for r in held:
+                r["status"] = "committed" if function_name == "commit_reservation" else "released"
+                if r["status"] == "released":
+                    products[r["product_id"]]["stock"] += r["quantity"]
+            return JSONResponse(len(held))
+
+        if function_name == "search_products":
+            query = params["search_query"].lower()
+            rows = [p for p in self.tables["products"] if query in p["name"].lower()]
+            offset, limit = params.get("result_offset") or 0, params.get("result_limit") or 20
+            return JSONResponse(rows[offset:offset + limit])
+
+        return JSONResponse({"message": f"Unknown function {function_name}"}, status_code=404)
+
+    async def token(self, request: Request):
+        await self._accept(request, "auth/token")
+        body = await request.json()
+        user = self.auth_users.get(body.get("email"))
+        if user is None or body.get("password") != BENCH_PASSWORD:
+            return JSONResponse({"error": "invalid_grant", "error_description": "Invalid login credentials"}, status_code=400)
+        return JSONResponse({"access_token": f"bench-{user['id']}", "token_type": "bearer", "expires_in": 3600, "user": user})
+
+    async def admin_users(self, request: Request):
+        await self._accept(request, "auth/admin/users")
+        body = await request.json()
+        if request.method == "PUT":
+            user = next((u for u in self.auth_users.values() if u["id"] == request.path_params.get("user_id")), None)
+            if user is None:
+                return JSONResponse({"msg": "User not found"}, status_code=404)
+            user["app_metadata"].update(body.get("app_metadata") or {})
+            return JSONResponse(user)
+        if body["email"] in self.auth_users:
+            return JSONResponse({"msg": "User already registered"}, status_code=422)
+        user = {"id": str(uuid.uuid4()), "email": body["email"], "app_metadata": body.get("app_metadata") or {}}
+        self.auth_users[body["email"]] = user
+        return JSONResponse(user)
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/rest/v1/", self.root, methods=["GET", "HEAD"]),
+            Route("/rest/v1/rpc/{function}", self.rpc, methods=["POST"]),
+            Route("/rest/v1/{table}", self.table, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+            Route("/auth/v1/token", self.token, methods=["POST"]),
+            Route("/auth/v1/admin/users", self.admin_users, methods=["POST"]),
+            Route("/auth/v1/admin/users/{user_id}", self.admin_users, methods=["PUT"]),
+            Route(STATS_PATH, self.stats, methods=["GET"]),
+        ])
+
+    async def stats(self, request: Request):
+        return JSONResponse(self.requests)
+
+
+class FakeDaraja:
+    """Daraja OAuth and STK push; every push is accepted."""
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.requests = {}
+        self.pushes = 0
+
+    async def oauth(self, request: Request):
+        self.requests["GET oauth"] = self.requests.get("GET oauth", 0) + 1
+        await self.latency.wait()
+        return JSONResponse({"access_token": "bench-token", "expires_in": "3599"})
+
+    async def stk_push(self, request: Request):
+        self.requests["POST stkpush"] = self.requests.get("POST stkpush", 0) + 1
+        await self.latency.wait()
+        body = await request.json()
+        self.pushes += 1
+        return JSONResponse({
+            "MerchantRequestID": f"bench-m-{self.pushes}",
+            "CheckoutRequestID": f"ws_CO_bench_{self.pushes}_{uuid.uuid4().hex[:8]}",
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+            "PhoneNumber": body.get("PhoneNumber"),
+        })
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/oauth/v1/generate", self.oauth, methods=["GET"]),
+            Route("/mpesa/stkpush/v1/processrequest", self.stk_push, methods=["POST"]),
+            Route(STATS_PATH, self.stats, methods=["GET"]),
+        ])
+
+    async def stats(self, request: Request):
+        return JSONResponse(self.requests)
+
+
+def bench_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def _listen() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Without it every small response waits ~40ms on Nagle + delayed ACK
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def _serve(conn, products: int, users: int, supabase_latency: Latency, mpesa_latency: Latency, handshake_ms: float):
+    import uvicorn
+
+    apps = {
+        "supabase": FakeSupabase(products, users, supabase_latency, handshake_ms).app(),
+        "mpesa": FakeDaraja(mpesa_latency).app(),
+    }
+    servers, urls = [], {}
+    for name, app in apps.items():
+        sock = _listen()
+        urls[name] = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        config = uvicorn.Config(app, log_level="warning", access_log=False, lifespan="off")
+        servers.append((uvicorn.Server(config), sock))
+
+    async def main():
+        tasks = [asyncio.create_task(server.serve(sockets=[sock])) for server, sock in servers]
+        while not all(server.started for server, _ in servers):
+            await asyncio.sleep(0.01)
+        conn.send(urls)
+        # Anything from the parent, or the pipe closing, means stop
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        except EOFError:
+            pass
+        for server, _ in servers:
+            server.should_exit = True
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+
+class FakeUpstreams:
+    """
+    Runs FakeSupabase and FakeDaraja with uvicorn in a child process, so
+    their CPU time and GIL stay off the process being measured, as a
+    remote Supabase's would.
+    """
+
+    def __init__(self, products: int = 500, users: int = 1000, supabase_latency: Latency = None, mpesa_latency: Latency = None, handshake_ms: float = 0.0):
+        self._args = (products, users, supabase_latency or Latency(), mpesa_latency or Latency(), handshake_ms)
+        self._conn = None
+        self._process = None
+        self.urls = {}
+
+    def start(self, timeout: float = 15.0) -> dict:
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn, *self._args), name="fake-upstreams", daemon=True)
+        self._process.start()
+        if not self._conn.poll(timeout):
+            self.stop()
+            raise RuntimeError("Fake upstream servers did not start")
+        self.urls = self._conn.recv()
+        return self.urls
+
+    def request_counts(self) -> dict:
+        import httpx
+
+        return {name: httpx.get(url + STATS_PATH).json() for name, url in self.urls.items()}
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            self._conn.send("stop")
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+import httpx
+from supabase_client import supabase
+from tracing import TracingTransport
+
+# Checked without importing: Pillow is only loaded when a variant is first rendered
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "alpha_image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Used to build absolute variant URLs; relative paths when unset
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "").rstrip("/")
+# Comma-separated hosts (subdomains included) images may be fetched from.
+# Unset allows any host with a public address; listed hosts may be private.
+IMAGE_SOURCE_HOSTS = [host.strip().lower() for host in os.environ.get("IMAGE_SOURCE_HOSTS", "").split(",") if host.strip()]
+
+# Target widths; images are never upscaled
+IMAGE_VARIANTS = {"thumb": 160, "card": 480, "detail": 1080}
+DEFAULT_VARIANT = "card"
+WEBP_QUALITY = 78
+SOURCE_MAX_BYTES = 15 * 1024 * 1024
+SOURCE_TIMEOUT = 15.0
+SOURCE_MAX_REDIRECTS = 3
+PRODUCT_IMAGE_TTL = 600.0
+PRODUCT_IMAGE_MAX_ENTRIES = 10000
+
+
+def image_version(image_url: str) -> str:
+    # Changes whenever the product's image does, so variant URLs can be cached forever
+    return hashlib.sha1((image_url or "").encode()).hexdigest()[:10]
+
+
+def image_fields(product_id, image_url: str) -> dict:
+    """Variant URLs for a catalog response: image_variants plus a srcset string."""
+    version = image_version(image_url)
+    variants = {
+        name: f"{PUBLIC_BASE_URL}/img/{product_id}?size={name}&v={version}"
+        for name in IMAGE_VARIANTS
+    }
+    srcset = ", ".join(f"{variants[name]} {width}w" for name, width in IMAGE_VARIANTS.items())
+    return {"image_variants": variants, "srcset": srcset}
+
+
+def source_fetch_url(image_url: str) -> str:
+    # Unsplash resizes on request; ask for the largest variant instead of
+    # whatever width was baked into the stored URL (seed.py uses w=500)
+    parts = urlsplit(image_url)
+    if parts.hostname != "images.unsplash.com":
+        return image_url
+    query = dict(parse_qsl(parts.query))
+    query.update({"w": str(max(IMAGE_VARIANTS.values())), "q": "85", "fm": "jpg"})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class UnsafeSourceError(ValueError):
+    """The image URL points somewhere the server must not fetch from."""
+
+
+def is_http_url(url: str) -> bool:
+    parts = urlsplit(url or "")
+    return parts.scheme in ("http", "https") and bool(parts.hostname)
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global
+
+
+def _listed_host(host: str) -> bool:
+    return any(host == allowed or host.endswith("." + allowed) for allowed in IMAGE_SOURCE_HOSTS)
+
+
+async def check_source_url(url: str) -> bool:
+    """
+    Rejects URLs the proxy must not fetch: product image URLs come from
+    clients, so without this anyone could make the server request internal
+    hosts (cloud metadata, the database, admin ports). Returns whether the
+    host's addresses must also be public (false for IMAGE_SOURCE_HOSTS).
+    """
+    if not is_http_url(url):
+        raise UnsafeSourceError("Image URL must be http(s)")
+    parts = urlsplit(url)
+    host = parts.hostname.lower()
+    if IMAGE_SOURCE_HOSTS:
+        if not _listed_host(host):
+            raise UnsafeSourceError(f"{host} is not in IMAGE_SOURCE_HOSTS")
+        return False
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (ValueError, socket.gaierror) as e:
+        raise UnsafeSourceError(f"Cannot resolve {host}: {e}")
+    if not infos or not all(_is_public_address(info[4][0]) for info in infos):
+        raise UnsafeSourceError(f"{host} resolves to a non-public address")
+    return True
+
+
+def _check_peer(response: httpx.Response):
+    # The name may resolve differently by the time httpx connects (DNS
+    # rebinding), so check the address actually connected to before reading
+    stream = response.extensions.get("network_stream")
+    server = stream.get_extra_info("server_addr") if stream is not None else None
+    if server and not _is_public_address(server[0]):
+        raise UnsafeSourceError(f"Connected to non-public address {server[0]}")
+
+
+def render_variants(data: bytes) -> dict:
+    """Decodes the source once and encodes every variant as WebP. CPU bound."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+        rendered = {}
+        for name, width in IMAGE_VARIANTS.items():
+            image = source
+            if source.width > width:
+                height = max(1, round(source.height * width / source.width))
+                image = source.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+            rendered[name] = out.getvalue()
+        return rendered
+
+
+class DiskImageCache:
+    """
+    Content-addressed variant store: files are named after the SHA-256 of
+    the source bytes, so products sharing an image share its variants.
+    A small pointer file maps each source URL to its digest. Total size
+    is bounded; the least recently served files are evicted first, with
+    mtime as the recency stamp so the order survives restarts.
+
+    The directory is shared by every worker on the host. A file another
+    worker rendered is picked up on first use, and the index is rebuilt
+    from disk after each write, so the size bound covers all of them.
+    """
+
+    def __init__(self, root: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()
+        self._total = 0
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        os.makedirs(os.path.join(self.root, "variants"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "urls"), exist_ok=True)
+        self._scan()
+        self._loaded = True
+
+    def _scan(self):
+        found = []
+        with os.scandir(os.path.join(self.root, "variants")) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".webp"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        # Evicted by another worker mid-scan
+                        continue
+                    found.append((stat.st_mtime, entry.path, stat.st_size))
+        self._files = OrderedDict((path, size) for _, path, size in sorted(found))
+        self._total = sum(self._files.values())
+
+    def _url_pointer(self, source_url: str) -> str:
+        return os.path.join(self.root, "urls", hashlib.sha256(source_url.encode()).hexdigest())
+
+    def variant_path(self, digest: str, variant: str) -> str:
+        return os.path.join(self.root, "variants", f"{digest}-{variant}.webp")
+
+    def digest_for(self, source_url: str) -> Optional[str]:
+        self._load()
+        try:
+            with open(self._url_pointer(source_url)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get(self, digest: str, variant: str) -> Optional[str]:
+        self._load()
+        path = self.variant_path(digest, variant)
+        if path not in self._files:
+            try:
+                # Rendered by another worker since this one last looked
+                self._files[path] = os.stat(path).st_size
+            except FileNotFoundError:
+                return None
+            self._total += self._files[path]
+        self._files.move_to_end(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(path)
+            return None
+        return path
+
+    def put(self, source_url: str, digest: str, rendered: dict):
+        self._load()
+        for variant, data in rendered.items():
+            self._write(self.variant_path(digest, variant), data)
+        self._write(self._url_pointer(source_url), digest.encode())
+        if rendered:
+            # Other workers write here too; count their files before evicting
+            self._scan()
+            self._evict()
+
+    def _write(self, path: str, data: bytes):
+        # Write then rename, so a reader never sees a half-written file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _forget(self, path: str):
+        size = self._files.pop(path, None)
+        if size is not None:
+            self._total -= size
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._files) > len(IMAGE_VARIANTS):
+            path, size = self._files.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        self._load()
+        return {"files": len(self._files), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+class ImageProxy:
+    def __init__(self, cache: DiskImageCache = None):
+        self.cache = cache or DiskImageCache()
+        self._client = None
+        self._product_urls = OrderedDict()
+        # Source URLs being fetched, shared by concurrent first requests
+        self._inflight = {}
+
+    async def get_client(self):
+        if self._client is None or self._client.is_closed:
+            # Redirects are followed by _download, which checks every hop
+            self._client = httpx.AsyncClient(
+                timeout=SOURCE_TIMEOUT,
+                follow_redirects=False,
+                transport=TracingTransport(httpx.AsyncHTTPTransport(), "image_source", lambda path: "source")
+            )
+        return self._client
+
+    async def image_url_for(self, product_id: str) -> Optional[str]:
+        entry = self._product_urls.get(product_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        rows = await supabase.get_table("products", select="image_url", filters={"id": f"eq.{product_id}"}, stale_ok=True)
+        image_url = rows[0]["image_url"] if rows else None
+        self._product_urls[product_id] = (image_url, time.monotonic() + PRODUCT_IMAGE_TTL)
+        self._product_urls.move_to_end(product_id)
+        while len(self._product_urls) > PRODUCT_IMAGE_MAX_ENTRIES:
+            self._product_urls.popitem(last=False)
+        return image_url
+
+    def forget(self, product_id: Optional[str] = None):
+        """Drops the cached image URL of one product, or of all of them."""
+        if product_id is None:
+            self._product_urls.clear()
+        else:
+            self._product_urls.pop(product_id, None)
+
+    async def _download(self, url: str) -> bytes:
+        client = await self.get_client()
+        for _ in range(SOURCE_MAX_REDIRECTS + 1):
+            must_be_public = await check_source_url(url)
+            async with client.stream("GET", url) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                response.raise_for_status()
+                if must_be_public:
+                    _check_peer(response)
+                declared = response.headers.get("content-length", "")
+                if declared.isdigit() and int(declared) > SOURCE_MAX_BYTES:
+                    raise ValueError(f"Source image is {declared} bytes")
+                # Stop reading past the cap rather than hold whatever is sent
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > SOURCE_MAX_BYTES:
+                        raise ValueError(f"Source image is over {SOURCE_MAX_BYTES} bytes")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+        raise ValueError(f"More than {SOURCE_MAX_REDIRECTS} redirects")
+
+    async def _fetch_and_render(self, source_url: str) -> str:
+        data = await self._download(source_fetch_url(source_url))
+        digest = hashlib.sha256(data).hexdigest()
+        if not all(self.cache.get(digest, name) for name in IMAGE_VARIANTS):
+            rendered = await asyncio.to_thread(render_variants, data)
+            self.cache.put(source_url, digest, rendered)
+        else:
+            # Same picture under another URL: reuse its variants
+            self.cache.put(source_url, digest, {})
+        return digest
+
+    async def variant(self, product_id: str, variant: str) -> Optional[str]:
+        """Path of the cached variant file, fetching and rendering the source on first use."""
+        image_url = await self.image_url_for(product_id)
+        if not image_url:
+            return None
+        digest = self.cache.digest_for(image_url)
+        path = self.cache.get(digest, variant) if digest else None
+        if path:
+            return path
+        future = self._inflight.get(image_url)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_and_render(image_url))
+            self._inflight[image_url] = future
+            future.add_done_callback(lambda _: self._inflight.pop(image_url, None))
+        digest = await asyncio.shield(future)
+        return self.cache.get(digest, variant)
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+image_proxy = ImageProxy()
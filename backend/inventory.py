@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+import httpx
+from supabase_client import supabase
+
+# Held stock is returned after this long if the order never settles. Longer
+# than orders.PENDING_ORDER_TTL, so the order sweeper normally releases first.
+RESERVATION_TTL_SECONDS = 600
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, product_id: str):
+        super().__init__(f"Insufficient stock for product {product_id}")
+        self.product_id = product_id
+
+
+class UnknownProductError(Exception):
+    def __init__(self, product_id: str):
+        super().__init__(f"Unknown product {product_id}")
+        self.product_id = product_id
+
+
+def normalize_items(items: list, field: str = "quantity") -> list:
+    """
+    Merges duplicate products and sorts by id, the order the SQL functions
+    lock rows in. Items are dicts with product_id and `field`.
+    """
+    merged = {}
+    for item in items:
+        product_id = str(item["product_id"])
+        merged[product_id] = merged.get(product_id, 0) + int(item[field])
+    return [{"product_id": product_id, field: amount} for product_id, amount in sorted(merged.items())]
+
+
+async def _call(function_name: str, params: dict):
+    # The inventory functions RAISE with the product id as detail; PostgREST
+    # returns that as a 400 body {"code": "P0001", "message", "details"}
+    try:
+        return await supabase.rpc(function_name, params)
+    except httpx.HTTPStatusError as e:
+        try:
+            error = e.response.json()
+        except ValueError:
+            raise e
+        if error.get("message") == "insufficient_stock":
+            raise InsufficientStockError(error.get("details")) from None
+        if error.get("message") == "unknown_product":
+            raise UnknownProductError(error.get("details")) from None
+        if error.get("message") == "invalid_quantity":
+            raise ValueError(f"Quantity must be positive for product {error.get('details')}") from None
+        raise
+
+
+async def decrement_stock(items: list) -> dict:
+    """Atomically takes stock for every item or none. Returns {product_id: remaining}."""
+    rows = await _call("decrement_stock", {"items": normalize_items(items)})
+    return {row["product_id"]: row["stock"] for row in rows}
+
+
+async def reserve(items: list, reservation_ref: str = None, ttl_seconds: int = RESERVATION_TTL_SECONDS) -> str:
+    """
+    Holds stock for a checkout and returns the reservation ref. The hold is
+    committed when the payment succeeds and released when it fails, times out
+    or expires. Reusing a ref is idempotent.
+    """
+    for item in items:
+        if int(item["quantity"]) <= 0:
+            raise ValueError(f"Quantity must be positive for product {item['product_id']}")
+    reservation_ref = reservation_ref or uuid.uuid4().hex
+    await _call("reserve_stock", {
+        "ref": reservation_ref,
+        "items": normalize_items(items),
+        "ttl_seconds": ttl_seconds
+    })
+    return reservation_ref
+
+
+async def commit(reservation_ref: str) -> int:
+    settled = await _call("commit_reservation", {"ref": reservation_ref})
+    if not settled:
+        # Expired and released before the payment landed; stock may need a manual check
+        print(f"Reservation {reservation_ref} had nothing held to commit")
+    return settled
+
+
+async def release(reservation_ref: str) -> int:
+    return await _call("release_reservations", {"ref": reservation_ref})
+
+
+async def release_expired() -> int:
+    return await _call("release_reservations", {"ref": None})
+
+
+async def adjust_stock(adjustments: list) -> dict:
+    """Applies relative stock deltas atomically. Returns {product_id: new_stock}."""
+    rows = await _call("adjust_stock", {"adjustments": normalize_items(adjustments, field="delta")})
+    return {row["product_id"]: row["stock"] for row in rows}
+
+
+async def run_reservation_sweeper(interval: float = 60.0):
+    # Backstop for holds whose order was never written or never settled
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = await release_expired()
+            if released:
+                print(f"Released {released} expired stock reservations")
+        except Exception as e:
+            print(f"Reservation sweep failed: {e}")
@@ -1,21 +1,124 @@
 import os
-import base64
+import asyncio
 import time
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from supabase_client import supabase
+from auth import require_admin
+from category_cache import category_index
+from search_index import product_search_index
+from catalog_snapshot import load_snapshot
+import catalog_io
+from response_cache import response_cache, ResponseCacheMiddleware
+from cache_versions import cache_versions
+from tracing import TracingMiddleware, metrics, METRICS_TOKEN
+from mpesa_client import mpesa, format_phone_number
+from write_queue import write_queue
+import orders
+import inventory
+import cart
+from notification_hub import notification_hub, sse_event, parse_timestamp, SSE_HEARTBEAT_INTERVAL
+from image_proxy import image_proxy, image_fields, image_version, is_http_url, IMAGE_VARIANTS, DEFAULT_VARIANT, PILLOW_AVAILABLE
 from pydantic import BaseModel
 import httpx
 
-app = FastAPI(title="Alpha Boutique Smart Webs API")
+# Storefront pages requested through the app at startup, so each worker's
+# response cache and stale-read copies are filled before real traffic
+WARMUP_PATHS = [path for path in os.environ.get("WARMUP_PATHS", "/products,/categories").split(",") if path]
+
+# Set PREWARM=0 where background work can't outlive a request (serverless)
+PREWARM = os.environ.get("PREWARM", "1") == "1"
+
+# At import rather than in the lifespan, which serverless runtimes may skip
+load_snapshot()
+
+# What a write to each tag makes stale in this worker's caches
+_TAG_CACHES = {
+    "products": lambda: (response_cache.invalidate("products"), product_search_index.invalidate()),
+    "categories": lambda: (response_cache.invalidate("categories"), category_index.invalidate()),
+    "notifications": lambda: response_cache.invalidate("notifications"),
+}
+for _tag, _drop in _TAG_CACHES.items():
+    cache_versions.on_change(_tag, _drop)
+
+async def invalidate_catalog(*tags: str):
+    """Drops cached data for `tags` here at once, and in other workers on their next version check."""
+    for tag in tags:
+        _TAG_CACHES[tag]()
+    await cache_versions.bump(*tags)
+
+async def _warm_caches():
+    # Runs in every worker: caches, pools and tokens are per process
+    try:
+        await supabase.prewarm()
+    except Exception as e:
+        print(f"Supabase connection warm-up failed: {e}")
+    # Baseline for cross-worker invalidation, taken before anything is cached
+    await cache_versions.baseline()
+    # No-ops when the catalog snapshot already filled them
+    results = await asyncio.gather(category_index.ensure_loaded(), product_search_index.ensure_loaded(), return_exceptions=True)
+    for name, result in zip(("Category index", "Search index"), results):
+        if isinstance(result, Exception):
+            print(f"{name} warm-up failed: {result}")
+    if mpesa.is_configured:
+        try:
+            await mpesa.get_access_token()
+        except Exception as e:
+            print(f"M-Pesa token warm-up failed: {e}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://warmup") as client:
+        for path in WARMUP_PATHS:
+            try:
+                await client.get(path)
+            except Exception as e:
+                print(f"Warm-up request {path} failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"Backend started with SUPABASE_URL: {os.environ.get('SUPABASE_URL')}")
+    # In the background, so the worker accepts requests while the pool, caches
+    # and token warm up; a request arriving first just loads what it needs
+    warmup = asyncio.create_task(_warm_caches()) if PREWARM else None
+    write_queue.start()
+    order_sweeper = asyncio.create_task(orders.run_pending_order_sweeper())
+    reservation_sweeper = asyncio.create_task(inventory.run_reservation_sweeper())
+    notification_sync = asyncio.create_task(notification_hub.run_sync())
+
+    yield
+
+    notification_sync.cancel()
+    reservation_sweeper.cancel()
+    order_sweeper.cancel()
+    if warmup:
+        warmup.cancel()
+    # Flush queued order writes before the pools they use are drained and closed
+    await write_queue.stop()
+    await mpesa.close()
+    await image_proxy.close()
+    await supabase.close()
+
+app = FastAPI(title="Alpha Boutique Smart Webs API", lifespan=lifespan)
 
 @app.get("/")
 async def root():
     return {"status": "success", "message": "Alpha Boutique API is live and running!"}
 
-print(f"Backend started with SUPABASE_URL: {os.environ.get('SUPABASE_URL')}")
+@app.get("/health/pool")
+async def pool_health():
+    return {"supabase": supabase.pool_stats(), "mpesa": mpesa.pool_stats(), "notification_subscribers": notification_hub.subscriber_count}
+
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    # Prometheus text format; latency histograms for this worker only
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Registered before CORS so cached replies still pass through the CORS layer
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, versions=cache_versions)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,17 +126,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "X-Request-ID", "Server-Timing"],
 )
 
-ADMIN_SECRET_CODE = os.environ.get("ADMIN_SECRET_CODE", "123456")
+# Outermost, so request timings include cache hits and CORS preflights
+app.add_middleware(TracingMiddleware)
 
-# M-Pesa Credentials
-MPESA_CONSUMER_KEY = os.environ.get("MPESA_CONSUMER_KEY", "GTWADFxIpUfDoNikNGqq1C3023evM6UH")
-MPESA_CONSUMER_SECRET = os.environ.get("MPESA_CONSUMER_SECRET", "amFbAoUByPV2rM5A")
-MPESA_SHORTCODE = os.environ.get("MPESA_SHORTCODE", "174379")
-MPESA_PASSKEY = os.environ.get("MPESA_PASSKEY", "bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919")
-MPESA_CALLBACK_URL = os.environ.get("MPESA_CALLBACK_URL", "https://modcom.co.ke/job/confirmation.php")
-MPESA_ENV = os.environ.get("MPESA_ENV", "sandbox") # sandbox or production
+ADMIN_SECRET_CODE = os.environ.get("ADMIN_SECRET_CODE", "123456")
 
 class Product(BaseModel):
     id: str
@@ -42,6 +141,8 @@ class Product(BaseModel):
     category: str
     image: str
     description: Optional[str] = None
+    image_variants: Optional[dict] = None
+    srcset: Optional[str] = None
 
 class CreateProduct(BaseModel):
     name: str
@@ -67,10 +168,33 @@ class UserSignUp(BaseModel):
 class UpdateProductStock(BaseModel):
     stock: int
 
+class OrderItem(BaseModel):
+    product_id: str
+    quantity: int = 1
+
+class StockAdjustment(BaseModel):
+    product_id: str
+    delta: int
+
+class AdjustStock(BaseModel):
+    adjustments: List[StockAdjustment]
+
 class STKPushRequest(BaseModel):
     phone_number: str
-    amount: int
+    # Ignored: the charge is computed from the items (or the user's server cart)
+    amount: Optional[int] = None
+    # Required; checked in the handler so the app gets a readable message
     user_email: Optional[str] = None
+    # Defaults to the user's server cart; the stock is reserved before the prompt
+    items: Optional[List[OrderItem]] = None
+
+class CartItemUpdate(BaseModel):
+    email: str
+    quantity: int
+
+class ReplaceCart(BaseModel):
+    email: str
+    items: List[OrderItem]
 
 class UpdateOrderStatus(BaseModel):
     order_id: str
@@ -108,8 +232,11 @@ class CreateFeedback(BaseModel):
 @app.post("/auth/signup")
 async def signup(user: UserSignUp):
     try:
-        # 1. Signup user via Admin API (auto-confirms email, no email sent)
-        auth_result = await supabase.signup(user.email, user.password)
+        # 1. Signup user via Admin API (auto-confirms email, no email sent).
+        # Role and name go into app_metadata so every login token carries them.
+        role = "Admin" if user.admin_code == ADMIN_SECRET_CODE else "User"
+        full_name = f"{user.first_name} {user.last_name}"
+        auth_result = await supabase.signup(user.email, user.password, app_metadata={"role": role, "full_name": full_name})
         print(f"Auth result keys: {list(auth_result.keys())}")
         
         # Admin API returns user object at the root level
@@ -118,31 +245,31 @@ async def signup(user: UserSignUp):
         if not user_id:
             raise Exception("Failed to create user account. Please try again.")
 
-        # 2. Determine role
-        role = "Admin" if user.admin_code == ADMIN_SECRET_CODE else "User"
-        
-        # 3. Create/Update profile
+        # 2. Create the profile and auto-login concurrently; neither depends on the other
+        # (email is auto-confirmed so the login always works)
         print(f"Creating profile for {user_id} ({user.email})...")
         profile_data = {
             "id": user_id,
             "email": user.email,
-            "full_name": f"{user.first_name} {user.last_name}",
+            "full_name": full_name,
             "role": role
         }
-        try:
-            await supabase.upsert("profiles", profile_data, on_conflict="id")
+        profile_result, login_result = await asyncio.gather(
+            supabase.upsert("profiles", profile_data, on_conflict="id"),
+            supabase.login(user.email, user.password),
+            return_exceptions=True
+        )
+        if isinstance(profile_result, Exception):
+            print(f"Profile creation deferred: {profile_result}")
+        else:
             print("Profile created/updated successfully.")
-        except Exception as profile_err:
-            print(f"Profile creation deferred: {profile_err}")
 
-        # 4. Auto-login to get a real access token (email is auto-confirmed so this always works)
         access_token = None
-        try:
-            login_result = await supabase.login(user.email, user.password)
+        if isinstance(login_result, Exception):
+            print(f"Auto-login after signup failed: {login_result}")
+        else:
             access_token = login_result.get("access_token")
             print(f"Auto-login after signup successful, token obtained.")
-        except Exception as login_err:
-            print(f"Auto-login after signup failed: {login_err}")
 
         return {
             "status": "success", 
@@ -169,86 +296,85 @@ async def signup(user: UserSignUp):
 
 @app.post("/auth/stkpush")
 async def stk_push(request: STKPushRequest):
-    if not MPESA_CONSUMER_KEY or not MPESA_CONSUMER_SECRET or not MPESA_PASSKEY:
+    if not mpesa.is_configured:
         raise HTTPException(status_code=500, detail="M-Pesa credentials not configured on server")
+    if not request.user_email:
+        # The order row is what carries the stock reservation to the callback;
+        # without one a payment could never commit the held stock
+        raise HTTPException(status_code=422, detail="Please sign in to check out")
 
+    # The amount charged is always priced here from the catalog, never taken from the client
     try:
-        # 1. Get Access Token
-        api_url = "https://sandbox.safaricom.co.ke" if MPESA_ENV == "sandbox" else "https://api.safaricom.co.ke"
-        auth_url = f"{api_url}/oauth/v1/generate?grant_type=client_credentials"
-        
-        auth_string = f"{MPESA_CONSUMER_KEY}:{MPESA_CONSUMER_SECRET}"
-        encoded_auth = base64.b64encode(auth_string.encode()).decode()
-        
-        async with httpx.AsyncClient() as client:
-            auth_response = await client.get(
-                auth_url,
-                headers={"Authorization": f"Basic {encoded_auth}"}
-            )
-            auth_response.raise_for_status()
-            access_token = auth_response.json()["access_token"]
-
-            # 2. Initiate STK Push
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            password_str = f"{MPESA_SHORTCODE}{MPESA_PASSKEY}{timestamp}"
-            password = base64.b64encode(password_str.encode()).decode()
-            
-            # Format phone number: ensure it starts with 254
-            phone = request.phone_number.strip().replace("+", "")
-            if phone.startswith("0"):
-                phone = "254" + phone[1:]
-            elif not phone.startswith("254"):
-                phone = "254" + phone
-            elif not phone.startswith("254"):
-                phone = "254" + phone
-
-            checkout_url = f"{api_url}/mpesa/stkpush/v1/processrequest"
-            payload = {
-                "BusinessShortCode": MPESA_SHORTCODE,
-                "Password": password,
-                "Timestamp": timestamp,
-                "TransactionType": "CustomerPayBillOnline",
-                "Amount": request.amount,
-                "PartyA": phone,
-                "PartyB": MPESA_SHORTCODE,
-                "PhoneNumber": phone,
-                "CallBackURL": MPESA_CALLBACK_URL,
-                "AccountReference": "AlphaBoutique",
-                "TransactionDesc": "Payment for order"
-            }
-            
-            stk_response = await client.post(
-                checkout_url,
-                headers={"Authorization": f"Bearer {access_token}"},
-                json=payload
-            )
-            stk_data = stk_response.json()
-            
-            if stk_response.status_code != 200:
-                print(f"STK Push Error: {stk_data}")
-                raise HTTPException(status_code=400, detail=stk_data.get("errorMessage", "Failed to initiate M-Pesa payment"))
+        if request.items:
+            priced = await cart.price_items([{"product_id": item.product_id, "quantity": item.quantity} for item in request.items])
+        else:
+            # Charged amount and order_items must reflect the cart and prices now
+            priced = await cart.get_cart(request.user_email, fresh=True)
+    except (inventory.UnknownProductError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not priced or not priced["items"]:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    amount = priced["total_ksh"]
+    if request.amount is not None and request.amount != amount:
+        print(f"STK Push: client amount {request.amount} differs from server total {amount}; charging {amount}")
 
-            # Save order to Supabase
-            if request.user_email:
-                try:
-                    order_data = {
-                        "user_email": request.user_email,
-                        "phone_number": phone,
-                        "amount": request.amount,
-                        "payment_method": "mpesa",
-                        "status": "pending"
-                    }
-                    await supabase.insert("orders", [order_data])
-                    print(f"Order saved for {request.user_email}")
-                except Exception as order_err:
-                    print(f"Failed to save order: {order_err}")
-
-            return {"status": "success", "message": "STK Push initiated", "data": stk_data}
-            
+    try:
+        reservation_ref = await inventory.reserve(priced["items"])
+    except inventory.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except inventory.UnknownProductError as e:
+        # Deleted between pricing and reserving
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        # Access token is cached and the connection pool reused across payments
+        phone = format_phone_number(request.phone_number)
+        status_code, stk_data = await mpesa.stk_push(phone, amount)
+
+        if status_code != 200:
+            print(f"STK Push Error: {stk_data}")
+            raise HTTPException(status_code=400, detail=stk_data.get("errorMessage", "Failed to initiate M-Pesa payment"))
+
+        # Persist the pending order before answering; its final state is
+        # set by /mpesa/callback, keyed by CheckoutRequestID.
+        checkout_request_id = stk_data.get("CheckoutRequestID")
+        saved = await orders.save_pending_order(
+            checkout_request_id,
+            stk_data.get("MerchantRequestID"),
+            request.user_email,
+            phone,
+            amount,
+            reservation_ref,
+            cart.order_item_rows(checkout_request_id, priced)
+        )
+        if not saved:
+            print(f"STK Push: order {checkout_request_id} not saved; its callback will not find it")
+
+        return {"status": "success", "message": "STK Push initiated", "amount": amount, "data": stk_data}
+
+    except HTTPException:
+        # Daraja refused the push: no payment prompt went out
+        await write_queue.run(lambda: inventory.release(reservation_ref), f"release reservation {reservation_ref}")
+        raise
     except Exception as e:
         print(f"M-Pesa Error: {e}")
+        # No payment prompt went out, so hand the stock back before answering
+        await write_queue.run(lambda: inventory.release(reservation_ref), f"release reservation {reservation_ref}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/mpesa/callback")
+async def mpesa_callback(payload: dict):
+    # Daraja only needs an acknowledgement, but the order update is applied
+    # before it: a queued job may never run on serverless
+    try:
+        result = orders.parse_stk_callback(payload)
+        print(f"M-Pesa callback {result['checkout_request_id']}: {result['status']} ({result['result_desc']})")
+        if not await orders.handle_callback_result(result):
+            print(f"M-Pesa callback {result['checkout_request_id']} could not be applied")
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Malformed M-Pesa callback: {e} {payload}")
+    return {"ResultCode": 0, "ResultDesc": "Accepted"}
+
 @app.post("/auth/login")
 async def login(user: UserLogin):
     try:
@@ -256,23 +382,36 @@ async def login(user: UserLogin):
         login_result = await supabase.login(user.email, user.password)
         user_id = login_result["user"]["id"]
         
-        # 2. Fetch role from profile
-        profiles = await supabase.get_table("profiles", select="role, full_name", filters={"id": f"eq.{user_id}"})
-        
-        # 3. Lazily create profile if it doesn't exist yet (e.g. after email confirmation)
-        if not profiles:
-            print(f"Profile not found for {user_id}, creating now...")
-            full_name = login_result.get("user", {}).get("user_metadata", {}).get("full_name", user.email.split("@")[0])
-            profile_data = {"id": user_id, "email": user.email, "full_name": full_name, "role": "User"}
-            try:
-                await supabase.upsert("profiles", profile_data, on_conflict="id")
-                print("Profile created lazily on login.")
-                profiles = [{"role": "User", "full_name": full_name}]
-            except Exception as pe:
-                print(f"Failed to create profile on login: {pe}")
-        
-        role = profiles[0]["role"] if profiles else "User"
-        name = profiles[0]["full_name"] if profiles else "Member"
+        # 2. Role and name normally come with the user's app_metadata, a copy of
+        # the profile kept in sync by create_profile_app_metadata_sync.sql (set
+        # at signup, or by backfill_app_metadata.py for older users), so no
+        # profile query is needed
+        app_metadata = login_result["user"].get("app_metadata") or {}
+        role = app_metadata.get("role")
+        name = app_metadata.get("full_name", "Member")
+
+        if not role:
+            # Slow path for users created before app_metadata carried the role
+            profiles = await supabase.get_table("profiles", select="role, full_name", filters={"id": f"eq.{user_id}"})
+            
+            # Lazily create profile if it doesn't exist yet (e.g. after email confirmation)
+            if not profiles:
+                print(f"Profile not found for {user_id}, creating now...")
+                full_name = login_result.get("user", {}).get("user_metadata", {}).get("full_name", user.email.split("@")[0])
+                profile_data = {"id": user_id, "email": user.email, "full_name": full_name, "role": "User"}
+                try:
+                    await supabase.upsert("profiles", profile_data, on_conflict="id")
+                    print("Profile created lazily on login.")
+                    profiles = [{"role": "User", "full_name": full_name}]
+                except Exception as pe:
+                    print(f"Failed to create profile on login: {pe}")
+            
+            role = profiles[0]["role"] if profiles else "User"
+            name = profiles[0]["full_name"] if profiles else "Member"
+            if profiles:
+                # Backfill off the response path so the next login takes the fast path
+                backfill = {"role": role, "full_name": name}
+                write_queue.submit(lambda: supabase.update_app_metadata(user_id, backfill), f"app_metadata backfill for {user_id}")
         
         return {
             "status": "success",
@@ -285,47 +424,184 @@ async def login(user: UserLogin):
         print(f"Login error: {e}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+PRODUCTS_MAX_PAGE_SIZE = 200
+
+# Upper bound on Supabase time (retries included) for storefront reads; past
+# it the last good result is served, or the endpoint falls back to []
+CATALOG_READ_BUDGET = 3.0
+ADMIN_READ_BUDGET = 10.0
+
+def _embedded_category_name(row: dict) -> str:
+    category = row.get("categories") or {}
+    return category.get("name", "Unknown")
+
+def _keyset_filter(after_id: Optional[str], after_created_at: Optional[str], op: str = "gt") -> dict:
+    # Keyset pagination: seek past the last row seen instead of counting
+    # rows with OFFSET, so deep pages cost the same as the first one.
+    # op is "gt" for ascending listings and "lt" for newest-first ones.
+    if after_created_at:
+        ts = f'"{after_created_at}"'
+        if after_id:
+            return {"or": f"(created_at.{op}.{ts},and(created_at.eq.{ts},id.{op}.{after_id}))"}
+        return {"created_at": f"{op}.{after_created_at}"}
+    if after_id:
+        return {"id": f"{op}.{after_id}"}
+    return {}
+
+def _next_cursor(rows: list, limit: Optional[int], by_created_at: bool) -> Optional[str]:
+    if not limit or len(rows) < limit:
+        return None
+    last = rows[-1]
+    cursor = {"after_id": str(last["id"])}
+    if by_created_at and last.get("created_at"):
+        cursor["after_created_at"] = last["created_at"]
+    return urlencode(cursor)
+
 @app.get("/products")
-async def get_products(category: Optional[str] = None):
+async def get_products(
+    response: Response,
+    category: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PRODUCTS_MAX_PAGE_SIZE),
+    offset: Optional[int] = Query(None, ge=0),
+    after_id: Optional[str] = None,
+    after_created_at: Optional[str] = None,
+    include_total: bool = False,
+):
+    """
+    Lists products, optionally paginated.
+
+    Offset mode: `limit` + `offset`. Cursor mode: `limit` + `after_id`
+    (and `after_created_at` for newest-catalog ordering). The body is still a
+    plain list; the next page is advertised in the `X-Next-Cursor` header as a
+    ready-to-append query string, and `X-Total-Count` is set when
+    `include_total=true`.
+    """
     try:
+        # Filtering on the embedded category turns the embed into an inner
+        # join, so the category name never needs resolving to an id first.
+        category_filters = {}
         if category and category != "All":
-            cats = await supabase.get_table("categories", select="id", filters={"name": f"eq.{category}"})
-            if cats:
-                cat_id = cats[0]["id"]
-                data = await supabase.get_table("products", filters={"category_id": f"eq.{cat_id}"})
-            else:
-                data = []
-        else:
-            data = await supabase.get_table("products")
-            
-        all_cats = await supabase.get_table("categories")
-        cat_map = {c["id"]: c["name"] for c in all_cats}
-        
+            category_filters["name"] = f"eq.{category}"
+
+        by_created_at = after_created_at is not None
+        order = "created_at.asc,id.asc" if by_created_at else "id.asc"
+        cursor_mode = bool(after_id or after_created_at)
+
+        data = await supabase.get_embedded(
+            "products",
+            "categories",
+            resource_select="name",
+            filters=_keyset_filter(after_id, after_created_at),
+            resource_filters=category_filters,
+            limit=limit,
+            offset=None if cursor_mode else offset,
+            order=order,
+            budget=CATALOG_READ_BUDGET,
+            stale_ok=True
+        )
+
+        next_cursor = _next_cursor(data, limit, by_created_at)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if include_total:
+            count_select = "id,categories!inner(name)" if category_filters else None
+            count_filters = {f"categories.{k}": v for k, v in category_filters.items()}
+            response.headers["X-Total-Count"] = str(await supabase.count("products", count_filters, select=count_select, budget=CATALOG_READ_BUDGET))
+
         return [
             {
                 "id": str(p["id"]),
                 "name": p["name"],
                 "price": str(p["price_ksh"]),
-                "category": cat_map.get(p["category_id"], "Unknown"),
+                "category": _embedded_category_name(p),
                 "image": p["image_url"],
-                "description": p.get("description")
+                "description": p.get("description"),
+                **image_fields(p["id"], p["image_url"])
             } for p in data
         ]
     except Exception as e:
         print(f"Fetch error: {e}")
+        response.headers["Cache-Control"] = "no-store"
+        return []
+
+SEARCH_PAGE_SIZE = 20
+
+@app.get("/products/search")
+async def search_products(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    category: Optional[str] = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=PRODUCTS_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Ranked full-text search via the search_products RPC (create_product_search.sql).
+    Falls back to the in-process prefix index if the RPC is unavailable.
+    """
+    category_name = category if category and category != "All" else None
+    try:
+        rows = await supabase.rpc("search_products", {
+            "search_query": q,
+            "category_name": category_name,
+            "result_limit": limit,
+            "result_offset": offset
+        })
+        return [
+            {
+                "id": str(p["id"]),
+                "name": p["name"],
+                "price": str(p["price_ksh"]),
+                "category": p.get("category") or "Unknown",
+                "image": p["image_url"],
+                "description": p.get("description"),
+                **image_fields(p["id"], p["image_url"])
+            } for p in rows
+        ]
+    except Exception as e:
+        print(f"Search RPC error, using local index: {e}")
+    try:
+        await product_search_index.ensure_loaded()
+        # Fallback results may lag the database by up to the index TTL
+        response.headers["Cache-Control"] = "no-store"
+        return product_search_index.search(q, category_name, limit, offset, with_description=True)
+    except Exception as e:
+        print(f"Search error: {e}")
+        response.headers["Cache-Control"] = "no-store"
+        return []
+
+@app.get("/products/suggest")
+async def suggest_products(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    category: Optional[str] = None,
+    limit: int = Query(8, ge=1, le=50),
+):
+    # Typeahead is answered from memory; no upstream call once the index is warm
+    try:
+        await product_search_index.ensure_loaded()
+        category_name = category if category and category != "All" else None
+        return product_search_index.search(q, category_name, limit)
+    except Exception as e:
+        print(f"Suggest error: {e}")
+        response.headers["Cache-Control"] = "no-store"
         return []
 
 @app.get("/products/{product_id}")
 async def get_product_details(product_id: str):
     try:
-        data = await supabase.get_table("products", filters={"id": f"eq.{product_id}"})
+        data = await supabase.get_embedded(
+            "products",
+            "categories",
+            resource_select="name",
+            filters={"id": f"eq.{product_id}"},
+            budget=CATALOG_READ_BUDGET,
+            stale_ok=True
+        )
         if not data:
             raise HTTPException(status_code=404, detail="Product not found")
         
         item = data[0]
-        # Fetch category name
-        cats = await supabase.get_table("categories", select="name", filters={"id": f"eq.{item['category_id']}"})
-        category_name = cats[0]["name"] if cats else "Unknown"
+        category_name = _embedded_category_name(item)
         
         return {
             "id": str(item["id"]),
@@ -333,7 +609,8 @@ async def get_product_details(product_id: str):
             "price": str(item["price_ksh"]),
             "category": category_name,
             "image": item["image_url"],
-            "description": item.get("description", "No description available.")
+            "description": item.get("description", "No description available."),
+            **image_fields(item["id"], item["image_url"])
         }
     except HTTPException:
         raise
@@ -341,17 +618,53 @@ async def get_product_details(product_id: str):
         print(f"Product detail error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/products", response_model=Product)
+@app.get("/img/{product_id}")
+async def product_image(product_id: str, size: str = DEFAULT_VARIANT, v: Optional[str] = None):
+    """
+    A product's image resized to `size` (thumb/card/detail) as WebP. The
+    source is fetched once; variants are served from the disk cache.
+    """
+    if size not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"size must be one of: {', '.join(IMAGE_VARIANTS)}")
+    try:
+        image_url = await image_proxy.image_url_for(product_id)
+    except Exception as e:
+        print(f"Image lookup error: {e}")
+        raise HTTPException(status_code=502, detail="Could not look up product image")
+    if not image_url:
+        raise HTTPException(status_code=404, detail="Product image not found")
+    if not is_http_url(image_url):
+        # Never redirect clients to javascript:, data: or other schemes
+        raise HTTPException(status_code=404, detail="Product image not found")
+    if not PILLOW_AVAILABLE:
+        return RedirectResponse(image_url)
+    try:
+        path = await image_proxy.variant(product_id, size)
+    except Exception as e:
+        # Still show something: let the client load the original
+        print(f"Image proxy error for {product_id}: {e}")
+        return RedirectResponse(image_url)
+    if path is None:
+        return RedirectResponse(image_url)
+    # Versioned URLs from catalog responses change with the image, so they never go stale
+    cache_control = "public, max-age=31536000, immutable" if v == image_version(image_url) else "public, max-age=3600"
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": cache_control})
+
+@app.post("/products", response_model=Product, dependencies=[Depends(require_admin)])
 async def create_product(product: CreateProduct):
     print(f"[IN] Received Product Creation: {product.name} in {product.category}")
     try:
-        cats = await supabase.get_table("categories", select="id", filters={"name": f"eq.{product.category}"})
-        if not cats:
-            print(f"[AUTO] Auto-creating category: {product.category}")
-            cat_result = await supabase.upsert("categories", {"name": product.category})
-            cat_id = cat_result[0]['id']
-        else:
-            cat_id = cats[0]['id']
+        cat_id = await category_index.id_for(product.category)
+        if cat_id is None:
+            # The index may be stale if another instance created the category
+            cats = await supabase.get_table("categories", select="id", filters={"name": f"eq.{product.category}"})
+            if not cats:
+                print(f"[AUTO] Auto-creating category: {product.category}")
+                cat_result = await supabase.upsert("categories", {"name": product.category})
+                cat_id = cat_result[0]['id']
+            else:
+                cat_id = cats[0]['id']
+            category_index.invalidate()
         
         data = {
             "name": product.name,
@@ -364,6 +677,7 @@ async def create_product(product: CreateProduct):
         result = await supabase.insert("products", [data])
         if not result:
             raise HTTPException(status_code=500, detail="Failed to create product")
+        await invalidate_catalog("products", "categories")
         
         item = result[0]
         return {
@@ -372,56 +686,276 @@ async def create_product(product: CreateProduct):
             "price": str(item["price_ksh"]),
             "category": product.category,
             "image": item["image_url"],
-            "description": item.get("description")
+            "description": item.get("description"),
+            **image_fields(item["id"], item["image_url"])
         }
     except Exception as e:
         print(f"Creation error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.delete("/products/{product_id}")
+@app.delete("/products/{product_id}", dependencies=[Depends(require_admin)])
 async def delete_product(product_id: str):
     try:
         await supabase.delete("products", {"id": f"eq.{product_id}"})
+        await invalidate_catalog("products")
+        image_proxy.forget(product_id)
         return {"status": "success", "message": "Product deleted"}
     except Exception as e:
         print(f"Delete error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.patch("/products/{product_id}/stock")
+@app.patch("/products/{product_id}/stock", dependencies=[Depends(require_admin)])
 async def update_product_stock(product_id: str, payload: UpdateProductStock):
     try:
         result = await supabase.update("products", {"id": f"eq.{product_id}"}, {"stock": payload.stock})
+        await invalidate_catalog("products")
         return {"status": "success", "stock": payload.stock}
     except Exception as e:
         print(f"Stock update error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/admin/inventory/adjust", dependencies=[Depends(require_admin)])
+async def adjust_inventory(payload: AdjustStock):
+    """Relative stock changes for many products, applied all-or-nothing."""
+    try:
+        stock = await inventory.adjust_stock([{"product_id": a.product_id, "delta": a.delta} for a in payload.adjustments])
+        await invalidate_catalog("products")
+        return {"status": "success", "stock": stock}
+    except inventory.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except inventory.UnknownProductError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Inventory adjust error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/products/bulk", dependencies=[Depends(require_admin)])
+async def bulk_import_products(request: Request):
+    """
+    Streams an NDJSON (default) or CSV (Content-Type: text/csv) body of
+    products with fields name, price, category, image, description and an
+    optional id and stock. Rows with an id are upserted (stock left as is
+    unless given), the rest inserted (stock 0 unless given).
+    """
+    try:
+        result = await catalog_io.bulk_import_products(request.stream(), request.headers.get("content-type", ""))
+    except Exception as e:
+        print(f"Bulk import error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # Even a partially applied import changes the catalog
+        await invalidate_catalog("products", "categories")
+        # Upserts may have changed image URLs
+        image_proxy.forget()
+    print(f"[BULK] Imported {result['created']} new, {result['updated']} updated, {result['failed']} failed")
+    return {"status": "success", **result}
+
+@app.get("/admin/products/export", dependencies=[Depends(require_admin)])
+async def export_products(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), category: Optional[str] = None):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        catalog_io.export_products(format, category),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
 @app.get("/categories")
-async def get_categories():
+async def get_categories(response: Response):
     try:
-        rows = await supabase.get_table("categories", select="name")
         # Return plain list of strings so the frontend can render them directly
-        return [row["name"] for row in rows if "name" in row]
+        return await category_index.names()
     except Exception as e:
         print(f"Categories error: {e}")
+        response.headers["Cache-Control"] = "no-store"
         return []
 
-@app.get("/admin/orders")
-async def get_admin_orders():
+ADMIN_RECENT_ORDERS = 20
+ADMIN_RECENT_FEEDBACK = 5
+
+@app.get("/admin/stats", dependencies=[Depends(require_admin)])
+async def get_admin_stats():
+    """
+    Dashboard aggregates computed upstream: order totals come from the
+    order_stats view (see create_order_stats_view.sql), counts from
+    count=exact HEAD requests, and only the most recent rows are fetched.
+    """
     try:
-        return await supabase.get_table("orders")
+        order_rows, pending_requests, feedback_total, recent_feedback, recent_orders = await asyncio.gather(
+            supabase.get_table("order_stats", budget=ADMIN_READ_BUDGET),
+            supabase.count("item_requests", {"status": "eq.pending"}, budget=ADMIN_READ_BUDGET),
+            supabase.count("feedback", budget=ADMIN_READ_BUDGET),
+            supabase.get_table("feedback", limit=ADMIN_RECENT_FEEDBACK, order="created_at.desc", budget=ADMIN_READ_BUDGET),
+            supabase.get_table(
+                "orders",
+                select="id,user_email,amount,status,created_at",
+                limit=ADMIN_RECENT_ORDERS,
+                order="created_at.desc",
+                budget=ADMIN_READ_BUDGET
+            ),
+        )
+        by_status = {row["status"]: row["order_count"] for row in order_rows}
+        paid = next((row for row in order_rows if row["status"] == orders.ORDER_PAID), {})
+        return {
+            "revenue": {
+                "total": paid.get("revenue", 0),
+                "today": paid.get("revenue_today", 0)
+            },
+            "orders": {
+                "total": sum(by_status.values()),
+                "by_status": by_status,
+                "recent": recent_orders
+            },
+            "pending_requests": pending_requests,
+            "feedback": {
+                "total": feedback_total,
+                "recent": recent_feedback
+            }
+        }
+    except Exception as e:
+        print(f"Stats error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+ADMIN_PAGE_SIZE = 100
+ADMIN_MAX_PAGE_SIZE = 500
+
+class AdminListParams:
+    """
+    Shared query parameters for the admin list endpoints: newest-first keyset
+    pagination, a status filter, a created_at range and column projection.
+    Everything is translated into PostgREST filters for get_table.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(ADMIN_PAGE_SIZE, ge=1, le=ADMIN_MAX_PAGE_SIZE),
+        after_id: Optional[str] = None,
+        after_created_at: Optional[str] = None,
+        status: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        select: Optional[str] = None,
+    ):
+        self.limit = limit
+        self.after_id = after_id
+        self.after_created_at = after_created_at
+        self.status = status
+        self.created_from = created_from
+        self.created_to = created_to
+        self.select = select
+
+    def filters(self, status_column: str = "status") -> dict:
+        filters = _keyset_filter(self.after_id, self.after_created_at, op="lt")
+        if self.status:
+            filters[status_column] = f"eq.{self.status}"
+        date_range = []
+        if self.created_from:
+            date_range.append(f'created_at.gte."{self.created_from}"')
+        if self.created_to:
+            date_range.append(f'created_at.lte."{self.created_to}"')
+        if date_range:
+            filters["and"] = f"({','.join(date_range)})"
+        return filters
+
+async def _admin_list(table_name: str, params: AdminListParams, response: Response, default_select: str = "*", status_column: str = "status"):
+    select = params.select or default_select
+    # The next cursor is built from id and created_at, so always fetch them
+    if select != "*":
+        columns = [c.strip() for c in select.split(",")]
+        select = ",".join(columns + [c for c in ("id", "created_at") if c not in columns])
+    rows = await supabase.get_table(
+        table_name,
+        select=select,
+        filters=params.filters(status_column),
+        limit=params.limit,
+        order="created_at.desc,id.desc",
+        budget=ADMIN_READ_BUDGET
+    )
+    next_cursor = _next_cursor(rows, params.limit, by_created_at=True)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@app.get("/admin/orders", dependencies=[Depends(require_admin)])
+async def get_admin_orders(response: Response, params: AdminListParams = Depends()):
+    try:
+        return await _admin_list("orders", params, response)
     except Exception as e:
         print(f"Orders error: {e}")
         return []
 
-@app.get("/admin/requests")
-async def get_admin_requests():
+@app.get("/admin/requests", dependencies=[Depends(require_admin)])
+async def get_admin_requests(response: Response, params: AdminListParams = Depends()):
     try:
-        return await supabase.get_table("item_requests")
+        return await _admin_list("item_requests", params, response)
     except Exception as e:
         print(f"Requests error: {e}")
         return []
 
+USER_ORDERS_PAGE_SIZE = 50
+
+@app.get("/orders")
+async def get_user_orders(
+    response: Response,
+    email: str,
+    limit: int = Query(USER_ORDERS_PAGE_SIZE, ge=1, le=ADMIN_MAX_PAGE_SIZE),
+    after_id: Optional[str] = None,
+    after_created_at: Optional[str] = None,
+):
+    # Served by orders_user_email_created_at_idx (create_orders_user_email_index.sql)
+    try:
+        filters = _keyset_filter(after_id, after_created_at, op="lt")
+        filters["user_email"] = f"eq.{email}"
+        rows = await supabase.get_table(
+            "orders",
+            select="id,user_email,phone_number,amount,payment_method,status,created_at",
+            filters=filters,
+            limit=limit,
+            order="created_at.desc,id.desc"
+        )
+        next_cursor = _next_cursor(rows, limit, by_created_at=True)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+    except Exception as e:
+        print(f"User orders error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/cart")
+async def get_cart(email: str):
+    """The user's cart priced from the catalog, served from a per-user cache."""
+    try:
+        return await cart.get_cart(email)
+    except Exception as e:
+        print(f"Cart error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.put("/cart")
+async def replace_cart(payload: ReplaceCart):
+    # Used to push a cart built on the device (e.g. before login) to the server
+    try:
+        return await cart.replace_cart(payload.email, [{"product_id": item.product_id, "quantity": item.quantity} for item in payload.items])
+    except Exception as e:
+        print(f"Cart replace error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.put("/cart/items/{product_id}")
+async def set_cart_item(product_id: str, payload: CartItemUpdate):
+    """Sets one product's quantity; 0 removes it."""
+    try:
+        return await cart.set_item(payload.email, product_id, payload.quantity)
+    except Exception as e:
+        print(f"Cart update error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/cart")
+async def clear_cart(email: str):
+    try:
+        await cart.clear_cart(email)
+        return {"status": "success"}
+    except Exception as e:
+        print(f"Cart clear error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/requests")
 async def submit_item_request(ir: ItemRequest):
     try:
@@ -436,7 +970,7 @@ async def submit_item_request(ir: ItemRequest):
         print(f"Request error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/admin/fulfill")
+@app.post("/admin/fulfill", dependencies=[Depends(require_admin)])
 async def fulfill_request(fr: FulfillRequest):
     try:
         await supabase.update("item_requests", {"id": f"eq.{fr.request_id}"}, {"status": "fulfilled"})
@@ -445,10 +979,10 @@ async def fulfill_request(fr: FulfillRequest):
         print(f"Fulfill error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/admin/feedback")
-async def get_admin_feedback():
+@app.get("/admin/feedback", dependencies=[Depends(require_admin)])
+async def get_admin_feedback(response: Response, params: AdminListParams = Depends()):
     try:
-        return await supabase.get_table("feedback")
+        return await _admin_list("feedback", params, response)
     except Exception as e:
         print(f"Feedback error: {e}")
         return []
@@ -467,14 +1001,95 @@ async def submit_feedback(fb: CreateFeedback):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/notifications")
-async def get_notifications():
+async def get_notifications(response: Response, since: Optional[str] = None):
+    """
+    All notifications, or with `since` (a created_at timestamp) only the
+    newer ones, oldest first, for clients catching up after a reconnect.
+    """
     try:
-        return await supabase.get_table("notifications")
+        if since:
+            # Answered from the hub's buffer; cheaper than caching per timestamp
+            response.headers["Cache-Control"] = "no-store"
+            return await notification_hub.since(since)
+        return await supabase.get_table("notifications", budget=CATALOG_READ_BUDGET, stale_ok=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be an ISO 8601 timestamp")
     except Exception as e:
         print(f"Notifications error: {e}")
+        response.headers["Cache-Control"] = "no-store"
         return []
 
-@app.post("/notifications")
+def _valid_since(since: Optional[str]) -> bool:
+    # Checked before a stream opens: once it has, an error can't become a 400
+    try:
+        if since:
+            parse_timestamp(since)
+        return True
+    except ValueError:
+        return False
+
+async def _notification_events(since: Optional[str]):
+    """Missed notifications since `since`, then new ones as they are published."""
+    # Subscribe before replaying so nothing published in between is lost
+    subscription = notification_hub.subscribe()
+    try:
+        replayed = set()
+        if since:
+            for notification in await notification_hub.since(since):
+                replayed.add(notification.get("id"))
+                yield notification
+        while True:
+            try:
+                notification = await subscription.get(timeout=SSE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if notification is None:
+                return
+            if notification.get("id") not in replayed:
+                yield notification
+    finally:
+        notification_hub.unsubscribe(subscription)
+
+@app.get("/notifications/stream")
+async def stream_notifications(request: Request, since: Optional[str] = None):
+    """Server-Sent Events; browsers resume from Last-Event-ID on reconnect."""
+    since = since or request.headers.get("last-event-id")
+    if not _valid_since(since):
+        raise HTTPException(status_code=400, detail="since must be an ISO 8601 timestamp")
+
+    async def events():
+        async for notification in _notification_events(since):
+            if await request.is_disconnected():
+                return
+            # Comment lines keep proxies from closing an idle stream
+            yield sse_event(notification) if notification else ": keepalive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/notifications/ws")
+async def notifications_socket(websocket: WebSocket, since: Optional[str] = None):
+    # React Native has WebSocket built in but no EventSource
+    await websocket.accept()
+    if not _valid_since(since):
+        await websocket.close(code=1008, reason="since must be an ISO 8601 timestamp")
+        return
+    try:
+        async for notification in _notification_events(since):
+            if notification:
+                await websocket.send_json({"type": "notification", "data": notification})
+            else:
+                await websocket.send_json({"type": "ping"})
+        # Dropped for falling behind: the client reconnects with since=
+        await websocket.close(code=1013)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+@app.post("/admin/notifications", dependencies=[Depends(require_admin)])
 async def create_notification(notif: CreateNotification):
     try:
         data = {
@@ -483,15 +1098,19 @@ async def create_notification(notif: CreateNotification):
             "type": notif.type
         }
         result = await supabase.insert("notifications", [data])
+        await invalidate_catalog("notifications")
+        for notification in result:
+            notification_hub.publish(notification)
         return {"status": "success", "data": result}
     except Exception as e:
         print(f"Notification error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/admin/users")
-async def get_admin_users():
+@app.get("/admin/users", dependencies=[Depends(require_admin)])
+async def get_admin_users(response: Response, params: AdminListParams = Depends()):
+    # Profiles have no status; the status filter matches on role instead
     try:
-        return await supabase.get_table("profiles", select="id,email,full_name,role,created_at")
+        return await _admin_list("profiles", params, response, default_select="id,email,full_name,role,created_at", status_column="role")
     except Exception as e:
         print(f"Users error: {e}")
         return []
@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import os
+import time
+from datetime import datetime
+from typing import Optional
+import httpx
+from supabase_client import pool_stats
+from tracing import TracingTransport
+
+# M-Pesa Credentials
+MPESA_CONSUMER_KEY = os.environ.get("MPESA_CONSUMER_KEY", "GTWADFxIpUfDoNikNGqq1C3023evM6UH")
+MPESA_CONSUMER_SECRET = os.environ.get("MPESA_CONSUMER_SECRET", "amFbAoUByPV2rM5A")
+MPESA_SHORTCODE = os.environ.get("MPESA_SHORTCODE", "174379")
+MPESA_PASSKEY = os.environ.get("MPESA_PASSKEY", "bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919")
+# Public URL of this API, used to build the default STK callback (/mpesa/callback)
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL")
+MPESA_CALLBACK_URL = os.environ.get("MPESA_CALLBACK_URL") or (
+    f"{PUBLIC_BASE_URL.rstrip('/')}/mpesa/callback" if PUBLIC_BASE_URL else "https://modcom.co.ke/job/confirmation.php"
+)
+MPESA_ENV = os.environ.get("MPESA_ENV", "sandbox") # sandbox or production
+
+
+def callback_url_problem(callback_url: str = MPESA_CALLBACK_URL, public_base_url: Optional[str] = PUBLIC_BASE_URL) -> Optional[str]:
+    """Why Daraja's STK results would not reach this API's /mpesa/callback, if they wouldn't."""
+    if not callback_url.rstrip("/").endswith("/mpesa/callback"):
+        return f"MPESA_CALLBACK_URL {callback_url} is not this API's /mpesa/callback"
+    if public_base_url and not callback_url.startswith(public_base_url.rstrip("/") + "/"):
+        return f"MPESA_CALLBACK_URL {callback_url} is not under PUBLIC_BASE_URL {public_base_url}"
+    return None
+
+
+# At import, so serverless workers that skip the lifespan log it too
+_callback_problem = callback_url_problem()
+if _callback_problem:
+    print(f"[WARN] {_callback_problem}: payments will never be marked paid or failed and "
+          f"their stock stays held until the reservation expires. Set PUBLIC_BASE_URL or MPESA_CALLBACK_URL.")
+
+# Refresh the access token this many seconds before Daraja says it expires
+MPESA_TOKEN_REFRESH_MARGIN = 60.0
+
+
+def mpesa_api_url(env: str = MPESA_ENV) -> str:
+    return "https://sandbox.safaricom.co.ke" if env == "sandbox" else "https://api.safaricom.co.ke"
+
+
+def format_phone_number(phone_number: str) -> str:
+    # Daraja expects MSISDNs in the 2547XXXXXXXX form
+    phone = phone_number.strip().replace("+", "")
+    if phone.startswith("0"):
+        phone = "254" + phone[1:]
+    elif not phone.startswith("254"):
+        phone = "254" + phone
+    return phone
+
+
+class MpesaClient:
+    """
+    Long-lived Daraja API client.
+
+    Keeps one pooled httpx.AsyncClient for all payments and caches the OAuth
+    access token until shortly before `expires_in`. Concurrent callers that
+    find the token missing or stale share a single refresh (single-flight)
+    instead of each calling oauth/v1/generate.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        consumer_key: str = MPESA_CONSUMER_KEY,
+        consumer_secret: str = MPESA_CONSUMER_SECRET,
+        shortcode: str = MPESA_SHORTCODE,
+        passkey: str = MPESA_PASSKEY,
+        callback_url: str = MPESA_CALLBACK_URL,
+        refresh_margin: float = MPESA_TOKEN_REFRESH_MARGIN,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = (base_url or mpesa_api_url()).rstrip("/")
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.shortcode = shortcode
+        self.passkey = passkey
+        self.callback_url = callback_url
+        self.refresh_margin = refresh_margin
+        self._transport = transport
+        self._client = None
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.consumer_key and self.consumer_secret and self.passkey)
+
+    async def get_client(self):
+        if self._client is None or self._client.is_closed:
+            transport = self._transport or httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                transport=TracingTransport(transport, "mpesa"),
+            )
+        return self._client
+
+    def _token_is_fresh(self) -> bool:
+        return self._token is not None and time.monotonic() < self._token_expires_at - self.refresh_margin
+
+    async def _fetch_token(self):
+        auth_string = f"{self.consumer_key}:{self.consumer_secret}"
+        encoded_auth = base64.b64encode(auth_string.encode()).decode()
+
+        client = await self.get_client()
+        response = await client.get(
+            f"{self.base_url}/oauth/v1/generate",
+            params={"grant_type": "client_credentials"},
+            headers={"Authorization": f"Basic {encoded_auth}"}
+        )
+        response.raise_for_status()
+        data = response.json()
+        # Daraja sends expires_in as a string ("3599")
+        expires_in = float(data.get("expires_in", 3599))
+        self._token = data["access_token"]
+        self._token_expires_at = time.monotonic() + expires_in
+
+    async def get_access_token(self) -> str:
+        if self._token_is_fresh():
+            return self._token
+        async with self._token_lock:
+            # Whoever held the lock before us has probably refreshed already
+            if not self._token_is_fresh():
+                await self._fetch_token()
+            return self._token
+
+    def invalidate_token(self):
+        self._token = None
+        self._token_expires_at = 0.0
+
+    def _password(self, timestamp: str) -> str:
+        password_str = f"{self.shortcode}{self.passkey}{timestamp}"
+        return base64.b64encode(password_str.encode()).decode()
+
+    async def stk_push(self, phone: str, amount: int, account_reference: str = "AlphaBoutique", description: str = "Payment for order"):
+        """
+        Initiates a Lipa Na M-Pesa Online (STK push) request.
+        Returns (status_code, response_json) so callers can surface Daraja errors.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        payload = {
+            "BusinessShortCode": self.shortcode,
+            "Password": self._password(timestamp),
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": amount,
+            "PartyA": phone,
+            "PartyB": self.shortcode,
+            "PhoneNumber": phone,
+            "CallBackURL": self.callback_url,
+            "AccountReference": account_reference,
+            "TransactionDesc": description
+        }
+
+        client = await self.get_client()
+        for attempt in range(2):
+            access_token = await self.get_access_token()
+            response = await client.post(
+                f"{self.base_url}/mpesa/stkpush/v1/processrequest",
+                headers={"Authorization": f"Bearer {access_token}"},
+                json=payload
+            )
+            # A token revoked before its expiry is rejected with 401; refetch once
+            if response.status_code == 401 and attempt == 0:
+                self.invalidate_token()
+                continue
+            break
+        return response.status_code, response.json()
+
+    def pool_stats(self) -> dict:
+        return pool_stats(self._client)
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+mpesa = MpesaClient()
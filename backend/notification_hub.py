@@ -0,0 +1,177 @@
+import asyncio
+import json
+import re
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from supabase_client import supabase
+from response_cache import response_cache
+
+# Recent notifications kept in memory so reconnecting clients replay from here
+NOTIFICATION_BUFFER_SIZE = 200
+# Per-client backlog; a client this far behind is dropped and must reconnect with since=
+SUBSCRIBER_QUEUE_SIZE = 100
+# Picks up rows inserted by other workers or straight into the table
+NOTIFICATION_SYNC_INTERVAL = 5.0
+# Each sync re-reads this far behind its watermark, for rows committed after
+# a newer one (created_at is set when the insert starts, not when it commits)
+NOTIFICATION_SYNC_OVERLAP = timedelta(seconds=30)
+SSE_HEARTBEAT_INTERVAL = 15.0
+
+
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def parse_timestamp(value: str) -> datetime:
+    # Postgres trims trailing zeros from fractional seconds; before 3.11
+    # fromisoformat only accepts exactly 3 or 6 digits
+    value = _FRACTION_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value.replace("Z", "+00:00"), count=1)
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class Subscription:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = False
+
+    async def get(self, timeout: Optional[float] = None):
+        """Next notification, None once dropped; raises TimeoutError after `timeout`."""
+        if self.dropped and self.queue.empty():
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class NotificationHub:
+    """
+    In-process pub/sub for new notifications. Publishing is O(subscribers)
+    with no I/O; each connected client drains its own bounded queue. The
+    hub also keeps the most recent rows, so `since=` catch-up after a
+    reconnect is usually answered without a Supabase query.
+    """
+
+    def __init__(self, buffer_size: int = NOTIFICATION_BUFFER_SIZE):
+        self._subscribers = set()
+        self._recent = deque(maxlen=buffer_size)
+        self._seen_ids = set()
+        # Every notification newer than this is in _recent; None until the first sync
+        self._covered_since = None
+        # Newest created_at returned by a sync query. Only sync moves it: a row
+        # published here says nothing about rows other workers wrote before it.
+        self._synced_until = None
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _remember(self, notification: dict) -> bool:
+        # Keeps _recent sorted by created_at; rows usually arrive newest last
+        created_at = parse_timestamp(notification["created_at"])
+        if len(self._recent) == self._recent.maxlen:
+            if created_at < parse_timestamp(self._recent[0]["created_at"]):
+                # Older than the whole buffer: already evicted, or too old to matter
+                return False
+            self._seen_ids.discard(self._recent.popleft().get("id"))
+        position = len(self._recent)
+        while position and parse_timestamp(self._recent[position - 1]["created_at"]) > created_at:
+            position -= 1
+        self._recent.insert(position, notification)
+        self._seen_ids.add(notification.get("id"))
+        return True
+
+    def publish(self, notification: dict):
+        if notification.get("id") in self._seen_ids or not self._remember(notification):
+            return
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(notification)
+            except asyncio.QueueFull:
+                # Slow consumer: end its stream rather than buffer without bound
+                subscription.dropped = True
+                self._subscribers.discard(subscription)
+                subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    def _buffer_covers(self, since: datetime) -> bool:
+        if self._covered_since is None:
+            return False
+        oldest = parse_timestamp(self._recent[0]["created_at"]) if self._recent else None
+        # Evicted rows are older than everything left in the buffer
+        floor = max(self._covered_since, oldest) if oldest and len(self._recent) == self._recent.maxlen else self._covered_since
+        return since >= floor
+
+    def _has_unsynced_rows(self) -> bool:
+        # A row published here after the last sync may have overtaken rows
+        # other workers wrote, which only the next sync brings in
+        return bool(self._recent) and parse_timestamp(self._recent[-1]["created_at"]) > self._synced_until
+
+    async def since(self, created_at: str) -> list:
+        """Notifications newer than `created_at`, oldest first."""
+        since = parse_timestamp(created_at)
+        if self._buffer_covers(since) and not self._has_unsynced_rows():
+            return [n for n in self._recent if parse_timestamp(n["created_at"]) > since]
+        rows = await supabase.get_table(
+            "notifications",
+            filters={"created_at": f"gt.{since.isoformat()}"},
+            order="created_at.asc",
+            stale_ok=True
+        )
+        return list(rows)
+
+    async def sync(self):
+        if self._covered_since is None:
+            # Seed the buffer with the latest rows without announcing them
+            limit = self._recent.maxlen
+            rows = await supabase.get_table("notifications", order="created_at.desc", limit=limit)
+            seeded = [row for row in reversed(rows) if row.get("id") not in self._seen_ids]
+            published = list(self._recent)
+            self._recent.clear()
+            self._seen_ids.clear()
+            for row in sorted(seeded + published, key=lambda n: parse_timestamp(n["created_at"])):
+                self._remember(row)
+            # Fewer rows than asked for means the buffer holds the whole table
+            if len(rows) < limit:
+                self._covered_since = datetime.min.replace(tzinfo=timezone.utc)
+            else:
+                self._covered_since = parse_timestamp(rows[-1]["created_at"])
+            self._synced_until = parse_timestamp(rows[0]["created_at"]) if rows else self._covered_since
+            return
+        after = self._synced_until
+        if after > self._covered_since + NOTIFICATION_SYNC_OVERLAP:
+            after -= NOTIFICATION_SYNC_OVERLAP
+        rows = await supabase.get_table("notifications", filters={"created_at": f"gt.{after.isoformat()}"}, order="created_at.asc")
+        # Rows in the overlap were seen last time; ids keep them from repeating
+        fresh = [row for row in rows if row.get("id") not in self._seen_ids]
+        for row in fresh:
+            self.publish(row)
+        if rows:
+            self._synced_until = max(self._synced_until, parse_timestamp(rows[-1]["created_at"]))
+        if fresh:
+            response_cache.invalidate("notifications")
+
+    async def run_sync(self, interval: float = NOTIFICATION_SYNC_INTERVAL):
+        # One small query per worker per interval, however many clients are connected
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Notification sync failed: {e}")
+            await asyncio.sleep(interval)
+
+
+def sse_event(notification: dict) -> str:
+    # The id doubles as the resume point: browsers send it back as Last-Event-ID
+    return f"id: {notification['created_at']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+
+notification_hub = NotificationHub()
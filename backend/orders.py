@@ -0,0 +1,170 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from supabase_client import supabase
+from write_queue import write_queue
+import inventory
+import cart
+
+# Order lifecycle for M-Pesa checkouts:
+#   pending -> paid | failed | timeout
+# paid, failed and timeout are terminal.
+ORDER_PENDING = "pending"
+ORDER_PAID = "paid"
+ORDER_FAILED = "failed"
+ORDER_TIMEOUT = "timeout"
+
+ORDER_TRANSITIONS = {
+    ORDER_PENDING: {ORDER_PAID, ORDER_FAILED, ORDER_TIMEOUT},
+    ORDER_PAID: set(),
+    ORDER_FAILED: set(),
+    ORDER_TIMEOUT: set(),
+}
+
+# Daraja STK ResultCodes that mean the customer never answered the prompt
+MPESA_TIMEOUT_RESULT_CODES = {1037, 1019}
+
+# Pending orders with no callback after this long are marked as timed out
+PENDING_ORDER_TTL = timedelta(minutes=5)
+
+
+def status_for_result_code(result_code) -> str:
+    code = int(result_code)
+    if code == 0:
+        return ORDER_PAID
+    if code in MPESA_TIMEOUT_RESULT_CODES:
+        return ORDER_TIMEOUT
+    return ORDER_FAILED
+
+
+def parse_stk_callback(payload: dict) -> dict:
+    """
+    Flattens a Daraja STK callback body:
+    {"Body": {"stkCallback": {"CheckoutRequestID", "ResultCode", "ResultDesc",
+    "CallbackMetadata": {"Item": [{"Name": ..., "Value": ...}]}}}}
+    """
+    callback = payload["Body"]["stkCallback"]
+    metadata = {
+        item["Name"]: item.get("Value")
+        for item in callback.get("CallbackMetadata", {}).get("Item", [])
+    }
+    return {
+        "checkout_request_id": callback["CheckoutRequestID"],
+        "merchant_request_id": callback.get("MerchantRequestID"),
+        "status": status_for_result_code(callback["ResultCode"]),
+        "result_desc": callback.get("ResultDesc"),
+        "mpesa_receipt": metadata.get("MpesaReceiptNumber"),
+    }
+
+
+async def transition_order(checkout_request_id: str, target: str, data: Optional[dict] = None):
+    """
+    Moves an order to `target` only if its current status allows it. The
+    status precondition is part of the PATCH filter, so the check and the
+    write happen atomically in Postgres and a late duplicate callback can't
+    overwrite a terminal state.
+    """
+    allowed_from = [state for state, targets in ORDER_TRANSITIONS.items() if target in targets]
+    if not allowed_from:
+        raise ValueError(f"No order state can transition to '{target}'")
+    filters = {
+        "checkout_request_id": f"eq.{checkout_request_id}",
+        "status": f"in.({','.join(allowed_from)})"
+    }
+    changes = {**(data or {}), "status": target, "updated_at": datetime.now(timezone.utc).isoformat()}
+    return await supabase.update("orders", filters, changes)
+
+
+class OrderNotFoundError(Exception):
+    """A callback arrived for a CheckoutRequestID that has no order row (yet)."""
+
+
+async def save_pending_order(checkout_request_id: str, merchant_request_id: Optional[str], user_email: str, phone: str, amount: int, reservation_ref: Optional[str] = None, items: Optional[list] = None) -> bool:
+    """
+    Writes the pending order before /auth/stkpush returns. The callback can be
+    handled by any worker, so the row (and its reservation_ref) has to exist
+    by then rather than sit in this process's write queue.
+    """
+    order_data = {
+        "checkout_request_id": checkout_request_id,
+        "merchant_request_id": merchant_request_id,
+        "user_email": user_email,
+        "phone_number": phone,
+        "amount": amount,
+        "payment_method": "mpesa",
+        "status": ORDER_PENDING
+    }
+    if reservation_ref:
+        order_data["reservation_ref"] = reservation_ref
+    if not await write_queue.run(lambda: supabase.insert("orders", [order_data]), f"order insert {checkout_request_id}"):
+        return False
+    if items:
+        # Separate job so a retry never re-inserts the order
+        return await write_queue.run(lambda: supabase.insert("order_items", items), f"order items {checkout_request_id}")
+    return True
+
+
+async def settle_reservation(order: dict, status: str):
+    # A paid order keeps its held stock; any other outcome puts it back
+    reservation_ref = order.get("reservation_ref")
+    if not reservation_ref:
+        return
+    if status == ORDER_PAID:
+        await inventory.commit(reservation_ref)
+    else:
+        await inventory.release(reservation_ref)
+
+
+async def apply_callback_result(checkout_request_id: str, status: str, data: dict):
+    updated = await transition_order(checkout_request_id, status, data)
+    if not updated:
+        # Already transitioned: a duplicate callback, or a retry of this job after
+        # the status write landed. Settling is idempotent, so finish it if needed.
+        orders = await supabase.get_table("orders", select="status,reservation_ref,user_email", filters={"checkout_request_id": f"eq.{checkout_request_id}"})
+        if not orders:
+            # Raising makes the caller retry rather than drop a paid callback;
+            # otherwise the sweeper would time the order out and free its stock
+            raise OrderNotFoundError(f"No order with CheckoutRequestID {checkout_request_id}")
+        updated = [order for order in orders if order["status"] == status]
+    for order in updated:
+        await settle_reservation(order, status)
+        if status == ORDER_PAID and order.get("user_email"):
+            await cart.clear_cart(order["user_email"])
+
+
+async def handle_callback_result(result: dict) -> bool:
+    # Awaited in the callback request: a detached task may never run on serverless
+    checkout_request_id = result["checkout_request_id"]
+    data = {"result_desc": result.get("result_desc")}
+    if result.get("mpesa_receipt"):
+        data["mpesa_receipt"] = result["mpesa_receipt"]
+    return await write_queue.run(
+        lambda: apply_callback_result(checkout_request_id, result["status"], data),
+        f"order {result['status']} {checkout_request_id}"
+    )
+
+
+async def expire_pending_orders(now: Optional[datetime] = None):
+    cutoff = (now or datetime.now(timezone.utc)) - PENDING_ORDER_TTL
+    filters = {"status": f"eq.{ORDER_PENDING}", "created_at": f"lt.{cutoff.isoformat()}"}
+    changes = {"status": ORDER_TIMEOUT, "updated_at": datetime.now(timezone.utc).isoformat()}
+    expired = await supabase.update("orders", filters, changes)
+    for order in expired:
+        try:
+            await settle_reservation(order, ORDER_TIMEOUT)
+        except Exception as e:
+            # The reservation sweeper releases it once it expires
+            print(f"Releasing stock for timed-out order failed: {e}")
+    return expired
+
+
+async def run_pending_order_sweeper(interval: float = 60.0):
+    # Catches checkouts whose callback never arrived (e.g. callback URL unreachable)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = await expire_pending_orders()
+            if expired:
+                print(f"Marked {len(expired)} pending orders as timed out")
+        except Exception as e:
+            print(f"Pending order sweep failed: {e}")
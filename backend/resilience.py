@@ -0,0 +1,96 @@
+import random
+import time
+from typing import Optional
+import httpx
+
+# Upstream answers worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    # Timeouts, refused/reset connections, protocol errors
+    return isinstance(error, httpx.TransportError)
+
+
+def backoff_delay(attempt: int, base: float = 0.1, cap: float = 2.0) -> float:
+    # "Full jitter": spreads retries from many clients instead of syncing them
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    if isinstance(error, httpx.HTTPStatusError):
+        value = error.response.headers.get("retry-after", "")
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through. After `failure_threshold` retryable failures in
+    a row it opens and calls fail fast for `reset_timeout` seconds. Then it is
+    half-open: one trial call is let through; success closes the circuit,
+    failure (or a trial abandoned without a result) opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                print(f"Circuit breaker opened after {self.failures} failures")
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def abandon_trial(self):
+        # The half-open trial ended without a verdict (cancelled, or an error
+        # that says nothing about upstream health). Count it as a failure so
+        # the slot is freed and another trial follows after reset_timeout.
+        if self._state == self.HALF_OPEN and self._trial_in_flight:
+            self.record_failure()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
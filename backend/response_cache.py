@@ -0,0 +1,156 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from tracing import annotate
+
+# Per process: writes drop entries in the worker that made them at once and in
+# the others on their next version check (cache_versions.py); without the
+# cache_versions table this bounds how long another worker serves stale data
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "20"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+# GET paths served from the cache, by prefix, and the tag used to invalidate them
+CACHED_PATHS = {
+    "/products": "products",
+    "/categories": "categories",
+    "/notifications": "notifications",
+}
+
+# Long-lived responses under a cached prefix that must never be buffered
+STREAMING_PATHS = {"/notifications/stream"}
+
+# Headers that are recomputed on every response and must not be replayed
+_UNCACHED_HEADERS = {"content-length", "etag", "cache-control"}
+
+
+class CachedResponse:
+    __slots__ = ("body", "status_code", "headers", "media_type", "etag", "tag", "expires_at")
+
+    def __init__(self, body: bytes, status_code: int, headers: dict, media_type: Optional[str], tag: str, ttl: float):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers
+        self.media_type = media_type
+        self.etag = make_etag(body)
+        self.tag = tag
+        self.expires_at = time.monotonic() + ttl
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Clients may echo a weak validator back (W/"...")
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    """
+    Bounded LRU of rendered GET responses keyed by path + query string.
+    Entries expire after `ttl` seconds and are dropped by tag when the
+    underlying data is modified.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *tags: str):
+        stale = [key for key, entry in self._entries.items() if entry.tag in tags]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _tag_for_path(path: str) -> Optional[str]:
+    if path in STREAMING_PATHS:
+        return None
+    for prefix, tag in CACHED_PATHS.items():
+        if path == prefix or path.startswith(prefix + "/"):
+            return tag
+    return None
+
+
+def _cache_headers(etag: str) -> dict:
+    # no-cache: clients may keep a copy but must revalidate with If-None-Match
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """
+    Serves cacheable GET routes from a ResponseCache and answers conditional
+    requests with 304 Not Modified. Handlers can opt a response out of caching
+    (e.g. an empty fallback after an upstream error) by setting
+    `Cache-Control: no-store`.
+    """
+
+    def __init__(self, app, cache: ResponseCache, versions=None):
+        super().__init__(app)
+        self.cache = cache
+        self.versions = versions
+
+    async def dispatch(self, request: Request, call_next):
+        tag = _tag_for_path(request.url.path) if request.method == "GET" else None
+        if tag is None:
+            return await call_next(request)
+
+        key = request.url.path
+        if request.url.query:
+            key += "?" + request.url.query
+        if_none_match = request.headers.get("if-none-match")
+
+        entry = self.cache.get(key)
+        if entry is not None and self.versions is not None:
+            # A write on another worker may have made this entry stale
+            await self.versions.check()
+            entry = self.cache.get(key)
+        annotate(cache="miss" if entry is None else "hit")
+        if entry is None:
+            response = await call_next(request)
+            if response.status_code != 200 or "no-store" in response.headers.get("cache-control", ""):
+                return response
+
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _UNCACHED_HEADERS}
+            entry = CachedResponse(body, response.status_code, headers, response.media_type, tag, self.cache.ttl)
+            self.cache.set(key, entry)
+
+        if etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=_cache_headers(entry.etag))
+
+        headers = {**entry.headers, **_cache_headers(entry.etag)}
+        return Response(content=entry.body, status_code=entry.status_code, headers=headers, media_type=entry.media_type)
+
+
+response_cache = ResponseCache()
@@ -1,5 +1,27 @@
-import uvicorn
+import argparse
+import importlib.util
+import math
+import os
 import socket
+import uvicorn
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "8000"))
+# Workers default to the CPUs this process may actually use (see available_cpus)
+WEB_CONCURRENCY = os.environ.get("WEB_CONCURRENCY")
+# Dev only: restart on code changes, single process
+RELOAD = os.environ.get("RELOAD", "0") == "1"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "info")
+# Requests are already logged as JSON by tracing.py
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "0") == "1"
+# Keep above the load balancer's idle timeout so it never reuses a closed connection
+KEEPALIVE_TIMEOUT = int(os.environ.get("KEEPALIVE_TIMEOUT", "5"))
+# Time in-flight requests get after SIGTERM before the pools are drained and
+# closed; keep it under the orchestrator's kill timeout (Docker: 10s)
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", "8"))
+BACKLOG = int(os.environ.get("BACKLOG", "2048"))
+FORWARDED_ALLOW_IPS = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
 
 def get_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -13,16 +35,92 @@ def get_ip():
         s.close()
     return IP
 
-if __name__ == "__main__":
+
+def _cgroup_cpu_limit():
+    # A container's CPU quota, which os.cpu_count() doesn't see
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def print_dev_banner(port: int):
     ip = get_ip()
     print(f"\nAlpha Boutique Smart Webs - Server Controller")
     print(f"================================================")
-    print(f"LOCAL ACCESS:   http://127.0.0.1:8000")
-    print(f"NETWORK ACCESS: http://{ip}:8000")
+    print(f"LOCAL ACCESS:   http://127.0.0.1:{port}")
+    print(f"NETWORK ACCESS: http://{ip}:{port}")
     print(f"================================================")
     print(f"TIP: If 'Network request failed' persists, try running")
-    print(f"   'npx localtunnel --port 8000' in a NEW terminal")
+    print(f"   'npx localtunnel --port {port}' in a NEW terminal")
     print(f"   and update constants/API.ts with the generated URL.\n")
-    
-    # Run on 0.0.0.0 to be accessible from other devices
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API. Production settings by default; see the env vars at the top of this file.")
+    parser.add_argument("--reload", action="store_true", default=RELOAD, help="dev mode: one process, restart on code changes (or RELOAD=1)")
+    args = parser.parse_args()
+
+    if args.reload:
+        print_dev_banner(PORT)
+        # Run on 0.0.0.0 to be accessible from other devices
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True, log_level=LOG_LEVEL)
+        return
+
+    workers = int(WEB_CONCURRENCY) if WEB_CONCURRENCY else available_cpus()
+    loop, http = event_loop(), http_protocol()
+    print(f"Starting {workers} worker(s) on {HOST}:{PORT} (loop={loop}, http={http})")
+    # Each worker runs the app's lifespan: it opens its own pools, warms its
+    # own caches, and on SIGTERM finishes in-flight requests, flushes the
+    # write queue and drains its pools before exiting
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        log_level=LOG_LEVEL,
+        access_log=ACCESS_LOG,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_keep_alive=KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        backlog=BACKLOG,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import re
+import time
+from bisect import bisect_left
+from supabase_client import supabase
+from image_proxy import image_fields
+
+# Per process; other workers' writes reach it through cache_versions.py
+SEARCH_INDEX_TTL = 600.0
+SEARCH_INDEX_PAGE_SIZE = 1000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class ProductSearchIndex:
+    """
+    In-process prefix index over product names and categories, used for
+    typeahead and as a fallback when the Postgres search RPC is unavailable.
+
+    The vocabulary is a sorted token list, so the tokens sharing a prefix
+    are a contiguous slice found by bisect (the lookup a prefix trie gives,
+    without per-node overhead), and each token maps to a posting set of
+    products. Products are stored in rank order (shorter names first), so
+    the best matches are simply the smallest indexes.
+    """
+
+    def __init__(self, ttl: float = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._products = []
+        self._descriptions = []
+        self._vocab = []
+        self._postings = {}
+        self._name_postings = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self):
+        return self._loaded_at and (time.monotonic() - self._loaded_at) < self.ttl
+
+    async def _fetch_catalog(self) -> list:
+        rows = []
+        after_id = None
+        while True:
+            filters = {"id": f"gt.{after_id}"} if after_id is not None else None
+            page = await supabase.get_embedded(
+                "products",
+                "categories",
+                resource_select="name",
+                select="id,name,price_ksh,image_url,description",
+                filters=filters,
+                limit=SEARCH_INDEX_PAGE_SIZE,
+                order="id.asc"
+            )
+            rows.extend(page)
+            if len(page) < SEARCH_INDEX_PAGE_SIZE:
+                return rows
+            after_id = page[-1]["id"]
+
+    def build(self, rows: list):
+        rows = sorted(rows, key=lambda row: (len(row["name"]), row["name"]))
+        products = []
+        descriptions = []
+        postings = {}
+        name_postings = {}
+        for idx, row in enumerate(rows):
+            category = (row.get("categories") or {}).get("name", "Unknown")
+            products.append({
+                "id": str(row["id"]),
+                "name": row["name"],
+                "price": str(row["price_ksh"]),
+                "category": category,
+                "image": row["image_url"],
+                **image_fields(row["id"], row["image_url"]),
+            })
+            descriptions.append(row.get("description"))
+            words = tokenize(row["name"])
+            for token in words:
+                name_postings.setdefault(token, set()).add(idx)
+            for token in set(words + tokenize(category)):
+                postings.setdefault(token, set()).add(idx)
+        self._products = products
+        self._descriptions = descriptions
+        self._vocab = sorted(postings)
+        self._postings = postings
+        self._name_postings = name_postings
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self):
+        self.build(await self._fetch_catalog())
+
+    async def ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if not self._is_fresh():
+                await self.refresh()
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def _prefix_matches(self, prefix: str) -> set:
+        vocab = self._vocab
+        start = bisect_left(vocab, prefix)
+        end = bisect_left(vocab, prefix + "\uffff", start)
+        return set().union(*(self._postings[token] for token in vocab[start:end]))
+
+    def search(self, query: str, category: str = None, limit: int = 10, offset: int = 0, with_description: bool = False) -> list:
+        # Typeahead leaves descriptions out; the search fallback matches the RPC's fields
+        words = tokenize(query)
+        if not words:
+            return []
+        candidates = None
+        for word in words:
+            matches = self._prefix_matches(word)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+
+        if category is not None:
+            candidates = {idx for idx in candidates if self._products[idx]["category"] == category}
+
+        # Products whose name contains every query word in full rank first
+        exact = candidates
+        for word in words:
+            exact = exact & self._name_postings.get(word, set())
+        wanted = offset + limit
+        ranked = heapq.nsmallest(wanted, exact)
+        if len(ranked) < wanted:
+            ranked += heapq.nsmallest(wanted - len(ranked), candidates - exact)
+        if with_description:
+            return [{**self._products[idx], "description": self._descriptions[idx]} for idx in ranked[offset:]]
+        return [self._products[idx] for idx in ranked[offset:]]
+
+    def __len__(self):
+        return len(self._products)
+
+
+product_search_index = ProductSearchIndex()
@@ -1,5 +1,11 @@
+import argparse
+import asyncio
 import random
+import re
+import time
 from supabase_client import supabase
+from catalog_io import resolve_categories
+from cache_versions import cache_versions
 
 CATEGORIES = ['Furniture', 'Electronics', 'Decor', 'Toys', 'Fashion', 'Sports', 'Kitchen', 'Wellness', 'Art']
 
@@ -96,63 +102,160 @@ CATEGORY_DATA = {
     },
 }
 
-import random
-import asyncio
-from supabase_client import supabase
+DEFAULT_SIZE = 360
+DEFAULT_SEED = 42
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CONCURRENCY = 8
+# Units per seeded product; checkout reserves against products.stock
+DEFAULT_STOCK = 25
+MAX_ATTEMPTS = 3
+BACKFILL_PAGE_SIZE = 1000
 
-CATEGORIES = ['Furniture', 'Electronics', 'Decor', 'Toys', 'Fashion', 'Sports', 'Kitchen', 'Wellness', 'Art']
+# Seeded image URLs end in sig=<n + 1>, including those from before seeded rows had a SKU
+_SEED_SIG_RE = re.compile(r"[?&]sig=(\d+)$")
+
+
+def product_sku(n: int) -> str:
+    # Natural key for seeded rows: re-running the seed updates rather than duplicates
+    return f"SEED-{n:07d}"
 
-# ... (CATEGORY_DATA remains the same)
-
-async def seed_database():
-    print("Starting database seeding...")
-    
-    # 2. Seed Categories
-    category_map = {}
-    for cat_name in CATEGORIES:
-        result = await supabase.upsert("categories", {"name": cat_name})
-        if result:
-            category_map[cat_name] = result[0]['id']
-            print(f"Seeded category: {cat_name}")
-
-    # 3. Seed Products
-    products_to_insert = []
-    global_id = 1
-    
-    for cat_name in CATEGORIES:
+
+def generate_products(size: int, seed: int, category_map: dict, stock: int = DEFAULT_STOCK):
+    """
+    Deterministically yields `size` synthetic products spread round-robin
+    over CATEGORIES. The same size and seed always produce the same rows.
+    Every product gets `stock` units (re-seeding resets it).
+    """
+    rng = random.Random(seed)
+    for n in range(size):
+        cat_name = CATEGORIES[n % len(CATEGORIES)]
         data = CATEGORY_DATA[cat_name]
-        prefixes = data['prefix']
-        nouns = data['nouns']
-        images = data['images']
-        cat_id = category_map[cat_name]
-        
-        for i in range(1, 41):
-            prefix = prefixes[i % 10]
-            noun = nouns[i % 10]
-            img = f"{images[i % 4]}?q=80&w=500&auto=format&fit=crop&sig={global_id}"
-            
-            raw_price = random.randint(2, 122) * 1000
-            
-            products_to_insert.append({
-                "name": f"{prefix} {noun}",
-                "price_ksh": raw_price,
-                "category_id": cat_id,
-                "image_url": img,
-                "description": f"A masterfully crafted {cat_name.lower()} piece, the {prefix} {noun} embodies the essence of modern luxury and functional art. Designed for the discerning collector."
-            })
-            global_id += 1
-            
-            # Insert in chunks of 50 to avoid request size limits
-            if len(products_to_insert) >= 50:
-                await supabase.insert("products", products_to_insert)
-                print(f"Inserted {len(products_to_insert)} products...")
-                products_to_insert = []
-
-    if products_to_insert:
-        await supabase.insert("products", products_to_insert)
-        print(f"Inserted final {len(products_to_insert)} products.")
-
-    print("Seeding complete!")
+        prefix = rng.choice(data['prefix'])
+        noun = rng.choice(data['nouns'])
+        img = f"{rng.choice(data['images'])}?q=80&w=500&auto=format&fit=crop&sig={n + 1}"
+        yield {
+            "sku": product_sku(n),
+            "name": f"{prefix} {noun}",
+            "price_ksh": rng.randint(2, 122) * 1000,
+            "stock": stock,
+            "category_id": category_map[cat_name],
+            "image_url": img,
+            "description": f"A masterfully crafted {cat_name.lower()} piece, the {prefix} {noun} embodies the essence of modern luxury and functional art. Designed for the discerning collector."
+        }
+
+
+async def _all_rows(select: str, filters: dict) -> list:
+    rows = []
+    while True:
+        page = await supabase.get_table("products", select=select, filters=filters, order="id",
+                                        limit=BACKFILL_PAGE_SIZE, offset=len(rows))
+        rows.extend(page)
+        if len(page) < BACKFILL_PAGE_SIZE:
+            return rows
+
+
+async def backfill_seed_skus(concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """
+    Gives rows seeded before products had a SKU the SKU their position maps
+    to, so the sku upsert updates them instead of inserting duplicates.
+    Where an older seed run left several rows for one position, only the
+    first gets the SKU; the rest are reported and left for cleanup.
+    """
+    rows = await _all_rows("id,image_url", {"sku": "is.null", "image_url": "like.*sig=*"})
+    taken = {row["sku"] for row in await _all_rows("sku", {"sku": "like.SEED-*"})}
+
+    updates, duplicates = [], 0
+    for row in rows:
+        match = _SEED_SIG_RE.search(row.get("image_url") or "")
+        if not match:
+            continue
+        sku = product_sku(int(match.group(1)) - 1)
+        if sku in taken:
+            duplicates += 1
+            continue
+        taken.add(sku)
+        updates.append((row["id"], sku))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def assign(product_id, sku):
+        async with semaphore:
+            await supabase.update("products", {"id": f"eq.{product_id}", "sku": "is.null"}, {"sku": sku})
+
+    await asyncio.gather(*(assign(product_id, sku) for product_id, sku in updates))
+    if updates or duplicates:
+        print(f"Backfilled SKUs on {len(updates)} previously seeded products"
+              + (f"; {duplicates} duplicates of already seeded products left without one" if duplicates else ""))
+    return {"backfilled": len(updates), "duplicates": duplicates}
+
+
+async def _upsert_worker(queue: asyncio.Queue, stats: dict):
+    while True:
+        batch = await queue.get()
+        try:
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                try:
+                    await supabase.upsert("products", batch, on_conflict="sku")
+                    stats["written"] += len(batch)
+                    break
+                except Exception as e:
+                    print(f"Batch of {len(batch)} failed (attempt {attempt}/{MAX_ATTEMPTS}): {e}")
+                    if attempt == MAX_ATTEMPTS:
+                        stats["failed"] += len(batch)
+                    else:
+                        await asyncio.sleep(0.5 * attempt)
+        finally:
+            queue.task_done()
+
+
+async def seed_database(size: int = DEFAULT_SIZE, seed: int = DEFAULT_SEED, batch_size: int = DEFAULT_BATCH_SIZE, concurrency: int = DEFAULT_CONCURRENCY, stock: int = DEFAULT_STOCK):
+    print(f"Starting database seeding: {size} products, seed={seed}, stock={stock}, batch={batch_size}, concurrency={concurrency}")
+    started = time.perf_counter()
+
+    # 1. Seed Categories (existing ones are reused, missing ones created in one request)
+    category_map, created = await resolve_categories(set(CATEGORIES))
+    print(f"Categories ready ({len(created)} created)")
+    await backfill_seed_skus(concurrency)
+
+    # 2. Seed Products through a bounded pipeline: the generator blocks once
+    # `concurrency` batches are queued, so memory stays flat for any size.
+    stats = {"written": 0, "failed": 0}
+    queue = asyncio.Queue(maxsize=concurrency)
+    workers = [asyncio.create_task(_upsert_worker(queue, stats)) for _ in range(concurrency)]
+
+    batch = []
+    last_report = started
+    for product in generate_products(size, seed, category_map, stock):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            await queue.put(batch)
+            batch = []
+            now = time.perf_counter()
+            if now - last_report >= 2:
+                print(f"  {stats['written']}/{size} products ({stats['written'] / (now - started):.0f}/s)")
+                last_report = now
+    if batch:
+        await queue.put(batch)
+
+    await queue.join()
+    for worker in workers:
+        worker.cancel()
+    # Running API workers drop their cached catalog on their next version check
+    await cache_versions.bump("products", "categories")
+    await supabase.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Seeding complete! {stats['written']} products upserted, {stats['failed']} failed "
+          f"in {elapsed:.2f}s ({stats['written'] / elapsed:.0f} products/s)")
+    return {**stats, "elapsed": elapsed}
+
 
 if __name__ == "__main__":
-    asyncio.run(seed_database())
+    parser = argparse.ArgumentParser(description="Seed the catalog with synthetic products.")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="number of products to generate")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed; same seed, same catalog")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--stock", type=int, default=DEFAULT_STOCK, help="units in stock per product")
+    args = parser.parse_args()
+    asyncio.run(seed_database(args.size, args.seed, args.batch_size, args.concurrency, args.stock))
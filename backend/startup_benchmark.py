@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from fake_upstreams import FakeUpstreams, Latency
+
+# Measures cold starts: a fresh interpreter imports main and serves its first
+# requests against the local Supabase stand-in (see benchmark.py), with and
+# without the lifespan (serverless runtimes may skip it) and a catalog snapshot.
+#   python startup_benchmark.py --runs 5 --json-out startup.json
+
+SCENARIOS = {
+    # name: (run the lifespan, use a catalog snapshot)
+    "serverless": (False, False),
+    "serverless+snapshot": (False, True),
+    "server": (True, False),
+    "server+snapshot": (True, True),
+}
+# What a storefront's first screen asks for
+FIRST_REQUESTS = ["/categories", "/products", "/products/7", "/products/suggest?q=dre"]
+METRICS = ["import_ms", "startup_ms"] + [f"first {path}" for path in FIRST_REQUESTS] + ["spawn_to_first_response_ms"]
+
+
+def child(mode: str, idle_ms: float, mpesa_url: str):
+    """Runs in the measured process; prints one JSON line of timings."""
+    spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        import main
+    import httpx
+
+    timings = {"import_ms": (time.perf_counter() - started) * 1000}
+    main.mpesa.base_url = mpesa_url
+
+    async def first_requests():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://cold") as client:
+            for path in FIRST_REQUESTS:
+                request_started = time.perf_counter()
+                response = await client.get(path)
+                timings[f"first {path}"] = (time.perf_counter() - request_started) * 1000
+                if response.status_code != 200:
+                    timings.setdefault("errors", []).append(f"{path}: {response.status_code}")
+                if "spawn_to_first_response_ms" not in timings:
+                    timings["spawn_to_first_response_ms"] = (time.time() - spawned_at) * 1000
+
+    async def run():
+        if mode == "server":
+            lifespan_started = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stderr):
+                async with main.app.router.lifespan_context(main.app):
+                    timings["startup_ms"] = (time.perf_counter() - lifespan_started) * 1000
+                    # A new worker usually gets traffic a moment after it reports ready
+                    await asyncio.sleep(idle_ms / 1000)
+                    await first_requests()
+        else:
+            timings["startup_ms"] = 0.0
+            await first_requests()
+            await main.supabase.close()
+
+    asyncio.run(run())
+    print(json.dumps(timings))
+
+
+def run_scenario(name: str, upstreams: FakeUpstreams, snapshot_path: str, args) -> list:
+    lifespan, use_snapshot = SCENARIOS[name]
+    env = {
+        **os.environ,
+        "SUPABASE_URL": upstreams.urls["supabase"],
+        "SUPABASE_KEY": "bench-service-key",
+        "SUPABASE_HTTP2": "0",
+        "TRACE_LOG": "0",
+        "PREWARM": "1" if lifespan else "0",
+        "CATALOG_SNAPSHOT": snapshot_path if use_snapshot else "",
+    }
+    results = []
+    for _ in range(args.runs):
+        before = upstreams.request_counts()["supabase"]
+        env["BENCH_SPAWNED_AT"] = repr(time.time())
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "server" if lifespan else "serverless",
+             "--idle-ms", str(args.idle_ms), "--mpesa-url", upstreams.urls["mpesa"]],
+            env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if output.returncode != 0:
+            raise RuntimeError(f"{name} run failed:\n{output.stderr}")
+        timings = json.loads(output.stdout.strip().splitlines()[-1])
+        after = upstreams.request_counts()["supabase"]
+        timings["upstream_calls"] = sum(count - before.get(key, 0) for key, count in after.items() if key != "connections")
+        results.append(timings)
+    return results
+
+
+def summarize(results: list) -> dict:
+    summary = {metric: round(statistics.median(r[metric] for r in results), 1) for metric in METRICS}
+    summary["upstream_calls"] = statistics.median(r["upstream_calls"] for r in results)
+    summary["errors"] = sorted({error for r in results for error in r.get("errors", [])})
+    return summary
+
+
+def import_profile(env: dict, top: int = 12) -> list:
+    """Slowest imports under `import main`, by cumulative microseconds (python -X importtime)."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Only modules main imports directly, so nested costs aren't counted twice
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency of the API against local Supabase/Daraja stand-ins.")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per scenario (median reported)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--supabase-latency-ms", type=float, default=20.0)
+    parser.add_argument("--handshake-ms", type=float, default=60.0, help="extra delay on each new connection (TCP + TLS)")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--idle-ms", type=float, default=500.0, help="server scenarios: pause between startup and the first request")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--json-out")
+    parser.add_argument("--child", choices=["server", "serverless"], help=argparse.SUPPRESS)
+    parser.add_argument("--mpesa-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.idle_ms, args.mpesa_url)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario '{name}'")
+
+    upstreams = FakeUpstreams(args.products, 10, Latency(args.supabase_latency_ms), Latency(args.supabase_latency_ms), args.handshake_ms)
+    upstreams.start()
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "catalog_snapshot.json")
+    env = {**os.environ, "SUPABASE_URL": upstreams.urls["supabase"], "SUPABASE_KEY": "bench-service-key", "SUPABASE_HTTP2": "0", "CATALOG_SNAPSHOT": ""}
+    try:
+        subprocess.run([sys.executable, "catalog_snapshot.py", "--out", snapshot_path], env=env, check=True, capture_output=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        summaries = {name: summarize(run_scenario(name, upstreams, snapshot_path, args)) for name in scenarios}
+        profile = import_profile(env) if args.importtime else []
+    finally:
+        upstreams.stop()
+
+    print(f"\nCold starts: median of {args.runs}, supabase {args.supabase_latency_ms}ms + {args.handshake_ms}ms per new connection")
+    header = f"{'metric (ms)':<34}" + "".join(f"{name:>22}" for name in scenarios)
+    print(header)
+    print("-" * len(header))
+    for metric in METRICS + ["upstream_calls"]:
+        print(f"{metric:<34}" + "".join(f"{summaries[name][metric]:>22}" for name in scenarios))
+    for name in scenarios:
+        if summaries[name]["errors"]:
+            print(f"{name} errors: {summaries[name]['errors']}")
+    if profile:
+        print("\nSlowest imports (cumulative ms):")
+        for cumulative_us, module in profile:
+            print(f"  {cumulative_us / 1000:>8.1f}  {module}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"config": vars(args), "scenarios": summaries, "imports": profile}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
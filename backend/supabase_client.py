@@ -1,6 +1,11 @@
 import os
+import asyncio
+import time
+from collections import OrderedDict
 import httpx
 from dotenv import load_dotenv
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay, is_retryable, retry_after_seconds
+from tracing import TracingTransport, supabase_target, unwrap_transport
 
 load_dotenv()
 
@@ -10,6 +15,52 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables.")
 
+# Connection pool tuning; the defaults suit a single worker under moderate load
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "100"))
+SUPABASE_MAX_KEEPALIVE = int(os.environ.get("SUPABASE_MAX_KEEPALIVE", "20"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_CONNECT_TIMEOUT = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_READ_TIMEOUT = float(os.environ.get("SUPABASE_READ_TIMEOUT", "30"))
+SUPABASE_WRITE_TIMEOUT = float(os.environ.get("SUPABASE_WRITE_TIMEOUT", "30"))
+SUPABASE_POOL_TIMEOUT = float(os.environ.get("SUPABASE_POOL_TIMEOUT", "10"))
+SUPABASE_HTTP2 = os.environ.get("SUPABASE_HTTP2", "1") == "1"
+
+# Resilience for idempotent reads
+SUPABASE_READ_ATTEMPTS = int(os.environ.get("SUPABASE_READ_ATTEMPTS", "3"))
+# Default total time a read may take across all retries
+SUPABASE_READ_BUDGET = float(os.environ.get("SUPABASE_READ_BUDGET", "8"))
+SUPABASE_BREAKER_THRESHOLD = int(os.environ.get("SUPABASE_BREAKER_THRESHOLD", "5"))
+SUPABASE_BREAKER_RESET = float(os.environ.get("SUPABASE_BREAKER_RESET", "15"))
+STALE_CACHE_MAX_ENTRIES = 256
+# On shutdown, how long in-flight reads get before the pool is closed
+SUPABASE_DRAIN_TIMEOUT = 5.0
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def pool_stats(client) -> dict:
+    """
+    Snapshot of an httpx.AsyncClient's connection pool. httpx has no public
+    API for this, so it reads the underlying httpcore pool.
+    """
+    if client is None or client.is_closed:
+        return {"open": False, "connections": 0}
+    pool = getattr(unwrap_transport(client._transport), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    return {
+        "open": True,
+        "connections": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+        "active": sum(1 for c in connections if not c.is_idle() and not c.is_closed()),
+        "http2": sum(1 for c in connections if "HTTP/2" in repr(c)),
+        "in_flight_requests": len(getattr(pool, "_requests", [])),
+        "queued_requests": sum(1 for r in getattr(pool, "_requests", []) if r.is_queued()),
+    }
+
 class SupabaseClient:
     def __init__(self):
         self.url = SUPABASE_URL.rstrip('/')
@@ -20,26 +71,197 @@ class SupabaseClient:
             "Prefer": "return=representation"
         }
         self._client = None
+        self.breaker = CircuitBreaker(SUPABASE_BREAKER_THRESHOLD, SUPABASE_BREAKER_RESET)
+        # Last good result of reads made with stale_ok=True, served while Supabase is degraded
+        self._stale = OrderedDict()
+        # Identical GETs in flight, shared by concurrent callers (single-flight)
+        self._inflight = {}
+        self.coalesced_reads = 0
 
     async def get_client(self):
         if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=30.0)
+            http2 = SUPABASE_HTTP2 and HTTP2_AVAILABLE
+            if SUPABASE_HTTP2 and not HTTP2_AVAILABLE:
+                print("HTTP/2 requested but 'h2' is not installed; using HTTP/1.1")
+            transport = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_MAX_CONNECTIONS,
+                    max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+                    keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY
+                )
+            )
+            self._client = httpx.AsyncClient(
+                # Records a span per upstream call for request traces and /metrics
+                transport=TracingTransport(transport, "supabase", supabase_target),
+                timeout=httpx.Timeout(
+                    connect=SUPABASE_CONNECT_TIMEOUT,
+                    read=SUPABASE_READ_TIMEOUT,
+                    write=SUPABASE_WRITE_TIMEOUT,
+                    pool=SUPABASE_POOL_TIMEOUT
+                )
+            )
         return self._client
 
-    async def get_table(self, table_name: str, select: str = "*", filters: dict = None, limit: int = None, offset: int = None):
+    async def prewarm(self):
+        """
+        Opens a pooled connection (TCP + TLS, and the HTTP/2 session) with a
+        request PostgREST answers without touching the database, so the
+        first real query doesn't pay for the handshake.
+        """
+        client = await self.get_client()
+        response = await client.head(f"{self.url}/rest/v1/", headers={"apikey": self.headers["apikey"]})
+        return response.status_code
+
+    def pool_stats(self) -> dict:
+        return {
+            **pool_stats(self._client),
+            "http2_enabled": SUPABASE_HTTP2 and HTTP2_AVAILABLE,
+            "max_connections": SUPABASE_MAX_CONNECTIONS,
+            "max_keepalive_connections": SUPABASE_MAX_KEEPALIVE,
+            "keepalive_expiry": SUPABASE_KEEPALIVE_EXPIRY,
+            "breaker": self.breaker.snapshot(),
+            "coalesced_reads": self.coalesced_reads,
+        }
+
+    async def _read(self, method: str, path: str, params: dict, headers: dict = None, budget: float = None):
+        """
+        Sends an idempotent request with jittered exponential retries on
+        429/5xx/network errors, all within a total time `budget`. Fails fast
+        with CircuitOpenError while the circuit breaker is open.
+        """
+        deadline = time.monotonic() + (budget or SUPABASE_READ_BUDGET)
+        client = await self.get_client()
+        for attempt in range(SUPABASE_READ_ATTEMPTS):
+            if not self.breaker.allow():
+                raise CircuitOpenError("Supabase circuit breaker is open")
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise httpx.TimeoutException("Read budget exhausted")
+                response = await client.request(
+                    method,
+                    f"{self.url}{path}",
+                    headers=headers or self.headers,
+                    params=params,
+                    timeout=httpx.Timeout(min(SUPABASE_READ_TIMEOUT, remaining), connect=min(SUPABASE_CONNECT_TIMEOUT, remaining))
+                )
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                if not is_retryable(e):
+                    # 4xx means the request is wrong, not that Supabase is unhealthy
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = retry_after_seconds(e) or backoff_delay(attempt)
+                if (attempt == SUPABASE_READ_ATTEMPTS - 1
+                        or self.breaker.state == CircuitBreaker.OPEN
+                        or time.monotonic() + delay >= deadline):
+                    raise
+                reason = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+                print(f"Supabase {method} {path} failed ({reason}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled or failed some other way: never keep the half-open trial slot
+                self.breaker.abandon_trial()
+                raise
+
+    def _remember(self, key: tuple, value):
+        self._stale[key] = value
+        self._stale.move_to_end(key)
+        while len(self._stale) > STALE_CACHE_MAX_ENTRIES:
+            self._stale.popitem(last=False)
+
+    async def get_table(self, table_name: str, select: str = "*", filters: dict = None, limit: int = None, offset: int = None, order: str = None, budget: float = None, stale_ok: bool = False):
+        """
+        Reads rows from a table. Concurrent calls with the same table, select
+        and filters share one upstream request and the same parsed result, so
+        callers must treat the returned rows as read-only.
+        """
         params = {"select": select}
         if filters:
             params.update(filters)
+        if order:
+            params["order"] = order
         if limit is not None:
             params["limit"] = limit
         if offset is not None:
             params["offset"] = offset
-            
+
+        path = f"/rest/v1/{table_name}"
+        key = (path, tuple(sorted((k, str(v)) for k, v in params.items())))
+        flight_key = (key, stale_ok)
+        flight = self._inflight.get(flight_key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._fetch_table(table_name, path, key, params, budget, stale_ok))
+            self._inflight[flight_key] = flight
+            flight.add_done_callback(lambda f: self._land(flight_key, f))
+        else:
+            self.coalesced_reads += 1
+        # Shielded so one caller giving up doesn't cancel the fetch for the others
+        return await asyncio.shield(flight)
+
+    def _land(self, flight_key: tuple, flight: asyncio.Future):
+        if self._inflight.get(flight_key) is flight:
+            del self._inflight[flight_key]
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not flight.cancelled():
+            flight.exception()
+
+    async def _fetch_table(self, table_name: str, path: str, key: tuple, params: dict, budget: float, stale_ok: bool):
+        try:
+            response = await self._read("GET", path, params, budget=budget)
+        except (httpx.HTTPStatusError, httpx.TransportError, CircuitOpenError) as e:
+            if stale_ok and key in self._stale:
+                print(f"Serving stale {table_name} after upstream error: {type(e).__name__}")
+                return self._stale[key]
+            raise
+        data = response.json()
+        if stale_ok:
+            self._remember(key, data)
+        return data
+
+    async def get_embedded(self, table_name: str, resource: str, resource_select: str = "*", select: str = "*", filters: dict = None, resource_filters: dict = None, limit: int = None, offset: int = None, order: str = None, budget: float = None, stale_ok: bool = False):
+        """
+        Fetches rows together with a related resource in one request using
+        PostgREST resource embedding, e.g. select=*,categories(name).
+
+        `resource_filters` are applied to the embedded resource
+        (categories.name=eq.X); when given, the embed becomes an inner join
+        so parent rows without a matching child are dropped.
+        """
+        join = "!inner" if resource_filters else ""
+        embedded_select = f"{select},{resource}{join}({resource_select})"
+        params = dict(filters or {})
+        for column, condition in (resource_filters or {}).items():
+            params[f"{resource}.{column}"] = condition
+        return await self.get_table(table_name, select=embedded_select, filters=params, limit=limit, offset=offset, order=order, budget=budget, stale_ok=stale_ok)
+
+    async def count(self, table_name: str, filters: dict = None, select: str = None, budget: float = None):
+        """
+        Returns the exact row count for a filtered table using a HEAD request,
+        so no rows are transferred. PostgREST reports the total in Content-Range
+        (e.g. "0-24/360" or "*/0").
+        """
+        headers = self.headers.copy()
+        headers["Prefer"] = "count=exact"
+
+        params = dict(filters or {})
+        if select:
+            params["select"] = select
+        response = await self._read("HEAD", f"/rest/v1/{table_name}", params, headers=headers, budget=budget)
+        content_range = response.headers.get("content-range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    async def rpc(self, function_name: str, params: dict = None):
         client = await self.get_client()
-        response = await client.get(
-            f"{self.url}/rest/v1/{table_name}",
+        response = await client.post(
+            f"{self.url}/rest/v1/rpc/{function_name}",
             headers=self.headers,
-            params=params
+            json=params or {}
         )
         response.raise_for_status()
         return response.json()
@@ -68,11 +290,12 @@ class SupabaseClient:
         response.raise_for_status()
         return response.json()
 
-    async def signup(self, email: str, password: str):
+    async def signup(self, email: str, password: str, app_metadata: dict = None):
         """
         Creates a user via the Admin API, which auto-confirms the email.
         This prevents Supabase from sending any confirmation emails,
         which eliminates bounce rate issues from test/invalid addresses.
+        `app_metadata` (e.g. role, full_name) is carried in the user's tokens.
         """
         client = await self.get_client()
         try:
@@ -84,7 +307,8 @@ class SupabaseClient:
                 json={
                     "email": email,
                     "password": password,
-                    "email_confirm": True
+                    "email_confirm": True,
+                    "app_metadata": app_metadata or {}
                 }
             )
             try:
@@ -139,6 +363,17 @@ class SupabaseClient:
             print(f"Network error connecting to Supabase: {e}")
             raise Exception(f"Could not connect to authentication server: {str(e)}. Please check your internet.")
 
+    async def update_app_metadata(self, user_id: str, app_metadata: dict):
+        """Merges `app_metadata` into an auth user; only the service role can set it."""
+        client = await self.get_client()
+        response = await client.put(
+            f"{self.url}/auth/v1/admin/users/{user_id}",
+            headers=self.headers,
+            json={"app_metadata": app_metadata}
+        )
+        response.raise_for_status()
+        return response.json()
+
     async def update(self, table_name: str, filters: dict, data: dict):
         headers = self.headers.copy()
         headers["Prefer"] = "return=representation"
@@ -169,7 +404,10 @@ class SupabaseClient:
     async def update_profile(self, user_id: str, data: dict):
         return await self.update("profiles", {"id": f"eq.{user_id}"}, data)
 
-    async def close(self):
+    async def close(self, drain_timeout: float = SUPABASE_DRAIN_TIMEOUT):
+        # Shared reads may still have waiters; let them land before the pool goes
+        if self._inflight:
+            await asyncio.wait(list(self._inflight.values()), timeout=drain_timeout)
         if self._client:
             await self._client.aclose()
             self._client = None
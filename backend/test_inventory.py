@@ -0,0 +1,274 @@
+import asyncio
+import json
+import time
+import httpx
+from supabase_client import supabase
+import inventory
+
+
+class FakePostgREST:
+    """
+    Local stand-in for PostgREST serving the inventory RPCs, through
+    httpx.MockTransport. Each RPC is one transaction: it locks the product
+    rows it touches in id order (like UPDATE ... in Postgres), yields to the
+    event loop while holding them to simulate statement latency, and applies
+    its changes only if every item succeeds. Plain table GET/PATCH are
+    deliberately not atomic, to show what a read-modify-write would lose.
+    """
+
+    def __init__(self, stock: dict, latency: float = 0.002):
+        self.stock = dict(stock)
+        self.reservations = []
+        self.latency = latency
+        self._locks = {product_id: asyncio.Lock() for product_id in stock}
+
+    def _error(self, message: str, product_id: str):
+        return httpx.Response(400, json={"code": "P0001", "message": message, "details": product_id, "hint": None})
+
+    async def _locked(self, product_ids, body):
+        locks = [self._locks[product_id] for product_id in sorted(set(product_ids)) if product_id in self._locks]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            await asyncio.sleep(self.latency)
+            return body()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _decrement(self, items):
+        changes = {}
+        for item in items:
+            product_id, quantity = item["product_id"], item["quantity"]
+            if quantity <= 0:
+                return None, self._error("invalid_quantity", product_id)
+            if product_id not in self.stock:
+                return None, self._error("unknown_product", product_id)
+            if self.stock.get(product_id, 0) < quantity:
+                return None, self._error("insufficient_stock", product_id)
+            changes[product_id] = self.stock[product_id] - quantity
+        return changes, None
+
+    async def handler(self, request: httpx.Request):
+        path = request.url.path
+        if request.method == "GET" and path.endswith("/products"):
+            await asyncio.sleep(self.latency)
+            product_id = request.url.params["id"].removeprefix("eq.")
+            return httpx.Response(200, json=[{"id": product_id, "stock": self.stock[product_id]}])
+        if request.method == "PATCH" and path.endswith("/products"):
+            await asyncio.sleep(self.latency)
+            product_id = request.url.params["id"].removeprefix("eq.")
+            self.stock[product_id] = json.loads(request.content)["stock"]
+            return httpx.Response(200, json=[{"id": product_id, "stock": self.stock[product_id]}])
+
+        function_name = path.rsplit("/", 1)[-1]
+        params = json.loads(request.content)
+
+        if function_name == "decrement_stock":
+            items = params["items"]
+
+            def body():
+                changes, error = self._decrement(items)
+                if error:
+                    return error
+                self.stock.update(changes)
+                return httpx.Response(200, json=[{"product_id": p, "stock": s} for p, s in changes.items()])
+            return await self._locked([i["product_id"] for i in items], body)
+
+        if function_name == "reserve_stock":
+            ref, items = params["ref"], params["items"]
+
+            def body():
+                existing = [r for r in self.reservations if r["ref"] == ref]
+                if not existing:
+                    changes, error = self._decrement(items)
+                    if error:
+                        return error
+                    self.stock.update(changes)
+                    expires_at = time.monotonic() + params["ttl_seconds"]
+                    existing = [
+                        {"ref": ref, "product_id": i["product_id"], "quantity": i["quantity"], "status": "held", "expires_at": expires_at}
+                        for i in items
+                    ]
+                    self.reservations.extend(existing)
+                return httpx.Response(200, json=[{"product_id": r["product_id"], "quantity": r["quantity"]} for r in existing])
+            return await self._locked([i["product_id"] for i in items], body)
+
+        if function_name == "commit_reservation":
+            held = [r for r in self.reservations if r["ref"] == params["ref"] and r["status"] == "held"]
+            for r in held:
+                r["status"] = "committed"
+            return httpx.Response(200, json=len(held))
+
+        if function_name == "release_reservations":
+            ref = params.get("ref")
+            now = time.monotonic()
+            held = [
+                r for r in self.reservations
+                if r["status"] == "held" and (r["expires_at"] < now if ref is None else r["ref"] == ref)
+            ]
+
+            def body():
+                for r in held:
+                    r["status"] = "released"
+                    self.stock[r["product_id"]] += r["quantity"]
+                return httpx.Response(200, json=len(held))
+            return await self._locked([r["product_id"] for r in held], body)
+
+        if function_name == "adjust_stock":
+            adjustments = params["adjustments"]
+
+            def body():
+                changes = {}
+                for a in adjustments:
+                    if a["product_id"] not in self.stock:
+                        return self._error("unknown_product", a["product_id"])
+                    if self.stock[a["product_id"]] + a["delta"] < 0:
+                        return self._error("insufficient_stock", a["product_id"])
+                    changes[a["product_id"]] = self.stock[a["product_id"]] + a["delta"]
+                self.stock.update(changes)
+                return httpx.Response(200, json=[{"product_id": p, "stock": s} for p, s in changes.items()])
+            return await self._locked([a["product_id"] for a in adjustments], body)
+
+        return httpx.Response(404, json={"message": f"Unknown function {function_name}"})
+
+    def install(self):
+        supabase._client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+async def _attempt(coro):
+    try:
+        return await coro
+    except inventory.InsufficientStockError as e:
+        return e
+
+
+async def _flash_sale_never_oversells():
+    db = FakePostgREST({"p1": 100})
+    db.install()
+    results = await asyncio.gather(*[_attempt(inventory.reserve([{"product_id": "p1", "quantity": 1}])) for _ in range(500)])
+    await supabase.close()
+    sold = [r for r in results if isinstance(r, str)]
+    rejected = [r for r in results if isinstance(r, inventory.InsufficientStockError)]
+    assert len(sold) == 100, len(sold)
+    assert len(rejected) == 400, len(rejected)
+    assert db.stock["p1"] == 0, db.stock
+    assert sum(r["quantity"] for r in db.reservations if r["status"] == "held") == 100
+
+
+async def _multi_item_orders_are_all_or_nothing():
+    db = FakePostgREST({"a": 5, "b": 1})
+    db.install()
+    # Items listed in opposite orders must still not deadlock
+    results = await asyncio.gather(
+        _attempt(inventory.decrement_stock([{"product_id": "a", "quantity": 1}, {"product_id": "b", "quantity": 1}])),
+        _attempt(inventory.decrement_stock([{"product_id": "b", "quantity": 1}, {"product_id": "a", "quantity": 1}])),
+    )
+    await supabase.close()
+    assert sum(isinstance(r, dict) for r in results) == 1, results
+    assert db.stock == {"a": 4, "b": 0}, db.stock
+
+
+async def _unknown_products_are_not_reported_as_short():
+    db = FakePostgREST({"p1": 5})
+    db.install()
+    try:
+        await inventory.reserve([{"product_id": "p1", "quantity": 1}, {"product_id": "gone", "quantity": 1}])
+        raise AssertionError("reservation of an unknown product was accepted")
+    except inventory.UnknownProductError as e:
+        assert e.product_id == "gone"
+    await supabase.close()
+    assert db.stock == {"p1": 5}, db.stock
+
+
+async def _release_and_commit_are_idempotent():
+    db = FakePostgREST({"p1": 3})
+    db.install()
+    ref = await inventory.reserve([{"product_id": "p1", "quantity": 2}])
+    assert await inventory.reserve([{"product_id": "p1", "quantity": 2}], reservation_ref=ref) == ref
+    assert db.stock["p1"] == 1, db.stock
+    assert await inventory.release(ref) == 1
+    assert await inventory.release(ref) == 0
+    assert await inventory.commit(ref) == 0
+    await supabase.close()
+    assert db.stock["p1"] == 3, db.stock
+
+
+async def _expired_holds_are_released():
+    db = FakePostgREST({"p1": 2})
+    db.install()
+    await inventory.reserve([{"product_id": "p1", "quantity": 1}], ttl_seconds=0)
+    await inventory.reserve([{"product_id": "p1", "quantity": 1}], ttl_seconds=600)
+    assert db.stock["p1"] == 0
+    assert await inventory.release_expired() == 1
+    await supabase.close()
+    assert db.stock["p1"] == 1, db.stock
+
+
+async def _concurrent_adjustments_keep_every_update():
+    db = FakePostgREST({"p1": 0, "p2": 10})
+    db.install()
+    await asyncio.gather(*[inventory.adjust_stock([{"product_id": "p1", "delta": 1}]) for _ in range(200)])
+    try:
+        await inventory.adjust_stock([{"product_id": "p1", "delta": 5}, {"product_id": "p2", "delta": -11}])
+        raise AssertionError("adjustment below zero was accepted")
+    except inventory.InsufficientStockError as e:
+        assert e.product_id == "p2"
+    await supabase.close()
+    assert db.stock == {"p1": 200, "p2": 10}, db.stock
+
+
+async def _read_modify_write_loses_updates():
+    # Sanity check of the stand-in: the old GET-then-PATCH pattern oversells
+    db = FakePostgREST({"p1": 100})
+    db.install()
+
+    async def naive_buy():
+        rows = await supabase.get_table("products", select="stock", filters={"id": "eq.p1"})
+        if rows[0]["stock"] > 0:
+            await supabase.update("products", {"id": "eq.p1"}, {"stock": rows[0]["stock"] - 1})
+            return True
+        return False
+
+    sold = sum(await asyncio.gather(*[naive_buy() for _ in range(50)]))
+    await supabase.close()
+    assert 100 - db.stock["p1"] < sold, (sold, db.stock)
+
+
+def test_flash_sale_never_oversells():
+    asyncio.run(_flash_sale_never_oversells())
+
+
+def test_multi_item_orders_are_all_or_nothing():
+    asyncio.run(_multi_item_orders_are_all_or_nothing())
+
+
+def test_unknown_products_are_not_reported_as_short():
+    asyncio.run(_unknown_products_are_not_reported_as_short())
+
+
+def test_release_and_commit_are_idempotent():
+    asyncio.run(_release_and_commit_are_idempotent())
+
+
+def test_expired_holds_are_released():
+    asyncio.run(_expired_holds_are_released())
+
+
+def test_concurrent_adjustments_keep_every_update():
+    asyncio.run(_concurrent_adjustments_keep_every_update())
+
+
+def test_read_modify_write_loses_updates():
+    asyncio.run(_read_modify_write_loses_updates())
+
+
+if __name__ == "__main__":
+    test_flash_sale_never_oversells()
+    test_multi_item_orders_are_all_or_nothing()
+    test_unknown_products_are_not_reported_as_short()
+    test_release_and_commit_are_idempotent()
+    test_expired_holds_are_released()
+    test_concurrent_adjustments_keep_every_update()
+    test_read_modify_write_loses_updates()
+    print("All inventory tests passed")
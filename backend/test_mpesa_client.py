@@ -0,0 +1,96 @@
+import asyncio
+import json
+import httpx
+from mpesa_client import MpesaClient, format_phone_number
+
+
+class FakeDaraja:
+    """Local stand-in for the Safaricom Daraja API, served through httpx.MockTransport."""
+
+    def __init__(self, expires_in: str = "3599", latency: float = 0.05):
+        self.expires_in = expires_in
+        self.latency = latency
+        self.token_requests = 0
+        self.stk_requests = 0
+        self.revoked = set()
+
+    async def handler(self, request: httpx.Request):
+        await asyncio.sleep(self.latency)
+        if request.url.path == "/oauth/v1/generate":
+            self.token_requests += 1
+            return httpx.Response(200, json={
+                "access_token": f"token-{self.token_requests}",
+                "expires_in": self.expires_in
+            })
+        if request.url.path == "/mpesa/stkpush/v1/processrequest":
+            self.stk_requests += 1
+            token = request.headers["Authorization"].removeprefix("Bearer ")
+            if token in self.revoked:
+                return httpx.Response(401, json={"errorMessage": "Invalid Access Token"})
+            body = json.loads(request.content)
+            return httpx.Response(200, json={
+                "MerchantRequestID": f"m-{self.stk_requests}",
+                "CheckoutRequestID": f"ws_CO_{self.stk_requests}",
+                "ResponseCode": "0",
+                "PhoneNumber": body["PhoneNumber"]
+            })
+        return httpx.Response(404)
+
+    def client(self, **kwargs):
+        return MpesaClient(base_url="http://daraja.local", transport=httpx.MockTransport(self.handler), **kwargs)
+
+
+async def _concurrent_checkouts_share_one_token():
+    daraja = FakeDaraja()
+    mpesa = daraja.client()
+    results = await asyncio.gather(*[mpesa.stk_push("254700000000", 100) for _ in range(25)])
+    await mpesa.close()
+    assert all(status == 200 for status, _ in results)
+    assert daraja.token_requests == 1, daraja.token_requests
+    assert daraja.stk_requests == 25
+
+
+async def _token_refreshed_before_expiry():
+    # expires_in below the refresh margin means every call must refetch
+    daraja = FakeDaraja(expires_in="30", latency=0)
+    mpesa = daraja.client(refresh_margin=60)
+    await mpesa.get_access_token()
+    await mpesa.get_access_token()
+    await mpesa.close()
+    assert daraja.token_requests == 2, daraja.token_requests
+
+
+async def _revoked_token_is_refetched_once():
+    daraja = FakeDaraja(latency=0)
+    mpesa = daraja.client()
+    daraja.revoked.add(await mpesa.get_access_token())
+    status, data = await mpesa.stk_push("254700000000", 100)
+    await mpesa.close()
+    assert status == 200, data
+    assert daraja.token_requests == 2
+
+
+def test_format_phone_number():
+    assert format_phone_number("0712345678") == "254712345678"
+    assert format_phone_number("+254712345678") == "254712345678"
+    assert format_phone_number("712345678") == "254712345678"
+
+
+def test_concurrent_checkouts_share_one_token():
+    asyncio.run(_concurrent_checkouts_share_one_token())
+
+
+def test_token_refreshed_before_expiry():
+    asyncio.run(_token_refreshed_before_expiry())
+
+
+def test_revoked_token_is_refetched_once():
+    asyncio.run(_revoked_token_is_refetched_once())
+
+
+if __name__ == "__main__":
+    test_format_phone_number()
+    test_concurrent_checkouts_share_one_token()
+    test_token_refreshed_before_expiry()
+    test_revoked_token_is_refetched_once()
+    print("M-Pesa client tests passed.")
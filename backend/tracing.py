@@ -0,0 +1,326 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+import httpx
+
+# One JSON line per request on stdout; set TRACE_LOG=0 to keep only /metrics
+TRACE_LOG = os.environ.get("TRACE_LOG", "1") == "1"
+# Only log requests at least this slow (ms); 0 logs everything
+TRACE_LOG_MIN_MS = float(os.environ.get("TRACE_LOG_MIN_MS", "0"))
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Seconds; roughly Prometheus' defaults with a finer low end for cache hits
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Not timed: scrapes would skew the histograms, streams last as long as the client stays
+UNTRACED_PATHS = {"/metrics", "/notifications/stream"}
+MAX_REMEMBERED_ROUTES = 10000
+MAX_REQUEST_ID_LENGTH = 128
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_string(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus-style histogram keyed by a tuple of label values. Observing
+    is a bisect and three increments; buckets are only made cumulative when
+    rendered.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            # [per-bucket counts (last one is +Inf), sum, count]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_string(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_string(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_label_string(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._series = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_label_string(self.labelnames, labels)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics for this worker process; each worker serves its own /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+http_request_duration = metrics.register(Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("method", "route", "status"),
+))
+upstream_request_duration = metrics.register(Histogram(
+    "upstream_request_duration_seconds",
+    "Time spent on one upstream HTTP call, including reading the response body.",
+    ("service", "target", "method", "status"),
+))
+upstream_response_bytes = metrics.register(Counter(
+    "upstream_response_bytes_total",
+    "Response body bytes read from upstream services.",
+    ("service", "target"),
+))
+
+
+class Trace:
+    __slots__ = ("request_id", "start", "spans", "attrs")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attrs = {}
+
+    def upstream_seconds(self) -> float:
+        # A sum, so it can exceed the request time when calls ran concurrently
+        return sum(span["duration_ms"] for span in self.spans) / 1000
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def annotate(**attrs):
+    """Adds fields to the current request's log line; a no-op outside a request."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def record_span(service: str, target: str, method: str, status, response_bytes: int, start: float, trace: Optional[Trace] = None):
+    duration = time.perf_counter() - start
+    upstream_request_duration.observe((service, target, method, str(status)), duration)
+    if response_bytes:
+        upstream_response_bytes.inc((service, target), response_bytes)
+    # Background jobs (write queue, sweepers) only feed the histograms
+    if trace is not None:
+        trace.spans.append({
+            "service": service,
+            "target": target,
+            "method": method,
+            "status": status,
+            "bytes": response_bytes,
+            "offset_ms": round((start - trace.start) * 1000, 2),
+            "duration_ms": round(duration * 1000, 2),
+        })
+
+
+def supabase_target(path: str) -> str:
+    """Low-cardinality name for a Supabase URL path: the table, rpc/<fn> or auth/<endpoint>."""
+    parts = path.strip("/").split("/")
+    if parts[:2] == ["rest", "v1"]:
+        return "/".join(parts[2:4]) if parts[2:3] == ["rpc"] else "/".join(parts[2:3])
+    if parts[:2] == ["auth", "v1"]:
+        # Drops user ids from /auth/v1/admin/users/<id>
+        return "auth/" + "/".join(parts[2:4] if parts[2:3] == ["admin"] else parts[2:3])
+    return parts[0] if parts else ""
+
+
+def path_target(path: str) -> str:
+    return path
+
+
+class _TracedStream(httpx.AsyncByteStream):
+    """Counts body bytes and closes the span once the client is done with the response."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self.bytes_read = 0
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close(self.bytes_read)
+                self._on_close = None
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps an httpx transport and records a span for every request sent
+    through it: target, method, status, body bytes and duration until the
+    body has been read.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, service: str, target=path_target):
+        self.inner = inner
+        self.service = service
+        self.target = target
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        trace = _current_trace.get()
+        start = time.perf_counter()
+        target = self.target(request.url.path)
+        try:
+            response = await self.inner.handle_async_request(request)
+        except Exception as e:
+            record_span(self.service, target, request.method, type(e).__name__, 0, start, trace)
+            raise
+        status = response.status_code
+        if response.is_closed:
+            # Built from in-memory content (e.g. httpx.MockTransport); nothing left to stream
+            record_span(self.service, target, request.method, status, len(response.content), start, trace)
+            return response
+        response.stream = _TracedStream(
+            response.stream,
+            lambda size: record_span(self.service, target, request.method, status, size, start, trace)
+        )
+        return response
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def unwrap_transport(transport):
+    return getattr(transport, "inner", transport)
+
+
+_routes_by_path = {}
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = scope["path"]
+    if route is not None and getattr(route, "path", None):
+        if len(_routes_by_path) >= MAX_REMEMBERED_ROUTES:
+            _routes_by_path.clear()
+        _routes_by_path[path] = route.path
+        return route.path
+    # Response-cache hits never reach the router; reuse what it said last time
+    return _routes_by_path.get(path, "unmatched")
+
+
+def _request_id(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-request-id":
+            return value.decode("latin-1")[:MAX_REQUEST_ID_LENGTH]
+    return os.urandom(8).hex()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that times each HTTP request and collects the
+    upstream spans recorded while handling it. Adds X-Request-ID and
+    Server-Timing headers, feeds the /metrics histograms and writes one
+    JSON log line per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(_request_id(scope))
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_trace_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - trace.start) * 1000
+                server_timing = f"app;dur={elapsed_ms:.1f}, upstream;dur={trace.upstream_seconds() * 1000:.1f}"
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", ())) + [
+                        (b"x-request-id", trace.request_id.encode("latin-1")),
+                        (b"server-timing", server_timing.encode()),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_headers)
+        finally:
+            _current_trace.reset(token)
+            self._finish(scope, trace, status)
+
+    def _finish(self, scope, trace: Trace, status: int):
+        duration = time.perf_counter() - trace.start
+        route = _route_label(scope)
+        http_request_duration.observe((scope["method"], route, str(status)), duration)
+        if not TRACE_LOG or duration * 1000 < TRACE_LOG_MIN_MS:
+            return
+        entry = {
+            "ts": round(time.time(), 3),
+            "request_id": trace.request_id,
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "upstream_ms": round(trace.upstream_seconds() * 1000, 2),
+            "upstream_calls": len(trace.spans),
+        }
+        entry.update(trace.attrs)
+        if trace.spans:
+            entry["spans"] = trace.spans
+        print(json.dumps(entry, separators=(",", ":"), default=str))
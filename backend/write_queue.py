@@ -0,0 +1,84 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+WRITE_QUEUE_MAX_ATTEMPTS = 3
+
+
+class WriteQueue:
+    """
+    FIFO queue of Supabase writes executed by a single background worker.
+
+    Handlers enqueue a job and return immediately, so writes that the client
+    doesn't need to wait for stay off the request path. A single worker keeps
+    jobs in submission order, within this process only. Failed jobs are
+    retried with a short backoff.
+    """
+
+    def __init__(self, max_attempts: int = WRITE_QUEUE_MAX_ATTEMPTS, retry_delay: float = 0.5):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, job: Callable[[], Awaitable], description: str = "write"):
+        if not self.running:
+            # No event-loop worker (e.g. in scripts): run it as a detached task
+            asyncio.get_running_loop().create_task(self._execute(job, description))
+            return
+        self._queue.put_nowait((job, description))
+
+    async def run(self, job: Callable[[], Awaitable], description: str = "write") -> bool:
+        """
+        Runs a job now, with the queue's retries, and waits for it. For writes
+        that must land before the request returns: another worker may handle
+        the next request, and serverless runtimes may freeze detached tasks.
+        """
+        return await self._execute(job, description)
+
+    async def _execute(self, job, description: str) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await job()
+                return True
+            except Exception as e:
+                print(f"Write {description} failed (attempt {attempt}/{self.max_attempts}): {e}")
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_delay * attempt)
+        return False
+
+    async def _run(self):
+        while True:
+            job, description = await self._queue.get()
+            try:
+                await self._execute(job, description)
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = 10.0):
+        if self.running:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Write queue drain timed out with {self._queue.qsize()} jobs pending")
+
+    async def stop(self):
+        await self.drain()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+write_queue = WriteQueue()
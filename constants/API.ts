@@ -1,2 +1,12 @@
 export const API_BASE_URL = process.env.EXPO_PUBLIC_API_URL || 'http://192.168.1.40:8000';
 console.log('Current API_BASE_URL:', API_BASE_URL);
+
+// Picks a resized image variant when the API provides one, else the original URL
+export const productImage = (
+    product: { image: string; image_variants?: Record<string, string> },
+    size: 'thumb' | 'card' | 'detail' = 'card'
+) => {
+    const variant = product.image_variants?.[size];
+    if (!variant) return product.image;
+    return variant.startsWith('http') ? variant : `${API_BASE_URL}${variant}`;
+};
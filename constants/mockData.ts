@@ -7,6 +7,9 @@ export interface Product {
     category: string;
     image: string;
     description?: string;
+    // Resized WebP variants served by the API's /img proxy
+    image_variants?: { thumb: string; card: string; detail: string };
+    srcset?: string;
 }
 
 const generateProducts = () => {
@@ -1,7 +1,11 @@
+import { API_BASE_URL } from '@/constants/API';
+import { useAuth } from '@/context/AuthContext';
 import AsyncStorage from '@react-native-async-storage/async-storage';
-import React, { createContext, useCallback, useContext, useEffect, useMemo, useState } from 'react';
+import React, { createContext, useCallback, useContext, useEffect, useMemo, useRef, useState } from 'react';
 
 const CART_STORAGE_KEY = '@alpha_smart_cart';
+// Quantity taps are batched into one server sync
+const CART_SYNC_DELAY_MS = 800;
 
 export interface CartItem {
     id: string;
@@ -26,6 +30,8 @@ const CartContext = createContext<CartContextType | undefined>(undefined);
 export function CartProvider({ children }: { children: React.ReactNode }) {
     const [cart, setCart] = useState<CartItem[]>([]);
     const [isLoaded, setIsLoaded] = useState(false);
+    const { userEmail } = useAuth();
+    const hydratedFor = useRef<string | null>(null);
 
     // Load cart from storage on mount
     useEffect(() => {
@@ -60,6 +66,59 @@ export function CartProvider({ children }: { children: React.ReactNode }) {
         saveCart();
     }, [cart, isLoaded]);
 
+    // On login, pick up a cart saved from another device if this one is empty
+    useEffect(() => {
+        if (!isLoaded || !userEmail || hydratedFor.current === userEmail) return;
+        if (cart.length > 0) {
+            hydratedFor.current = userEmail;
+            return;
+        }
+
+        const loadServerCart = async () => {
+            try {
+                const res = await fetch(`${API_BASE_URL}/cart?email=${encodeURIComponent(userEmail)}`);
+                if (!res.ok) return;
+                const data = await res.json();
+                setCart((prevCart) => prevCart.length > 0 ? prevCart : data.items.map((line: any) => ({
+                    id: line.product_id,
+                    name: line.name,
+                    price: `Ksh ${line.unit_price_ksh.toLocaleString()}`,
+                    image: line.image,
+                    quantity: line.quantity,
+                })));
+            } catch (error) {
+                console.error('Failed to load server cart:', error);
+            } finally {
+                // Syncing starts only now, so an empty local cart can't overwrite the server's
+                hydratedFor.current = userEmail;
+            }
+        };
+
+        loadServerCart();
+    }, [isLoaded, userEmail]);
+
+    // Mirror the cart to the server, which prices it at checkout
+    useEffect(() => {
+        if (!isLoaded || !userEmail || hydratedFor.current !== userEmail) return;
+
+        const timer = setTimeout(async () => {
+            try {
+                await fetch(`${API_BASE_URL}/cart`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        email: userEmail,
+                        items: cart.map((item) => ({ product_id: item.id, quantity: item.quantity })),
+                    }),
+                });
+            } catch (error) {
+                console.error('Failed to sync cart:', error);
+            }
+        }, CART_SYNC_DELAY_MS);
+
+        return () => clearTimeout(timer);
+    }, [cart, isLoaded, userEmail]);
+
     const addToCart = useCallback((product: Omit<CartItem, 'quantity'>) => {
         setCart((prevCart) => {
             const existingItem = prevCart.find((item) => item.id === product.id);
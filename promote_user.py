@@ -19,6 +19,9 @@ async def promote():
             'role': 'Admin',
             'full_name': 'Alpha Wolf'
         }, on_conflict='id')
+        # Login reads the role from app_metadata; the profiles trigger mirrors
+        # it too, but set it here so this works before that migration is run
+        await supabase.update_app_metadata(user_id, {'role': 'Admin', 'full_name': 'Alpha Wolf'})
         print(f"Success! {r}")
     except Exception as e:
         print(f"Error promoting user: {e}")